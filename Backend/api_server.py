@@ -1,37 +1,44 @@
 # Backend/api_server.py
-from fastapi import FastAPI, Query, HTTPException, Depends, Header, Request
+from fastapi import FastAPI, Query, HTTPException, Depends, Header, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security.api_key import APIKeyHeader
 from starlette.status import HTTP_403_FORBIDDEN ,HTTP_429_TOO_MANY_REQUESTS
-import os, time
+import os, time, math
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
 from typing import List, Optional, Dict, Any, Union
-import redis
+import redis.asyncio as aioredis
 from datetime import datetime, timedelta
 import json
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
 from pydantic import BaseModel
 
-from config import STOCKS_TO_TRACK, update_stocks_to_track, reload_configuration, DB_CONFIG
+import config
+from config import update_stocks_to_track, reload_configuration, REDIS_CONFIG, RESPONSE_CACHE_CONFIG, SINGLEFLIGHT_CONFIG, RATE_LIMIT_CONFIG, REALTIME_CONFIG
 from stock_ai_analyzer import StockAIAnalyzer
-
-
-# 创建Redis连接
-try:
-    redis_client = redis.Redis(
-        host=REDIS_CONFIG["host"], 
-        port=REDIS_CONFIG["port"], 
-        db=REDIS_CONFIG["db"], 
-        decode_responses=REDIS_CONFIG["decode_responses"]
-    )
-    print(f"API服务器: 成功连接到Redis: {REDIS_CONFIG['host']}:{REDIS_CONFIG['port']}")
-except Exception as e:
-    print(f"API服务器: Redis连接错误: {e}")
-    redis_client = None
+from db_engine import create_async_db_engine, dispose_async_engines, get_pool_stats, dispose_all
+from timeframes import TIMEFRAMES, cache_ttl_for_ktype, table_for_ktype
+from response_cache import ResponseCache
+from singleflight import SingleFlight, SingleFlightTimeout
+from rate_limiter import RateLimiter, RateLimitPolicy, identity_for_api_key
+from response_formats import (FORMAT_ROWS, FORMAT_CSV, FORMATS, STREAM_FORMATS, MEDIA_TYPES, PRICE_COLUMNS_SELECT,
+                              negotiate_format, rows_to_columns, columns_to_rows, encode_columns)
+from downsample import (DOWNSAMPLE_LTTB, DOWNSAMPLE_OHLC, DOWNSAMPLE_METHODS, DOWNSAMPLE_MAX_POINTS, parse_bucket,
+                        bucket_seconds, bucket_for_span, lttb_columns)
+from stream_export import stream_price_rows, copy_export
+from realtime_hub import RealtimeHub
+from ranking import read_ranking
+from panel import PricePanel, ACTION_NAMES
 
 # API密钥配置 - 推荐使用环境变量存储密钥
 API_KEY = os.getenv("TRADING_API_KEY", "your-secret-api-key")  # 请替换为你的密钥
 API_KEY_NAME = "X-API-Key"
+# 批量分析接口单次请求最多的股票数量
+BATCH_ANALYSIS_MAX_CODES = int(os.getenv("BATCH_ANALYSIS_MAX_CODES", "200"))
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
 # 定义允许的域名列表
@@ -65,11 +72,60 @@ async def check_referer(request: Request):
         )
     return True
 
+# 应用生命周期：在事件循环内创建异步数据库连接池和Redis客户端，退出时关闭
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.db_engine = create_async_db_engine("api")
+    app.state.redis = aioredis.Redis(
+        host=REDIS_CONFIG["host"], 
+        port=REDIS_CONFIG["port"], 
+        db=REDIS_CONFIG["db"], 
+        decode_responses=REDIS_CONFIG["decode_responses"]
+    )
+    app.state.response_cache = ResponseCache(
+        app.state.redis,
+        max_entries=RESPONSE_CACHE_CONFIG["max_entries"],
+        max_entry_bytes=RESPONSE_CACHE_CONFIG["max_entry_bytes"],
+        ttl=RESPONSE_CACHE_CONFIG["ttl"]
+    ) if RESPONSE_CACHE_CONFIG["enabled"] else None
+    app.state.rate_limiter = RateLimiter(
+        app.state.redis,
+        local_fast_path=RATE_LIMIT_CONFIG["local_fast_path"]
+    ) if RATE_LIMIT_CONFIG["enabled"] else None
+    # 并发的相同分析请求只执行一次查询和计算
+    app.state.singleflight = SingleFlight(
+        app.state.redis if SINGLEFLIGHT_CONFIG["redis_lock"] else None,
+        timeout=SINGLEFLIGHT_CONFIG["timeout"],
+        lock_ttl=SINGLEFLIGHT_CONFIG["lock_ttl"],
+        poll_interval=SINGLEFLIGHT_CONFIG["poll_interval"]
+    )
+    # 实时推送：每个API进程只订阅一次Redis频道，再分发给所有WebSocket/SSE客户端
+    app.state.realtime_hub = RealtimeHub(
+        app.state.redis,
+        REALTIME_CONFIG["channel"],
+        throttle_interval=REALTIME_CONFIG["throttle_interval"],
+        max_codes_per_client=REALTIME_CONFIG["max_codes_per_client"]
+    )
+    try:
+        await app.state.redis.ping()
+        print(f"API服务器: 成功连接到Redis: {REDIS_CONFIG['host']}:{REDIS_CONFIG['port']}")
+    except Exception as e:
+        print(f"API服务器: Redis连接错误: {e}")
+    await app.state.realtime_hub.start()
+    try:
+        yield
+    finally:
+        await app.state.realtime_hub.stop()
+        await app.state.redis.aclose()
+        await dispose_async_engines()
+        dispose_all()
+
 # 创建FastAPI应用
 app = FastAPI(
     title="股票AI分析系统API",
     description="提供股票数据查询和AI分析的API服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 配置CORS - 限制只允许特定域名
@@ -155,6 +211,18 @@ class StockAllDataResponse(BaseModel):
     data: Optional[List[Dict[str, Any]]] = None
     info: Optional[StockInfo] = None
 
+class BatchAnalysisRequest(BaseModel):
+    codes: List[str]
+    days: int = 30
+    ktype: str = "K_DAY"
+
+class BatchAnalysisResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    results: Optional[Dict[str, Any]] = None
+    missing: Optional[List[str]] = None
+    timestamp: Optional[str] = None
+
 class StockRealtimeAnalysisResponse(BaseModel):
     success: bool
     message: Optional[str] = None
@@ -166,47 +234,195 @@ class RankedStocksResponse(BaseModel):
     stocks: Optional[List[Dict[str, Any]]] = None
     updated_at: Optional[str] = None
 
+class ScreenerResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    stocks: Optional[List[Dict[str, Any]]] = None
+    count: Optional[int] = None
+    updated_at: Optional[str] = None
+
 
-# 速率限制配置
-RATE_LIMIT_SECONDS = 60  # 时间窗口（秒）
-RATE_LIMIT_REQUESTS = 10  # 允许的最大请求数
+# 速率限制策略：默认按客户端IP计数，可按路由或API密钥覆盖
+DEFAULT_RATE_LIMIT_POLICY = RateLimitPolicy.from_config("default", RATE_LIMIT_CONFIG["default"])
+ROUTE_RATE_LIMIT_POLICIES = {
+    route: RateLimitPolicy.from_config(f"route:{route}", {**RATE_LIMIT_CONFIG["default"], **policy})
+    for route, policy in RATE_LIMIT_CONFIG["routes"].items()
+}
+KEY_RATE_LIMIT_POLICIES = {
+    key: RateLimitPolicy.from_config("apikey", {**RATE_LIMIT_CONFIG["default"], **policy})
+    for key, policy in RATE_LIMIT_CONFIG["api_keys"].items()
+}
 
 # 速率限制依赖函数
-async def rate_limit(request: Request):
-    # 使用全局的 Redis 客户端
-    global redis_client
+async def rate_limit(request: Request, response: Response):
+    limiter = getattr(request.app.state, "rate_limiter", None)
+    if limiter is None:
+        return True
     
-    if redis_client:
-        client_ip = request.client.host
-        key = f"ratelimit:{client_ip}"
-        current_time = int(time.time())
-        window_start = current_time - RATE_LIMIT_SECONDS
-        
-        # 使用Redis ZREMRANGEBYSCORE移除窗口外的请求
-        redis_client.zremrangebyscore(key, 0, window_start)
-        
-        # 计算当前窗口内的请求数
-        request_count = redis_client.zcard(key)
-        
-        # 检查是否超过限制
-        if request_count >= RATE_LIMIT_REQUESTS:
-            raise HTTPException(
-                status_code=HTTP_429_TOO_MANY_REQUESTS,
-                detail="请求过于频繁，请稍后再试"
-            )
-        
-        # 添加本次请求记录
-        redis_client.zadd(key, {current_time: current_time})
-        
-        # 设置过期时间，避免key永久存在
-        redis_client.expire(key, RATE_LIMIT_SECONDS)
+    # 按API密钥配置了策略时按密钥计数，否则按客户端IP计数（路由策略单独计数）
+    api_key = request.headers.get(API_KEY_NAME)
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    if api_key in KEY_RATE_LIMIT_POLICIES:
+        policy = KEY_RATE_LIMIT_POLICIES[api_key]
+        identity = identity_for_api_key(api_key)
+    else:
+        policy = ROUTE_RATE_LIMIT_POLICIES.get(route, DEFAULT_RATE_LIMIT_POLICY)
+        identity = request.client.host
     
+    result = await limiter.hit(policy, identity)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=HTTP_429_TOO_MANY_REQUESTS,
+            detail="请求过于频繁，请稍后再试",
+            headers={
+                "Retry-After": str(max(1, math.ceil(result.retry_after))),
+                "X-RateLimit-Limit": str(result.limit),
+                "X-RateLimit-Remaining": "0"
+            }
+        )
+    
+    response.headers["X-RateLimit-Limit"] = str(result.limit)
+    response.headers["X-RateLimit-Remaining"] = str(result.remaining)
     return True
 
-# 创建数据库连接
-def get_db_engine() -> Engine:
-    conn_str = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-    return create_engine(conn_str)
+# 获取异步数据库引擎（应用生命周期内共享的连接池）
+def get_db_engine(request: Request) -> AsyncEngine:
+    return request.app.state.db_engine
+
+# 带数据版本的响应缓存：compute 返回None（例如没有数据）时不缓存
+# 未命中时并发的相同请求合并为一次计算
+async def cached_response(request: Request, endpoint, code, params, compute, table='stock_price', ttl=None):
+    cache = getattr(request.app.state, "response_cache", None)
+    singleflight = getattr(request.app.state, "singleflight", None)
+    if cache is None:
+        if singleflight is None:
+            return await compute()
+        key = ":".join([endpoint, code] + [f"{k}={params[k]}" for k in sorted(params)])
+        return await singleflight.do(key, compute)
+    result, _ = await cache.get_or_compute(endpoint, code, params, compute, table=table,
+                                           singleflight=singleflight, ttl=ttl)
+    return result
+
+# 一次查询多只股票最近若干天的K线，返回包含 code 列的列式字典
+async def fetch_batch_price_columns(engine: AsyncEngine, table, codes, days):
+    end_date = datetime.now()
+    query = text(f"""
+    SELECT code, time,
+           CAST(open AS DOUBLE PRECISION) AS open,
+           CAST(close AS DOUBLE PRECISION) AS close,
+           CAST(high AS DOUBLE PRECISION) AS high,
+           CAST(low AS DOUBLE PRECISION) AS low,
+           volume,
+           CAST(turnover AS DOUBLE PRECISION) AS turnover
+    FROM {table}
+    WHERE code = ANY(:codes) AND time BETWEEN :start_date AND :end_date
+    ORDER BY code, time
+    """)
+    async with engine.connect() as conn:
+        result = await conn.execute(query, {"codes": list(codes),
+                                            "start_date": end_date - timedelta(days=days),
+                                            "end_date": end_date})
+        names = list(result.keys())
+        rows = result.all()
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*rows))}
+
+# 查询指定股票最近若干天的K线
+async def fetch_price_data(engine: AsyncEngine, table, code, days):
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+    query = text(f"""
+    SELECT time, code, open, close, high, low, volume, turnover
+    FROM {table}
+    WHERE code = :code AND time BETWEEN :start_date AND :end_date
+    ORDER BY time
+    """)
+    async with engine.connect() as conn:
+        result = await conn.execute(query, {"code": code, 
+                                            "start_date": start_date, 
+                                            "end_date": end_date})
+        return [price_row_to_dict(row) for row in result]
+
+# 按列查询K线（列式/MessagePack/Arrow 格式使用），days为None时返回全部数据
+async def fetch_price_columns(engine: AsyncEngine, table, code, days=None):
+    params = {"code": code}
+    condition = "code = :code"
+    if days is not None:
+        params["end_date"] = datetime.now()
+        params["start_date"] = params["end_date"] - timedelta(days=days)
+        condition += " AND time BETWEEN :start_date AND :end_date"
+    query = text(f"""{PRICE_COLUMNS_SELECT}
+    FROM {table}
+    WHERE {condition}
+    ORDER BY time
+    """)
+    async with engine.connect() as conn:
+        result = await conn.execute(query, params)
+        return rows_to_columns(result.all())
+
+# 按时间桶聚合K线（开盘取第一根、收盘取最后一根、成交量求和），origin 指定桶的对齐起点
+async def fetch_bucketed_columns(engine: AsyncEngine, table, code, bucket, origin=None):
+    bucket_expr = ("time_bucket(CAST(:bucket AS INTERVAL), time, CAST(:origin AS TIMESTAMP))" if origin
+                   else "time_bucket(CAST(:bucket AS INTERVAL), time)")
+    query = text(f"""
+    SELECT {bucket_expr} AS bucket_time,
+           CAST(first(open, time) AS DOUBLE PRECISION) AS open,
+           CAST(last(close, time) AS DOUBLE PRECISION) AS close,
+           CAST(max(high) AS DOUBLE PRECISION) AS high,
+           CAST(min(low) AS DOUBLE PRECISION) AS low,
+           CAST(sum(volume) AS BIGINT) AS volume,
+           CAST(sum(turnover) AS DOUBLE PRECISION) AS turnover
+    FROM {table}
+    WHERE code = :code
+    GROUP BY bucket_time
+    ORDER BY bucket_time
+    """)
+    async with engine.connect() as conn:
+        result = await conn.execute(query, {"code": code, "bucket": bucket, "origin": origin})
+        return rows_to_columns(result.all())
+
+# 股票数据的时间跨度：优先读汇总表，没有汇总行时直接查价格表（走 (code, time) 索引）
+async def fetch_time_span(conn, code):
+    span = (await conn.execute(text("""
+    SELECT first_time, last_time FROM stock_summary WHERE code = :code
+    """), {"code": code})).fetchone()
+    if span is None or span.first_time is None:
+        span = (await conn.execute(text("""
+        SELECT MIN(time) AS first_time, MAX(time) AS last_time FROM stock_price WHERE code = :code
+        """), {"code": code})).fetchone()
+    return span.first_time, span.last_time
+
+# 服务端降采样：bucket 或 ohlc 方式按时间桶聚合，否则对收盘价做LTTB
+# 按时间桶聚合时桶数不超过 max_points（未指定时为 DOWNSAMPLE_MAX_POINTS），指定的桶过小时自动放宽
+async def fetch_downsampled_columns(engine: AsyncEngine, code, max_points, bucket, method):
+    if method == DOWNSAMPLE_OHLC or bucket:
+        async with engine.connect() as conn:
+            first_time, last_time = await fetch_time_span(conn, code)
+        if first_time is None:
+            return rows_to_columns([])
+        limit = max_points or DOWNSAMPLE_MAX_POINTS
+        # 指定的桶按默认方式对齐，跨度内最多产生 span // 桶宽 + 2 个桶
+        span = int((last_time - first_time).total_seconds())
+        if bucket and span // bucket_seconds(bucket) + 2 <= limit:
+            return await fetch_bucketed_columns(engine, "stock_price", code, bucket)
+        min_bucket = bucket_for_span(first_time, last_time, limit)
+        return await fetch_bucketed_columns(engine, "stock_price", code, min_bucket, origin=first_time)
+    columns = await fetch_price_columns(engine, "stock_price", code)
+    return lttb_columns(columns, max_points)
+
+# 将查询结果行转换为价格字典
+def price_row_to_dict(row):
+    return {
+        'time': row.time.isoformat(),
+        'code': row.code,
+        'open': float(row.open) if row.open else None,
+        'close': float(row.close) if row.close else None,
+        'high': float(row.high) if row.high else None,
+        'low': float(row.low) if row.low else None,
+        'volume': row.volume,
+        'turnover': float(row.turnover) if row.turnover else None
+    }
 
 # API端点: 获取当前跟踪的股票列表
 @app.get("/api/stocks", response_model=StockListResponse, tags=["股票配置"], 
@@ -215,7 +431,7 @@ async def get_stocks():
     """
     获取当前系统跟踪的所有股票代码列表
     """
-    return {"success": True, "message": "获取成功", "stocks": STOCKS_TO_TRACK}
+    return {"success": True, "message": "获取成功", "stocks": config.STOCKS_TO_TRACK}
 
 # API端点: 更新要跟踪的股票列表
 @app.post("/api/stocks", response_model=StockListResponse, tags=["股票配置"], 
@@ -227,64 +443,86 @@ async def update_stocks(stock_list: StockListRequest):
     - **stocks**: 新的股票代码列表
     """
     success, message = update_stocks_to_track(stock_list.stocks)
-    return {"success": success, "message": message, "stocks": STOCKS_TO_TRACK if success else None}
+    return {"success": success, "message": message, "stocks": config.STOCKS_TO_TRACK if success else None}
 
 # API端点: 获取股票数据
 @app.get("/api/stock_data", response_model=StockDataResponse, tags=["股票数据"], 
           dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
 async def get_stock_data(
+    request: Request,
     code: str = Query(..., description="股票代码，例如 US.AAPL 或 HK.00700"),
-    days: int = Query(30, description="获取多少天的数据，默认30天")
+    days: int = Query(30, description="获取多少天的数据，默认30天"),
+    ktype: str = Query("K_DAY", description="K线周期: K_1M, K_5M, K_15M, K_60M, K_DAY, K_WEEK"),
+    response_format: Optional[str] = Query(None, alias="format", description="响应格式: rows(默认), columns, msgpack, arrow")
 ):
     """
     获取指定股票的历史价格数据
     
     - **code**: 股票代码
     - **days**: 获取多少天的数据
+    - **ktype**: K线周期，默认日K
+    - **format**: 响应格式，也可以通过 Accept 头选择；非默认格式按列返回数据
     """
     try:
-        engine = get_db_engine()
-        with engine.connect() as conn:
-            # 计算日期范围
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-            
-            # 查询股票数据
-            query = text("""
-            SELECT time, code, open, close, high, low, volume, turnover
-            FROM stock_price
-            WHERE code = :code AND time BETWEEN :start_date AND :end_date
-            ORDER BY time
-            """)
-            
-            result = conn.execute(query, {"code": code, 
-                                          "start_date": start_date, 
-                                          "end_date": end_date})
-            
-            data = []
-            for row in result:
-                data.append({
-                    'time': row.time.isoformat(),
-                    'code': row.code,
-                    'open': float(row.open) if row.open else None,
-                    'close': float(row.close) if row.close else None,
-                    'high': float(row.high) if row.high else None,
-                    'low': float(row.low) if row.low else None,
-                    'volume': row.volume,
-                    'turnover': float(row.turnover) if row.turnover else None
-                })
-            
-            if not data:
-                return {"success": False, "message": "没有找到股票数据"}
-            
-            # 使用AI分析器生成分析结果
-            analysis_result = ai_analyzer.analyze_stock(data)
-            
+        table = table_for_ktype(ktype)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    fmt = negotiate_format(request, response_format,
+                           allowed=tuple(f for f in FORMATS if f not in STREAM_FORMATS))
+    
+    # 连续聚合周期的数据版本跟随其源表，但聚合要等刷新后才包含新数据，缓存不超过一个刷新周期
+    source_table = TIMEFRAMES[ktype].get('source', table)
+    cache_ttl = cache_ttl_for_ktype(ktype)
+    
+    if fmt != FORMAT_ROWS:
+        async def compute_columns():
+            columns = await fetch_price_columns(get_db_engine(request), table, code, days)
+            if not columns['time']:
+                return None
+            analysis_result = await run_in_threadpool(ai_analyzer.analyze_stock, columns, f"{ktype}:{code}:{days}")
             return {
-                "success": True, 
-                "data": data,
+                "success": True,
+                "code": code,
+                "ktype": ktype,
+                "columns": columns,
                 "analysis": analysis_result
             }
+        
+        try:
+            # 缓存格式无关的列式结果，编码在返回时进行
+            result = await cached_response(request, "stock_data", code,
+                                           {"days": days, "ktype": ktype, "shape": "columns"},
+                                           compute_columns, table=source_table, ttl=cache_ttl)
+        except SingleFlightTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"获取股票数据时出错: {str(e)}")
+        if result is None:
+            return {"success": False, "message": "没有找到股票数据"}
+        return encode_columns(result, fmt)
+    
+    async def compute():
+        data = await fetch_price_data(get_db_engine(request), table, code, days)
+        if not data:
+            return None
+        
+        # 使用AI分析器生成分析结果
+        analysis_result = await run_in_threadpool(ai_analyzer.analyze_stock, data, f"{ktype}:{code}:{days}")
+        
+        return {
+            "success": True, 
+            "data": data,
+            "analysis": analysis_result
+        }
+    
+    try:
+        result = await cached_response(request, "stock_data", code, {"days": days, "ktype": ktype},
+                                       compute, table=source_table, ttl=cache_ttl)
+        if result is None:
+            return {"success": False, "message": "没有找到股票数据"}
+        return result
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取股票数据时出错: {str(e)}")
 
@@ -292,6 +530,7 @@ async def get_stock_data(
 @app.get("/api/stock_analysis", response_model=StockAnalysisResponse, tags=["股票分析"], 
           dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
 async def get_stock_analysis(
+    request: Request,
     code: str = Query(..., description="股票代码，例如 US.AAPL 或 HK.00700"),
     days: int = Query(30, description="分析多少天的数据，默认30天")
 ):
@@ -301,178 +540,177 @@ async def get_stock_analysis(
     - **code**: 股票代码
     - **days**: 分析多少天的数据
     """
+    async def compute():
+        data = await fetch_price_data(get_db_engine(request), "stock_price", code, days)
+        if not data:
+            return None
+        
+        # 使用AI分析器生成分析结果
+        analysis_result = await run_in_threadpool(ai_analyzer.analyze_stock, data, f"K_DAY:{code}:{days}")
+        
+        return {
+            "success": True, 
+            "analysis": analysis_result
+        }
+    
     try:
-        engine = get_db_engine()
-        with engine.connect() as conn:
-            # 计算日期范围
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-            
-            # 查询股票数据
-            query = text("""
-            SELECT time, code, open, close, high, low, volume, turnover
-            FROM stock_price
-            WHERE code = :code AND time BETWEEN :start_date AND :end_date
-            ORDER BY time
-            """)
-            
-            result = conn.execute(query, {"code": code, 
-                                          "start_date": start_date, 
-                                          "end_date": end_date})
-            
-            data = []
-            for row in result:
-                data.append({
-                    'time': row.time.isoformat(),
-                    'code': row.code,
-                    'open': float(row.open) if row.open else None,
-                    'close': float(row.close) if row.close else None,
-                    'high': float(row.high) if row.high else None,
-                    'low': float(row.low) if row.low else None,
-                    'volume': row.volume,
-                    'turnover': float(row.turnover) if row.turnover else None
-                })
-            
-            if not data:
-                return {"success": False, "message": "没有找到股票数据"}
-            
-            # 使用AI分析器生成分析结果
-            analysis_result = ai_analyzer.analyze_stock(data)
-            
-            return {
-                "success": True, 
-                "analysis": analysis_result
-            }
+        result = await cached_response(request, "stock_analysis", code, {"days": days}, compute)
+        if result is None:
+            return {"success": False, "message": "没有找到股票数据"}
+        return result
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取股票分析时出错: {str(e)}")
 
 # API端点: 获取所有存储的股票数据
 @app.get("/api/stored_stocks", response_model=StoredStocksResponse, tags=["股票数据"], 
           dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
-async def get_stored_stocks():
+async def get_stored_stocks(request: Request):
     """
     获取系统中所有存储的股票数据概览
     """
     try:
-        engine = get_db_engine()
-        with engine.connect() as conn:
-            # 获取所有唯一的股票代码
-            stock_codes_query = text("""
-            SELECT DISTINCT code FROM stock_price
-            ORDER BY code
-            """)
-            
-            result = conn.execute(stock_codes_query)
-            stock_codes = [row[0] for row in result]
-            
-            # 对每只股票获取最新的数据点和数据总量
-            stocks_data = []
-            for code in stock_codes:
-                # 获取最新两天数据（用于计算涨跌幅）
-                latest_query = text("""
-                SELECT time, code, open, close, high, low, volume, turnover 
-                FROM stock_price
-                WHERE code = :code
-                ORDER BY time DESC
-                LIMIT 2
-                """)
-                
-                latest_result = conn.execute(latest_query, {"code": code})
-                latest_rows = latest_result.fetchall()
-                latest_row = latest_rows[0] if latest_rows else None
-                previous_row = latest_rows[1] if len(latest_rows) > 1 else None
-                
-                # 首先，获取所有股票的名称
-                names_query = text("""
-                SELECT code, name FROM stock_info
-                WHERE code IN :codes
-                """)
-                            
-                names_result = conn.execute(names_query, {"codes": tuple(stock_codes) if len(stock_codes) > 1 else f"('{stock_codes[0]}')"})
-                stock_names = {row.code: row.name for row in names_result}
-
-                # 获取记录总数和日期范围
-                stats_query = text("""
-                SELECT 
-                    COUNT(*) as record_count,
-                    MIN(time) as earliest_date,
-                    MAX(time) as latest_date
-                FROM stock_price
-                WHERE code = :code
-                """)
-                
-                stats_result = conn.execute(stats_query, {"code": code})
-                stats_row = stats_result.fetchone()
-                
-                if latest_row and stats_row:
-                    # 计算涨跌幅
-                    change_percent = None
-                    if previous_row and latest_row.close and previous_row.close:
-                        change = float(latest_row.close) - float(previous_row.close)
-                        change_percent = (change / float(previous_row.close)) * 100
-                    
-                    stocks_data.append({
-                        'code': latest_row.code,
-                        'name': stock_names.get(latest_row.code, ''),
-                        'latest_data': {
-                            'time': latest_row.time.isoformat(),
-                            'open': float(latest_row.open) if latest_row.open else None,
-                            'close': float(latest_row.close) if latest_row.close else None,
-                            'high': float(latest_row.high) if latest_row.high else None,
-                            'low': float(latest_row.low) if latest_row.low else None,
-                            'volume': latest_row.volume,
-                            'turnover': float(latest_row.turnover) if latest_row.turnover else None,
-                            'change_percent': change_percent
-                        },
-                        'stats': {
-                            'record_count': stats_row.record_count,
-                            'earliest_date': stats_row.earliest_date.isoformat() if stats_row.earliest_date else None,
-                            'latest_date': stats_row.latest_date.isoformat() if stats_row.latest_date else None
-                        }
-                    })
-            
-            # 获取总体统计信息
-            summary_query = text("""
-            SELECT 
-                COUNT(DISTINCT code) as stock_count,
-                COUNT(*) as total_records,
-                MIN(time) as earliest_date,
-                MAX(time) as latest_date
-            FROM stock_price
-            """)
-            
-            summary_result = conn.execute(summary_query)
-            summary_row = summary_result.fetchone()
-            
-            summary_data = {
-                'stock_count': summary_row.stock_count,
-                'total_records': summary_row.total_records,
-                'earliest_date': summary_row.earliest_date.isoformat() if summary_row.earliest_date else None,
-                'latest_date': summary_row.latest_date.isoformat() if summary_row.latest_date else None
-            }
+        engine = get_db_engine(request)
+        async with engine.connect() as conn:
+            # 汇总表由数据写入时增量维护，一次索引读取即可得到所有股票的概览
+            result = await conn.execute(text("""
+            SELECT s.code, i.name, s.record_count, s.first_time, s.last_time,
+                   s.latest_open, s.latest_close, s.latest_high, s.latest_low,
+                   s.latest_volume, s.latest_turnover, s.previous_close
+            FROM stock_summary s
+            LEFT JOIN stock_info i ON i.code = s.code
+            ORDER BY s.code
+            """))
+            rows = result.fetchall()
+        
+        stocks_data = []
+        for row in rows:
+            # 计算涨跌幅
+            change_percent = None
+            if row.previous_close and row.latest_close:
+                change = float(row.latest_close) - float(row.previous_close)
+                change_percent = (change / float(row.previous_close)) * 100
             
-            return {
-                "success": True, 
-                "stocks": stocks_data,
-                "summary": summary_data
-            }
+            stocks_data.append({
+                'code': row.code,
+                'name': row.name or '',
+                'latest_data': {
+                    'time': row.last_time.isoformat() if row.last_time else None,
+                    'open': float(row.latest_open) if row.latest_open else None,
+                    'close': float(row.latest_close) if row.latest_close else None,
+                    'high': float(row.latest_high) if row.latest_high else None,
+                    'low': float(row.latest_low) if row.latest_low else None,
+                    'volume': row.latest_volume,
+                    'turnover': float(row.latest_turnover) if row.latest_turnover else None,
+                    'change_percent': change_percent
+                },
+                'stats': {
+                    'record_count': row.record_count,
+                    'earliest_date': row.first_time.isoformat() if row.first_time else None,
+                    'latest_date': row.last_time.isoformat() if row.last_time else None
+                }
+            })
+        
+        # 总体统计直接由每只股票的汇总得出
+        first_times = [row.first_time for row in rows if row.first_time]
+        last_times = [row.last_time for row in rows if row.last_time]
+        summary_data = {
+            'stock_count': len(rows),
+            'total_records': sum(row.record_count for row in rows),
+            'earliest_date': min(first_times).isoformat() if first_times else None,
+            'latest_date': max(last_times).isoformat() if last_times else None
+        }
+        
+        return {
+            "success": True, 
+            "stocks": stocks_data,
+            "summary": summary_data
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取存储的股票数据时出错: {str(e)}")
 
+# 查询股票基本信息
+async def fetch_stock_info(conn, code):
+    info_result = await conn.execute(text("""
+    SELECT * FROM stock_info
+    WHERE code = :code
+    LIMIT 1
+    """), {"code": code})
+    info_row = info_result.fetchone()
+    if not info_row:
+        return None
+    return {
+        'code': info_row.code,
+        'name': info_row.name,
+        'lot_size': info_row.lot_size,
+        'stock_type': info_row.stock_type,
+        'stock_child_type': info_row.stock_child_type,
+        'stock_owner': info_row.stock_owner,
+        'listing_date': info_row.listing_date.isoformat() if info_row.listing_date else None
+    }
+
 # API端点: 获取单只股票的所有数据
 @app.get("/api/stock_all_data", response_model=StockAllDataResponse, tags=["股票数据"], 
           dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
 async def get_stock_all_data(
-    code: str = Query(..., description="股票代码，例如 US.AAPL 或 HK.00700")
+    request: Request,
+    code: str = Query(..., description="股票代码，例如 US.AAPL 或 HK.00700"),
+    response_format: Optional[str] = Query(None, alias="format",
+                                           description="响应格式: rows(默认), columns, msgpack, arrow, ndjson, csv"),
+    max_points: Optional[int] = Query(None, ge=3, le=DOWNSAMPLE_MAX_POINTS, description="最多返回的数据点数，超出时在服务端降采样"),
+    bucket: Optional[str] = Query(None, description="按时间桶聚合K线，例如 '1 week'"),
+    downsample: Optional[str] = Query(None, description="降采样方式: lttb(价格折线，默认) 或 ohlc(K线按桶聚合)")
 ):
     """
     获取指定股票的所有历史数据和基本信息
     
     - **code**: 股票代码
+    - **format**: 响应格式，也可以通过 Accept 头选择；columns/msgpack/arrow 按列返回数据，
+      ndjson/csv 通过服务端游标流式返回K线（不包含基本信息）
+    - **max_points** / **bucket** / **downsample**: 服务端降采样。lttb 保留收盘价走势的关键点，
+      成交量按桶求和；ohlc 或指定 bucket 时按时间桶聚合开高低收，未指定 bucket 时按 max_points 自动计算，
+      指定的 bucket 会产生超过 max_points（默认20000）个桶时自动放宽；只指定 downsample 时 max_points 取默认值
     """
+    fmt = negotiate_format(request, response_format)
+    if max_points or bucket or downsample:
+        if fmt in STREAM_FORMATS:
+            raise HTTPException(status_code=400, detail="流式格式不支持降采样")
+        if downsample and downsample not in DOWNSAMPLE_METHODS:
+            raise HTTPException(status_code=400, detail=f"不支持的降采样方式: {downsample}")
+        if downsample == DOWNSAMPLE_LTTB and bucket:
+            raise HTTPException(status_code=400, detail="lttb 降采样不能与 bucket 同时使用")
+        try:
+            bucket = parse_bucket(bucket) if bucket else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not bucket and not max_points:
+            # 只指定了降采样方式时使用默认的点数上限
+            max_points = DOWNSAMPLE_MAX_POINTS
+        
+        try:
+            engine = get_db_engine(request)
+            columns = await fetch_downsampled_columns(engine, code, max_points, bucket, downsample)
+            async with engine.connect() as conn:
+                stock_info = await fetch_stock_info(conn, code)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"获取股票历史数据时出错: {str(e)}")
+        if fmt != FORMAT_ROWS:
+            return encode_columns({"success": True, "code": code, "columns": columns, "info": stock_info}, fmt)
+        return {"success": True, "code": code, "data": columns_to_rows(code, columns), "info": stock_info}
+    
+    if fmt in STREAM_FORMATS:
+        return StreamingResponse(stream_price_rows(get_db_engine(request), "stock_price", code, fmt),
+                                 media_type=MEDIA_TYPES[fmt])
     try:
-        engine = get_db_engine()
-        with engine.connect() as conn:
+        engine = get_db_engine(request)
+        if fmt != FORMAT_ROWS:
+            columns = await fetch_price_columns(engine, "stock_price", code)
+            async with engine.connect() as conn:
+                stock_info = await fetch_stock_info(conn, code)
+            return encode_columns({"success": True, "code": code, "columns": columns, "info": stock_info}, fmt)
+        
+        async with engine.connect() as conn:
             # 查询所有数据
             query = text("""
             SELECT time, code, open, close, high, low, volume, turnover
@@ -481,42 +719,12 @@ async def get_stock_all_data(
             ORDER BY time
             """)
             
-            result = conn.execute(query, {"code": code})
+            result = await conn.execute(query, {"code": code})
             
-            data = []
-            for row in result:
-                data.append({
-                    'time': row.time.isoformat(),
-                    'code': row.code,
-                    'open': float(row.open) if row.open else None,
-                    'close': float(row.close) if row.close else None,
-                    'high': float(row.high) if row.high else None,
-                    'low': float(row.low) if row.low else None,
-                    'volume': row.volume,
-                    'turnover': float(row.turnover) if row.turnover else None
-                })
+            data = [price_row_to_dict(row) for row in result]
             
             # 获取股票基本信息
-            info_query = text("""
-            SELECT * FROM stock_info
-            WHERE code = :code
-            LIMIT 1
-            """)
-            
-            info_result = conn.execute(info_query, {"code": code})
-            info_row = info_result.fetchone()
-            
-            stock_info = None
-            if info_row:
-                stock_info = {
-                    'code': info_row.code,
-                    'name': info_row.name,
-                    'lot_size': info_row.lot_size,
-                    'stock_type': info_row.stock_type,
-                    'stock_child_type': info_row.stock_child_type,
-                    'stock_owner': info_row.stock_owner,
-                    'listing_date': info_row.listing_date.isoformat() if info_row.listing_date else None
-                }
+            stock_info = await fetch_stock_info(conn, code)
             
             return {
                 "success": True, 
@@ -527,6 +735,135 @@ async def get_stock_all_data(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取股票历史数据时出错: {str(e)}")
 
+# API端点: 多只股票K线批量导出
+@app.get("/api/export", tags=["股票数据"], 
+          dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
+async def export_stock_data(
+    request: Request,
+    codes: str = Query(..., description="逗号分隔的股票代码，例如 US.AAPL,HK.00700"),
+    start: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
+    ktype: str = Query("K_DAY", description="K线周期: K_1M, K_5M, K_15M, K_60M, K_DAY, K_WEEK")
+):
+    """
+    以CSV流的形式导出多只股票的K线（数据库 COPY ... TO STDOUT 直接输出）
+    
+    - **codes**: 股票代码列表
+    - **start** / **end**: 可选的日期范围
+    - **ktype**: K线周期，默认日K
+    """
+    code_list = [c.strip() for c in codes.split(",") if c.strip()]
+    if not code_list:
+        raise HTTPException(status_code=400, detail="至少需要一个股票代码")
+    try:
+        table = table_for_ktype(ktype)
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else None
+        end_date = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) - timedelta(microseconds=1) if end else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filename = f"stock_{ktype.lower()}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+    return StreamingResponse(
+        copy_export(get_db_engine(request), table, code_list, start_date, end_date),
+        media_type=MEDIA_TYPES[FORMAT_CSV],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# API端点: 多只股票批量分析
+@app.post("/api/batch_analysis", response_model=BatchAnalysisResponse, tags=["股票分析"], 
+          dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
+async def batch_analysis(request: Request, batch: BatchAnalysisRequest):
+    """
+    一次获取多只股票的AI分析结果（只计一次请求配额）
+    
+    - **codes**: 股票代码列表
+    - **days**: 分析多少天的数据，默认30天
+    - **ktype**: K线周期，默认日K
+    """
+    codes = list(dict.fromkeys(c.strip() for c in batch.codes if c.strip()))
+    if not codes:
+        raise HTTPException(status_code=400, detail="至少需要一个股票代码")
+    if len(codes) > BATCH_ANALYSIS_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"一次最多分析 {BATCH_ANALYSIS_MAX_CODES} 只股票")
+    try:
+        table = table_for_ktype(batch.ktype)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def compute():
+        # 所有股票一次查询，指标在一个DataFrame上按股票分组计算
+        columns = await fetch_batch_price_columns(get_db_engine(request), table, codes, batch.days)
+        results = await run_in_threadpool(ai_analyzer.analyze_stocks, columns) if columns['code'] else {}
+        return {
+            "success": True,
+            "results": results,
+            "missing": [c for c in codes if c not in results],
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    try:
+        singleflight = getattr(request.app.state, "singleflight", None)
+        if singleflight is None:
+            return await compute()
+        digest = hashlib.sha1(",".join(sorted(codes)).encode()).hexdigest()
+        key = f"batch_analysis:{digest}:days={batch.days}:ktype={batch.ktype}"
+        return await singleflight.do(key, compute)
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量分析股票时出错: {str(e)}")
+
+# API端点: 全部跟踪股票的选股表
+@app.get("/api/screener", response_model=ScreenerResponse, tags=["股票分析"], 
+          dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
+async def get_screener(
+    request: Request,
+    days: int = Query(180, description="用于计算指标的天数，默认180天"),
+    action: Optional[str] = Query(None, description="只返回指定建议的股票: BUY, SELL, HOLD"),
+    max_level: Optional[int] = Query(None, description="只返回推荐级别不高于该值的股票"),
+    limit: Optional[int] = Query(None, ge=1, description="最多返回的股票数量")
+):
+    """
+    对所有跟踪的股票同时计算指标并应用推荐规则，按 (推荐级别, 股票代码) 排序
+    
+    - **days**: 用于计算指标的天数
+    - **action** / **max_level**: 过滤条件
+    - **limit**: 最多返回的股票数量
+    """
+    if action is not None and action not in ACTION_NAMES.values():
+        raise HTTPException(status_code=400, detail=f"无效的建议类型: {action}")
+    
+    # 跟踪列表可能在运行时通过 /api/stocks 更新，在调用时读取，合并键包含列表摘要
+    codes = list(config.STOCKS_TO_TRACK)
+    
+    async def compute():
+        # 所有股票一次查询，在 (K线 × 股票) 矩阵上向量化计算
+        columns = await fetch_batch_price_columns(get_db_engine(request), "stock_price", codes, days)
+        table = await run_in_threadpool(lambda: PricePanel.from_columns(columns, presorted=True).screener())
+        return [dict(zip(table, values)) for values in zip(*table.values())]
+    
+    try:
+        singleflight = getattr(request.app.state, "singleflight", None)
+        codes_hash = hashlib.sha1(",".join(sorted(codes)).encode()).hexdigest()[:12]
+        key = f"screener:days={days}:codes={codes_hash}"
+        stocks = await (singleflight.do(key, compute) if singleflight else compute())
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"生成选股表时出错: {str(e)}")
+    
+    if action is not None:
+        stocks = [s for s in stocks if s['action'] == action]
+    if max_level is not None:
+        stocks = [s for s in stocks if s['recommendation_level'] <= max_level]
+    stocks = sorted(stocks, key=lambda s: (s['recommendation_level'], s['code']))[:limit]
+    return {
+        "success": True,
+        "stocks": stocks,
+        "count": len(stocks),
+        "updated_at": datetime.now().isoformat()
+    }
+
 # 新API端点: 获取实时股票分析
 @app.get("/api/realtime_analysis", response_model=StockRealtimeAnalysisResponse, tags=["实时分析"], 
           dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
@@ -540,7 +877,7 @@ async def get_realtime_analysis(
     """
     try:
         # 使用AI分析器生成实时分析结果
-        analysis_result = ai_analyzer.analyze_realtime_stock(code)
+        analysis_result = await run_in_threadpool(ai_analyzer.analyze_realtime_stock, code)
         
         if "error" in analysis_result:
             return {"success": False, "message": analysis_result["error"]}
@@ -555,13 +892,24 @@ async def get_realtime_analysis(
 # 新API端点: 获取排序后的股票列表
 @app.get("/api/ranked_stocks", response_model=RankedStocksResponse, tags=["实时分析"], 
           dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
-async def get_ranked_stocks():
+async def get_ranked_stocks(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, description="只返回排名前N的股票"),
+    level: Optional[int] = Query(None, description="只返回指定推荐级别的股票"),
+    min_level: Optional[int] = Query(None, description="推荐级别下限（包含）"),
+    max_level: Optional[int] = Query(None, description="推荐级别上限（包含）")
+):
     """
     获取根据均线策略排序的股票列表
+    
+    - **limit**: 只返回前N只股票
+    - **level** / **min_level** / **max_level**: 按推荐级别过滤
     """
+    if level is not None:
+        min_level = max_level = level
     try:
-        # 使用AI分析器获取排序后的股票
-        ranked_stocks = ai_analyzer.get_ranked_stocks()
+        # 排名由数据接入进程维护：一次 ZRANGE 加一次流水线读取快照
+        ranked_stocks = await read_ranking(request.app.state.redis, limit, min_level, max_level)
         
         if not ranked_stocks:
             return {"success": False, "message": "没有获取到实时股票数据"}
@@ -578,20 +926,20 @@ async def get_ranked_stocks():
 # 新API端点: 获取所有股票名称
 @app.get("/api/stock_names", tags=["股票数据"], 
           dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
-async def get_stock_names():
+async def get_stock_names(request: Request):
     """
     获取所有追踪的股票代码和对应的名称
     """
     try:
-        engine = get_db_engine()
-        with engine.connect() as conn:
+        engine = get_db_engine(request)
+        async with engine.connect() as conn:
             query = text("""
             SELECT code, name FROM stock_info
             WHERE name IS NOT NULL
             ORDER BY code
             """)
             
-            result = conn.execute(query)
+            result = await conn.execute(query)
             stock_names = {}
             
             for row in result:
@@ -604,6 +952,130 @@ async def get_stock_names():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取股票名称时出错: {str(e)}")
 
+def parse_codes(codes):
+    return [c.strip() for c in (codes or "").split(",") if c.strip()]
+
+# 实时推送的连接只在建立时验证一次：浏览器的 WebSocket/EventSource 不能设置请求头，
+# 因此也接受 api_key 查询参数
+def realtime_authorized(headers, api_key=None):
+    if (headers.get(API_KEY_NAME) or api_key) != API_KEY:
+        return False
+    origin = headers.get("origin") or headers.get("referer") or ""
+    return not origin or any(origin.startswith(o) for o in ALLOWED_ORIGINS)
+
+# WebSocket 订阅命令中的股票列表必须是字符串数组（字符串会被逐字符订阅，嵌套对象无法哈希）
+def command_codes(command, name):
+    value = command.get(name)
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(code, str) for code in value):
+        raise ValueError(f"{name} 必须是股票代码字符串数组")
+    return [code.strip() for code in value if code.strip()]
+
+def realtime_message(event, data):
+    return {"type": event, "data": data, "timestamp": time.time()}
+
+# API端点: WebSocket实时推送
+@app.websocket("/ws/realtime")
+async def realtime_websocket(
+    websocket: WebSocket,
+    codes: Optional[str] = Query(None, description="逗号分隔的股票代码"),
+    api_key: Optional[str] = Query(None)
+):
+    """
+    订阅股票的实时价格、均线和推荐级别变化
+
+    连接后先收到一条 snapshot 消息，之后按节流间隔收到合并后的 update 消息。
+    客户端可以发送 {"subscribe": [...]} 或 {"unsubscribe": [...]} 调整订阅的股票。
+    """
+    if not realtime_authorized(websocket.headers, api_key):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    hub = websocket.app.state.realtime_hub
+    subscriber = hub.subscribe(parse_codes(codes))
+
+    async def send_updates():
+        await websocket.send_json(realtime_message("snapshot", await hub.snapshot(subscriber.codes)))
+        async for batch in hub.updates(subscriber):
+            await websocket.send_json(realtime_message("update", batch))
+
+    async def receive_commands():
+        while True:
+            try:
+                command = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json(realtime_message("error", "无效的消息格式"))
+                continue
+            if not isinstance(command, dict):
+                await websocket.send_json(realtime_message("error", "无效的消息格式"))
+                continue
+            try:
+                add, remove = command_codes(command, "subscribe"), command_codes(command, "unsubscribe")
+            except ValueError as e:
+                await websocket.send_json(realtime_message("error", str(e)))
+                continue
+            added = hub.update_codes(subscriber, add=add, remove=remove)
+            if added:
+                await websocket.send_json(realtime_message("snapshot", await hub.snapshot(added)))
+
+    tasks = [asyncio.ensure_future(send_updates()), asyncio.ensure_future(receive_commands())]
+    try:
+        # 任一方向结束（客户端断开或发送失败）即关闭连接
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None \
+                    and not isinstance(task.exception(), WebSocketDisconnect):
+                print(f"WebSocket实时推送出错: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        hub.unsubscribe(subscriber)
+
+# API端点: SSE实时推送
+@app.get("/api/realtime/stream", tags=["实时分析"], dependencies=[Depends(rate_limit)])
+async def realtime_stream(
+    request: Request,
+    codes: str = Query(..., description="逗号分隔的股票代码，例如 US.AAPL,HK.00700"),
+    api_key: Optional[str] = Query(None)
+):
+    """
+    以 Server-Sent Events 推送股票的实时价格、均线和推荐级别变化
+
+    先发送 snapshot 事件，之后按节流间隔发送合并后的 update 事件，空闲时发送心跳注释。
+    """
+    if not realtime_authorized(request.headers, api_key):
+        raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="无效的API密钥")
+    code_list = parse_codes(codes)
+    if not code_list:
+        raise HTTPException(status_code=400, detail="至少需要一个股票代码")
+
+    hub = request.app.state.realtime_hub
+
+    def sse_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+    async def events():
+        # 在生成器内订阅，响应结束或客户端断开时一定会取消订阅
+        subscriber = hub.subscribe(code_list)
+        try:
+            yield sse_event("snapshot", await hub.snapshot(subscriber.codes))
+            async for batch in hub.updates(subscriber, heartbeat=REALTIME_CONFIG["heartbeat_interval"]):
+                if batch is None:
+                    yield ": heartbeat\n\n"
+                else:
+                    yield sse_event("update", batch)
+        finally:
+            hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # 健康检查端点
 @app.get("/health", tags=["系统"], 
           dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
@@ -613,6 +1085,40 @@ async def health_check():
     """
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+# 数据库连接池状态端点
+@app.get("/api/pool_stats", tags=["系统"], 
+          dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
+async def pool_stats():
+    """
+    获取数据库连接池的使用情况（已签出连接、溢出连接、等待时间）
+    """
+    return {"success": True, "pools": get_pool_stats(), "timestamp": datetime.now().isoformat()}
+
+# 响应缓存统计端点
+@app.get("/api/cache_stats", tags=["系统"], 
+          dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
+async def cache_stats(request: Request):
+    """
+    获取响应缓存的命中率、条目数量和淘汰次数，以及请求合并、速率限制和增量指标状态的统计
+
+    indicator_state.rebuild_rate 为按完整序列重建状态的比例；查询窗口起点每天前移时状态会增量更新，
+    该比例持续偏高说明历史数据频繁被改写或增量路径失效
+    """
+    cache = getattr(request.app.state, "response_cache", None)
+    singleflight = getattr(request.app.state, "singleflight", None)
+    try:
+        return {
+            "success": True,
+            "cache": await cache.stats() if cache else None,
+            "singleflight": singleflight.stats() if singleflight else None,
+            "rate_limiter": request.app.state.rate_limiter.stats() if getattr(request.app.state, "rate_limiter", None) else None,
+            "realtime": request.app.state.realtime_hub.stats(),
+            "indicator_state": ai_analyzer.state_store.stats() if ai_analyzer.state_store else None,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取缓存统计时出错: {str(e)}")
+
 # 系统信息端点
 @app.get("/info", tags=["系统"], 
           dependencies=[Depends(get_api_key), Depends(check_referer), Depends(rate_limit)])
@@ -624,8 +1130,8 @@ async def system_info():
         "name": "股票AI分析系统",
         "version": "1.0.0",
         "api_version": "1.0.0",
-        "tracked_stocks_count": len(STOCKS_TO_TRACK),
-        "tracked_stocks": STOCKS_TO_TRACK
+        "tracked_stocks_count": len(config.STOCKS_TO_TRACK),
+        "tracked_stocks": config.STOCKS_TO_TRACK
     }
 
 
@@ -0,0 +1,256 @@
+# Backend/backfill.py
+import argparse
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from futu import RET_OK, KLType, OpenQuoteContext
+import redis
+from config import BACKFILL_CONFIG, FUTU_CONFIG, STOCKS_TO_TRACK, REDIS_CONFIG
+from bulk_loader import upsert_stock_prices, add_change_listener
+from db_engine import get_engine
+from timeframes import RAW_KTYPES, table_for_ktype, refresh_timeframe_aggregates
+from response_cache import bump_data_versions
+
+
+class TokenBucket:
+    """
+    令牌桶限速器（线程安全）
+
+    Futu 历史K线接口限制每 30 秒最多 60 次请求，所有并发请求共享同一个令牌桶。
+    """
+
+    def __init__(self, capacity, window):
+        """
+        参数:
+        capacity (int): 时间窗口内允许的请求数
+        window (float): 时间窗口（秒）
+        """
+        self.capacity = float(capacity)
+        self.rate = capacity / float(window)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """阻塞直到获得令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_history_quota(quote_ctx):
+    """
+    查询历史K线额度
+
+    返回:
+    tuple: (剩余额度, 近30天已使用额度的股票代码集合)，查询失败时返回 (None, set())
+    """
+    try:
+        ret, data = quote_ctx.get_history_kl_quota(get_detail=True)
+        if ret != RET_OK:
+            print(f"获取历史K线额度失败: {data}")
+            return None, set()
+        used_quota, remain_quota, detail_list = data
+        used_codes = {item['code'] for item in (detail_list or []) if 'code' in item}
+        print(f"历史K线额度: 已使用 {used_quota}, 剩余 {remain_quota}")
+        return remain_quota, used_codes
+    except Exception as e:
+        print(f"获取历史K线额度时出错: {e}")
+        return None, set()
+
+
+def plan_codes_within_quota(quote_ctx, codes):
+    """
+    根据剩余额度筛选可以请求的股票
+
+    近30天内已请求过的股票不再消耗额度，新股票每只消耗一个额度。
+
+    返回:
+    tuple: (可请求的股票列表, 因额度不足跳过的股票列表)
+    """
+    remain_quota, used_codes = get_history_quota(quote_ctx)
+    if remain_quota is None:
+        return list(codes), []
+
+    allowed, skipped = [], []
+    for code in codes:
+        if code in used_codes:
+            allowed.append(code)
+        elif remain_quota > 0:
+            allowed.append(code)
+            remain_quota -= 1
+        else:
+            skipped.append(code)
+
+    if skipped:
+        print(f"历史K线额度不足，跳过 {len(skipped)} 支股票: {skipped}")
+    return allowed, skipped
+
+
+def backfill_code(quote_ctx, engine, code, start_date, end_date, bucket,
+                  ktype=KLType.K_DAY, page_size=1000, on_page=None):
+    """
+    分页获取单只股票的历史K线并逐页写入数据库
+
+    参数:
+    quote_ctx: FutuAPI上下文
+    engine: 数据库引擎
+    code (str): 股票代码
+    start_date (str): 开始日期 YYYY-MM-DD
+    end_date (str): 结束日期 YYYY-MM-DD
+    bucket (TokenBucket): 共享的限速器
+    ktype: K线类型
+    page_size (int): 每页最大条数
+    on_page (callable): 每页写入后的回调 on_page(code, page_df)
+
+    返回:
+    dict: {'code', 'pages', 'rows', 'inserted', 'updated'}
+    """
+    result = {'code': code, 'pages': 0, 'rows': 0, 'inserted': 0, 'updated': 0}
+    table = table_for_ktype(ktype)
+    page_req_key = None
+
+    while True:
+        bucket.acquire()
+        ret_code, page, page_req_key = quote_ctx.request_history_kline(
+            code, start=start_date, end=end_date, ktype=ktype,
+            max_count=page_size, page_req_key=page_req_key
+        )
+        if ret_code != RET_OK:
+            raise RuntimeError(f"获取 {code} 的K线数据失败: {page}")
+
+        if page is not None and not page.empty:
+            stats = upsert_stock_prices(engine, page, code, table)
+            result['pages'] += 1
+            result['rows'] += stats['rows']
+            result['inserted'] += stats['inserted']
+            result['updated'] += stats['updated']
+            if on_page:
+                on_page(code, page)
+
+        if page_req_key is None:
+            break
+
+    return result
+
+
+def run_backfill_tasks(quote_ctx, engine, tasks, concurrency=None, ktype=KLType.K_DAY, on_page=None):
+    """
+    并发执行一组 (股票代码, 开始日期, 结束日期) 回填任务
+
+    所有线程共享一个令牌桶以满足Futu的请求频率限制。
+
+    参数:
+    quote_ctx: FutuAPI上下文
+    engine: 数据库引擎
+    tasks (list): (code, start_date, end_date) 列表
+    concurrency (int): 并发数，默认使用配置
+    ktype: K线类型
+    on_page (callable): 每页写入后的回调 on_page(code, page_df)
+
+    返回:
+    tuple: (成功的结果列表, 失败的股票代码及原因)
+    """
+    concurrency = concurrency or BACKFILL_CONFIG["concurrency"]
+    bucket = TokenBucket(BACKFILL_CONFIG["rate_limit_requests"], BACKFILL_CONFIG["rate_limit_window"])
+    results, failed = [], {}
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="backfill") as executor:
+        futures = {
+            executor.submit(backfill_code, quote_ctx, engine, code, start_date, end_date, bucket,
+                            ktype, BACKFILL_CONFIG["page_size"], on_page): (code, start_date, end_date)
+            for code, start_date, end_date in tasks
+        }
+        for future in as_completed(futures):
+            code, start_date, end_date = futures[future]
+            try:
+                result = future.result()
+                result['start_date'] = start_date
+                result['end_date'] = end_date
+                results.append(result)
+                print(f"已回填 {code} {start_date} ~ {end_date}: {result['rows']} 条 ({result['pages']} 页), "
+                      f"新增 {result['inserted']}")
+            except Exception as e:
+                failed[code] = str(e)
+                print(f"回填 {code} 时出错: {e}")
+                traceback.print_exc()
+
+    return results, failed
+
+
+def run_backfill(quote_ctx, engine, codes, start_date, end_date=None, concurrency=None,
+                 ktype=KLType.K_DAY, on_page=None):
+    """
+    并发回填多只股票的历史K线
+
+    开始前检查历史K线额度，额度不足的股票会被跳过。
+
+    参数:
+    quote_ctx: FutuAPI上下文
+    engine: 数据库引擎
+    codes (list): 股票代码列表
+    start_date (str): 开始日期 YYYY-MM-DD
+    end_date (str): 结束日期 YYYY-MM-DD，默认今天
+    concurrency (int): 并发数，默认使用配置
+    ktype: K线类型
+    on_page (callable): 每页写入后的回调 on_page(code, page_df)
+
+    返回:
+    dict: {'results': 成功的结果列表, 'failed': 失败的股票代码及原因, 'skipped': 额度不足跳过的股票}
+    """
+    end_date = end_date or datetime.now().strftime("%Y-%m-%d")
+    concurrency = concurrency or BACKFILL_CONFIG["concurrency"]
+
+    codes, skipped = plan_codes_within_quota(quote_ctx, codes)
+    started = time.time()
+    print(f"开始回填 {len(codes)} 支股票 {start_date} ~ {end_date} 的K线数据，并发数 {concurrency}")
+
+    tasks = [(code, start_date, end_date) for code in codes]
+    results, failed = run_backfill_tasks(quote_ctx, engine, tasks, concurrency, ktype, on_page)
+
+    total_rows = sum(r['rows'] for r in results)
+    print(f"回填完成: {len(results)} 支成功, {len(failed)} 支失败, {len(skipped)} 支跳过, "
+          f"共 {total_rows} 条记录, 耗时 {time.time() - started:.1f}秒")
+    return {'results': results, 'failed': failed, 'skipped': skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发回填股票历史K线数据")
+    parser.add_argument("--since", default=(datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d"),
+                        help="开始日期 YYYY-MM-DD，默认一年前")
+    parser.add_argument("--until", default=None, help="结束日期 YYYY-MM-DD，默认今天")
+    parser.add_argument("--codes", default=None, help="逗号分隔的股票代码，默认使用跟踪列表")
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONFIG["concurrency"], help="并发请求数")
+    parser.add_argument("--ktype", default="K_DAY", choices=list(RAW_KTYPES),
+                        help="K线周期，K_1M 写入分钟K线表，其余周期由连续聚合生成")
+    args = parser.parse_args()
+
+    codes = [c.strip() for c in args.codes.split(",") if c.strip()] if args.codes else STOCKS_TO_TRACK
+
+    # 独立运行时同样递增数据版本，使API响应缓存失效
+    redis_client = redis.Redis(host=REDIS_CONFIG["host"], port=REDIS_CONFIG["port"],
+                               db=REDIS_CONFIG["db"], decode_responses=REDIS_CONFIG["decode_responses"])
+    add_change_listener(lambda table, changed: bump_data_versions(redis_client, table, changed))
+
+    quote_ctx = OpenQuoteContext(host=FUTU_CONFIG["host"], port=FUTU_CONFIG["port"])
+    try:
+        engine = get_engine("fetcher")
+        summary = run_backfill(quote_ctx, engine, codes, args.since, args.until, args.concurrency, args.ktype)
+        # 回填后立即刷新连续聚合，使各周期包含新的历史数据
+        refresh_timeframe_aggregates(engine, start=datetime.strptime(args.since, "%Y-%m-%d"))
+    finally:
+        quote_ctx.close()
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,387 @@
+# Backend/backtest.py
+"""
+推荐规则回测：对每只股票的完整历史一次性计算指标和各规则的信号数组，
+得到仓位、收益、回撤、胜率和换手率，股票按组分配到进程池并行计算
+
+每根K线收盘时根据当时的指标确定目标仓位，持有到下一根K线收盘（不使用未来数据）。
+组合收益为当天有K线的股票等权平均。
+
+用法: python backtest.py [--codes US.AAPL,HK.00700] [--since 2015-01-01] [--cost 5] [--workers 8] [--output report.json]
+      python backtest.py --synthetic 500 --bars 2520    # 不连接数据库，使用随机行情测试耗时
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import text
+from config import STOCKS_TO_TRACK
+from db_engine import get_engine
+from timeframes import table_for_ktype
+from panel import PricePanel, MA_PERIODS, ACTION_BUY, ACTION_SELL, recommendation_levels, rule_signals, evaluate_rules
+
+# 每年的K线数量，用于年化收益、波动率和换手率
+PERIODS_PER_YEAR = {'K_DAY': 252, 'K_WEEK': 52}
+
+RULES = {
+    'buy_and_hold': "一直持有（基准）",
+    'ma_level_1': "推荐级别1：价格低于MA60时持有",
+    'ma_level_2': "推荐级别1-2：价格低于MA30或更长均线时持有",
+    'ma_level_3': "推荐级别1-3：价格低于MA20或更长均线时持有",
+    'ma_level_4': "推荐级别1-4：价格低于MA10或更长均线时持有",
+    'ma_level_5': "推荐级别1-5：价格低于任一均线时持有",
+    'ma_alignment': "均线多头排列买入，空头排列卖出",
+    'rsi': "RSI超卖买入，超买卖出",
+    'macd': "MACD金叉买入，死叉卖出",
+    'recommendations': "AI分析器的综合建议：BUY买入，SELL卖出，HOLD保持仓位",
+}
+
+
+def load_history(engine, table, codes, since=None, until=None):
+    """
+    一次查询加载多只股票的完整历史
+
+    参数:
+    engine: SQLAlchemy 同步引擎
+    table (str): K线表名
+    codes (list): 股票代码
+    since, until (str): 起止日期 YYYY-MM-DD，为None时不限制
+
+    返回:
+    dict: code、ts（Unix时间戳，秒）、close、volume 数组，按 (code, time) 排序
+    """
+    conditions = ["code = ANY(:codes)"]
+    params = {"codes": list(codes)}
+    if since:
+        conditions.append("time >= :since")
+        params["since"] = datetime.strptime(since, "%Y-%m-%d")
+    if until:
+        conditions.append("time <= :until")
+        params["until"] = datetime.strptime(until, "%Y-%m-%d")
+    query = text(f"""
+    SELECT code,
+           CAST(EXTRACT(EPOCH FROM time) AS BIGINT) AS ts,
+           CAST(close AS DOUBLE PRECISION) AS close,
+           CAST(volume AS DOUBLE PRECISION) AS volume
+    FROM {table}
+    WHERE {' AND '.join(conditions)}
+    ORDER BY code, time
+    """)
+    with engine.connect() as conn:
+        rows = conn.execute(query, params).all()
+    if not rows:
+        return {'code': np.array([], dtype=str), 'ts': np.array([], dtype=np.int64),
+                'close': np.array([]), 'volume': np.array([])}
+    code, ts, close, volume = zip(*rows)
+    return {
+        'code': np.array(code, dtype=str),
+        'ts': np.array(ts, dtype=np.int64),
+        'close': np.array([np.nan if c is None else c for c in close], dtype=np.float64),
+        'volume': np.array([np.nan if v is None else v for v in volume], dtype=np.float64),
+    }
+
+
+def synthetic_history(n_codes, n_bars, seed=0):
+    """生成随机游走行情（与 load_history 格式相同），用于测试耗时"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.02, (n_codes, n_bars))
+    close = 100 * np.exp(np.cumsum(returns, axis=1))
+    start = int(datetime(2000, 1, 3, tzinfo=timezone.utc).timestamp())
+    ts = start + np.arange(n_bars, dtype=np.int64) * 86400
+    return {
+        'code': np.repeat([f"SIM.{i:05d}" for i in range(n_codes)], n_bars),
+        'ts': np.tile(ts, n_codes),
+        'close': close.ravel(),
+        'volume': rng.integers(1000, 100000, n_codes * n_bars).astype(np.float64),
+    }
+
+
+def rule_positions(close, volume, allow_short=False):
+    """
+    单只股票每根K线收盘后各规则的目标仓位
+
+    参数:
+    close, volume (ndarray): 按时间排序的收盘价和成交量
+    allow_short (bool): 卖出信号是否做空（否则为空仓）
+
+    返回:
+    dict: 规则名到仓位数组（1 持有，0 空仓，-1 做空）的映射
+    """
+    panel = PricePanel([None], close[:, None], volume[:, None], [None])
+    values = {name: matrix[:, 0] for name, matrix in panel.indicators().items()}
+    values['latest_price'] = close
+    levels = recommendation_levels(close, {period: values[f'sma{period}'] for period in MA_PERIODS})
+    signals = rule_signals(values)
+    action, _, _ = evaluate_rules(values, signals)
+
+    exit_position = -1.0 if allow_short else 0.0
+    positions = {'buy_and_hold': np.ones(len(close))}
+    for level in range(1, 6):
+        positions[f'ma_level_{level}'] = (levels <= level).astype(np.float64)
+    positions['ma_alignment'] = hold_positions(signals['bullish'], signals['bearish'], exit_position)
+    positions['rsi'] = hold_positions(signals['oversold'], signals['overbought'], exit_position)
+    positions['macd'] = hold_positions(signals['golden'], signals['dead'], exit_position)
+    positions['recommendations'] = hold_positions(action == ACTION_BUY, action == ACTION_SELL, exit_position)
+    return positions
+
+
+def hold_positions(enter, leave, exit_position=0.0):
+    """买入信号后持有、卖出信号后退出，没有信号的K线保持上一根K线的仓位"""
+    target = np.full(len(enter), np.nan)
+    target[leave] = exit_position
+    target[enter] = 1.0
+    # 向前填充：每个位置取之前最近一个有信号的位置
+    index = np.maximum.accumulate(np.where(np.isnan(target), -1, np.arange(len(target))))
+    return np.where(index >= 0, target[np.maximum(index, 0)], 0.0)
+
+
+def simulate(close, position, cost=0.0):
+    """
+    根据仓位计算每根K线的收益
+
+    参数:
+    close (ndarray): 收盘价
+    position (ndarray): 每根K线收盘后的仓位
+    cost (float): 每单位换手的成本（比例，例如 0.0005 表示万分之五）
+
+    返回:
+    tuple: (不含成本的收益, 扣除成本后的收益, 换手量)，均为与输入等长的数组，第一根K线收益为0
+    """
+    gross = np.zeros(len(close))
+    gross[1:] = position[:-1] * (close[1:] / close[:-1] - 1.0)
+    turnover = np.abs(np.diff(position, prepend=0.0))
+    return gross, gross - cost * turnover, turnover
+
+
+def trade_stats(position, gross):
+    """
+    交易次数和盈利次数：仓位不为0且保持不变的一段K线为一笔交易（不含成本）
+
+    返回:
+    tuple: (交易次数, 盈利次数)
+    """
+    held = position[:-1]
+    returns = gross[1:]
+    active = held != 0
+    starts = active & np.concatenate(([True], held[1:] != held[:-1]))
+    n_trades = int(starts.sum())
+    if not n_trades:
+        return 0, 0
+    ids = np.cumsum(starts) - 1
+    growth = np.bincount(ids[active], weights=np.log1p(returns[active]), minlength=n_trades)
+    return n_trades, int((growth > 0).sum())
+
+
+def performance(returns, periods_per_year):
+    """
+    收益序列的绩效指标
+
+    返回:
+    dict: total_return、annual_return、annual_volatility、sharpe、max_drawdown
+    """
+    if not len(returns):
+        return {'total_return': 0.0, 'annual_return': 0.0, 'annual_volatility': 0.0,
+                'sharpe': None, 'max_drawdown': 0.0}
+    equity = np.cumprod(1.0 + returns)
+    total = float(equity[-1] - 1.0)
+    years = len(returns) / periods_per_year
+    std = float(returns.std(ddof=1)) if len(returns) > 1 else 0.0
+    return {
+        'total_return': total,
+        'annual_return': float((1.0 + total) ** (1.0 / years) - 1.0) if total > -1 else -1.0,
+        'annual_volatility': std * np.sqrt(periods_per_year),
+        'sharpe': float(returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else None,
+        'max_drawdown': float((equity / np.maximum.accumulate(equity) - 1.0).min()),
+    }
+
+
+def backtest_symbols(task):
+    """
+    进程池任务：回测一组股票
+
+    参数:
+    task (tuple): (codes, bounds, ts, close, volume, options)，bounds 为每只股票在数组中的 (起, 止) 位置
+
+    返回:
+    tuple: (每条规则的逐只股票结果, 每条规则按K线时间汇总的 (时间, 收益和, 股票数))
+    """
+    codes, bounds, ts, close, volume, options = task
+    periods_per_year = options['periods_per_year']
+    per_symbol = {rule: [] for rule in RULES}
+    daily = {rule: ([], []) for rule in RULES}
+
+    for code, (start, end) in zip(codes, bounds):
+        valid = np.isfinite(close[start:end]) & (close[start:end] > 0)
+        c, v, t = close[start:end][valid], volume[start:end][valid], ts[start:end][valid]
+        if len(c) < 2:
+            continue
+        years = len(c) / periods_per_year
+        for rule, position in rule_positions(c, v, options['allow_short']).items():
+            gross, net, turnover = simulate(c, position, options['cost'])
+            trades, wins = trade_stats(position, gross)
+            result = performance(net, periods_per_year)
+            result.update({
+                'code': code,
+                'bars': len(c),
+                'trades': trades,
+                'wins': wins,
+                'hit_rate': wins / trades if trades else None,
+                'turnover': float(turnover.sum() / years),
+                'exposure': float(np.abs(position).mean()),
+            })
+            per_symbol[rule].append(result)
+            daily[rule][0].append(t)
+            daily[rule][1].append(net)
+
+    return per_symbol, {rule: sum_by_time(times, returns) for rule, (times, returns) in daily.items()}
+
+
+def sum_by_time(times, values):
+    """按K线时间汇总多只股票的收益，返回 (时间, 收益和, 股票数)"""
+    if not times:
+        return np.array([], dtype=np.int64), np.array([]), np.array([])
+    times, inverse = np.unique(np.concatenate(times), return_inverse=True)
+    values = np.concatenate(values)
+    return times, np.bincount(inverse, weights=values), np.bincount(inverse).astype(np.float64)
+
+
+def make_tasks(history, options, n_chunks):
+    """按股票切分为 n_chunks 组任务（同一股票的数据在 history 中连续排列）"""
+    codes = history['code']
+    if not len(codes):
+        return []
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    ends = np.append(starts[1:], len(codes))
+    tasks = []
+    for group in np.array_split(np.arange(len(starts)), max(1, min(n_chunks, len(starts)))):
+        first, last = starts[group[0]], ends[group[-1]]
+        bounds = [(int(starts[i] - first), int(ends[i] - first)) for i in group]
+        tasks.append(([str(codes[starts[i]]) for i in group], bounds, history['ts'][first:last],
+                      history['close'][first:last], history['volume'][first:last], options))
+    return tasks
+
+
+def run_tasks(function, tasks, workers):
+    """在进程池中执行任务（workers 为1或只有一个任务时在当前进程执行）"""
+    if workers <= 1 or len(tasks) <= 1:
+        return [function(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, tasks))
+
+
+def run_backtest(history, cost=0.0, allow_short=False, periods_per_year=252, workers=None):
+    """
+    回测所有规则
+
+    参数:
+    history (dict): load_history 或 synthetic_history 的结果
+    cost (float): 每单位换手的成本（比例）
+    allow_short (bool): 卖出信号是否做空
+    periods_per_year (int): 每年的K线数量
+    workers (int): 进程数，默认为CPU核数
+
+    返回:
+    dict: 回测报告，rules 中每条规则包含组合绩效、胜率、换手率和逐只股票结果
+    """
+    started = time.time()
+    workers = workers or os.cpu_count() or 1
+    options = {'cost': cost, 'allow_short': allow_short, 'periods_per_year': periods_per_year}
+    # 每个进程分到多组任务，避免个别股票历史较长时进程空闲
+    chunks = run_tasks(backtest_symbols, make_tasks(history, options, workers * 4), workers)
+
+    report = {'rules': {}, 'symbols': 0, 'bars': int(len(history['code'])), 'options': options}
+    if len(history['ts']):
+        report['start'] = datetime.fromtimestamp(int(history['ts'].min()), timezone.utc).isoformat()
+        report['end'] = datetime.fromtimestamp(int(history['ts'].max()), timezone.utc).isoformat()
+
+    for rule, description in RULES.items():
+        symbols = [row for per_symbol, _ in chunks for row in per_symbol[rule]]
+        parts = [daily[rule] for _, daily in chunks]
+        times, sums, counts = merge_daily(parts)
+        summary = performance(sums / counts if len(counts) else sums, periods_per_year)
+        trades = sum(row['trades'] for row in symbols)
+        wins = sum(row['wins'] for row in symbols)
+        summary.update({
+            'description': description,
+            'symbols': len(symbols),
+            'trades': trades,
+            'hit_rate': wins / trades if trades else None,
+            'turnover': float(np.mean([row['turnover'] for row in symbols])) if symbols else 0.0,
+            'exposure': float(np.mean([row['exposure'] for row in symbols])) if symbols else 0.0,
+            'median_symbol_return': float(np.median([row['total_return'] for row in symbols])) if symbols else None,
+            'per_symbol': symbols,
+        })
+        report['rules'][rule] = summary
+        report['symbols'] = max(report['symbols'], len(symbols))
+
+    report['elapsed'] = time.time() - started
+    return report
+
+
+def merge_daily(parts):
+    """合并多组 sum_by_time 的结果"""
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return np.array([], dtype=np.int64), np.array([]), np.array([])
+    times, inverse = np.unique(np.concatenate([p[0] for p in parts]), return_inverse=True)
+    sums = np.bincount(inverse, weights=np.concatenate([p[1] for p in parts]))
+    counts = np.bincount(inverse, weights=np.concatenate([p[2] for p in parts]))
+    return times, sums, counts
+
+
+def _percent(value):
+    return "-" if value is None else f"{value * 100:.2f}%"
+
+
+def print_report(report):
+    print(f"回测 {report['symbols']} 只股票, {report['bars']} 根K线, "
+          f"{report.get('start', '-')[:10]} ~ {report.get('end', '-')[:10]}, 耗时 {report['elapsed']:.2f}秒")
+    print(f"{'规则':<16} {'总收益':>10} {'年化':>9} {'夏普':>7} {'最大回撤':>9} {'胜率':>8} {'交易数':>8} "
+          f"{'年换手':>8} {'持仓占比':>8}")
+    for rule, summary in report['rules'].items():
+        sharpe = "-" if summary['sharpe'] is None else f"{summary['sharpe']:.2f}"
+        print(f"{rule:<16} {_percent(summary['total_return']):>10} {_percent(summary['annual_return']):>9} "
+              f"{sharpe:>7} {_percent(summary['max_drawdown']):>9} {_percent(summary['hit_rate']):>8} "
+              f"{summary['trades']:>8} {summary['turnover']:>8.2f} {_percent(summary['exposure']):>8}")
+    rules = report['rules']
+    if 'recommendations' in rules and 'macd' in rules and \
+            all(rules['recommendations'][k] == rules['macd'][k] for k in ('total_return', 'trades', 'turnover')):
+        print("注: recommendations 与 macd 结果相同——综合建议中MACD规则最后判断，金叉/死叉几乎每根K线都成立，决定了最终动作")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推荐规则回测")
+    parser.add_argument("--codes", default=None, help="逗号分隔的股票代码，默认使用跟踪列表")
+    parser.add_argument("--ktype", default="K_DAY", choices=list(PERIODS_PER_YEAR), help="K线周期")
+    parser.add_argument("--since", default=None, help="开始日期 YYYY-MM-DD，默认全部历史")
+    parser.add_argument("--until", default=None, help="结束日期 YYYY-MM-DD")
+    parser.add_argument("--cost", type=float, default=0.0, help="单边交易成本（基点）")
+    parser.add_argument("--allow-short", action="store_true", help="卖出信号做空（默认空仓）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为CPU核数")
+    parser.add_argument("--output", default=None, help="保存完整报告（含逐只股票结果）的JSON文件")
+    parser.add_argument("--synthetic", type=int, default=0, help="使用指定数量的随机行情代替数据库数据")
+    parser.add_argument("--bars", type=int, default=2520, help="随机行情每只股票的K线数量")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        history = synthetic_history(args.synthetic, args.bars)
+    else:
+        codes = [c.strip() for c in args.codes.split(",") if c.strip()] if args.codes else STOCKS_TO_TRACK
+        started = time.time()
+        history = load_history(get_engine("default"), table_for_ktype(args.ktype), codes, args.since, args.until)
+        print(f"已加载 {len(history['code'])} 根K线，耗时 {time.time() - started:.2f}秒")
+
+    report = run_backtest(history, cost=args.cost / 10000.0, allow_short=args.allow_short,
+                          periods_per_year=PERIODS_PER_YEAR[args.ktype], workers=args.workers)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
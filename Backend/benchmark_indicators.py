@@ -0,0 +1,130 @@
+# Backend/benchmark_indicators.py
+"""
+指标内核基准测试：对比原 pandas 流程与 NumPy 内核的单次调用耗时，并校验结果一致；
+以及面板引擎对整个股票池同时计算指标和推荐规则的耗时
+
+用法: python benchmark_indicators.py [--sizes 30,250,5000] [--repeat 200] [--panel-codes 500] [--panel-bars 250]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from indicators import as_array, sma, rsi, macd, last_value
+from panel import PricePanel
+
+INDICATORS = ('sma5', 'sma10', 'sma20', 'sma30', 'sma60', 'rsi', 'macd', 'macd_signal', 'macd_histogram')
+
+
+def make_rows(n, seed=0):
+    """生成 n 根日K（与 /api/stock_data 查询结果相同的逐行格式）"""
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(n).cumsum()
+    volume = rng.integers(1000, 100000, n)
+    start = datetime(2000, 1, 1)
+    return [{'time': (start + timedelta(days=i)).isoformat(), 'close': float(close[i]), 'volume': int(volume[i])}
+            for i in range(n)]
+
+
+def pandas_indicators(rows):
+    """原分析器的 pandas 流程：构建DataFrame、解析时间、排序、添加指标列后读取最后一行"""
+    df = pd.DataFrame(rows)
+    df['time'] = pd.to_datetime(df['time'])
+    df = df.sort_values('time')
+    df['SMA5'] = df['close'].rolling(window=5).mean()
+    df['SMA10'] = df['close'].rolling(window=10).mean()
+    df['SMA20'] = df['close'].rolling(window=20).mean()
+    df['SMA30'] = df['close'].rolling(window=30).mean()
+    df['SMA60'] = df['close'].rolling(window=60).mean()
+    delta = df['close'].diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    df['RSI'] = 100 - (100 / (1 + gain.rolling(window=14).mean() / loss.rolling(window=14).mean()))
+    df['EMA12'] = df['close'].ewm(span=12, adjust=False).mean()
+    df['EMA26'] = df['close'].ewm(span=26, adjust=False).mean()
+    df['MACD'] = df['EMA12'] - df['EMA26']
+    df['Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
+    df['Histogram'] = df['MACD'] - df['Signal']
+    latest = df.iloc[-1]
+    columns = ('SMA5', 'SMA10', 'SMA20', 'SMA30', 'SMA60', 'RSI', 'MACD', 'Signal', 'Histogram')
+    return {name: (None if np.isnan(latest[column]) else float(latest[column]))
+            for name, column in zip(INDICATORS, columns)}
+
+
+def kernel_indicators(close):
+    """NumPy 内核：直接在查询得到的 float64 数组上计算"""
+    macd_line, signal_line, histogram = macd(close)
+    values = [sma(close, 5), sma(close, 10), sma(close, 20), sma(close, 30), sma(close, 60),
+              rsi(close, 14), macd_line, signal_line, histogram]
+    return {name: last_value(v) for name, v in zip(INDICATORS, values)}
+
+
+def time_call(fn, arg, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1e6
+
+
+def max_difference(a, b):
+    worst = 0.0
+    for name in INDICATORS:
+        if (a[name] is None) != (b[name] is None):
+            return float('inf')
+        if a[name] is not None:
+            worst = max(worst, abs(a[name] - b[name]))
+    return worst
+
+
+def benchmark_panel(n_codes, n_bars, repeat):
+    """逐只股票使用 pandas 流程 vs 面板引擎一次计算所有股票（含推荐规则）"""
+    rows = make_rows(n_bars)
+    columns = {'code': [], 'time': [], 'close': [], 'volume': []}
+    for i in range(n_codes):
+        rng = np.random.default_rng(i)
+        columns['code'].extend([f"BM.{i:05d}"] * n_bars)
+        columns['time'].extend(row['time'] for row in rows)
+        columns['close'].extend((100 + rng.standard_normal(n_bars).cumsum()).tolist())
+        columns['volume'].extend(rng.integers(1000, 100000, n_bars).tolist())
+
+    start = time.perf_counter()
+    pandas_indicators(rows)
+    per_symbol = (time.perf_counter() - start) * n_codes
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        PricePanel.from_columns(columns, presorted=True).screener()
+        timings.append(time.perf_counter() - start)
+    panel_seconds = np.median(timings)
+    print(f"面板 {n_codes} 只股票 x {n_bars} 根K线: 逐只 pandas 约 {per_symbol * 1000:.0f} ms，"
+          f"面板引擎 {panel_seconds * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指标内核基准测试")
+    parser.add_argument("--sizes", default="30,250,5000", help="逗号分隔的K线数量")
+    parser.add_argument("--repeat", type=int, default=200, help="每个数据量重复调用的次数")
+    parser.add_argument("--panel-codes", type=int, default=500, help="面板基准的股票数量，0表示跳过")
+    parser.add_argument("--panel-bars", type=int, default=250, help="面板基准每只股票的K线数量")
+    args = parser.parse_args()
+
+    print(f"{'K线数':>8} {'pandas(us)':>12} {'numpy(us)':>12} {'加速比':>8} {'最大差异':>12}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        rows = make_rows(n)
+        close = as_array([row['close'] for row in rows])
+        expected = pandas_indicators(rows)
+        diff = max_difference(expected, kernel_indicators(close))
+
+        pandas_us = time_call(pandas_indicators, rows, args.repeat)
+        kernel_us = time_call(kernel_indicators, close, args.repeat)
+        print(f"{n:>8} {pandas_us:>12.1f} {kernel_us:>12.1f} {pandas_us / kernel_us:>7.1f}x {diff:>12.2e}")
+
+    if args.panel_codes > 0:
+        benchmark_panel(args.panel_codes, args.panel_bars, max(1, args.repeat // 20))
+
+
+if __name__ == "__main__":
+    main()
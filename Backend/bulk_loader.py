@@ -0,0 +1,251 @@
+# Backend/bulk_loader.py
+import io
+import threading
+import time
+import traceback
+import pandas as pd
+from stock_summary import apply_summary_deltas
+
+# stock_price 表的列顺序（COPY 使用）
+PRICE_COLUMNS = ['time', 'code', 'open', 'close', 'high', 'low', 'volume', 'turnover']
+
+# 价格数据变化的回调，签名 listener(table, codes)
+_change_listeners = []
+
+
+def add_change_listener(listener):
+    """
+    注册价格数据变化的回调，在写入事务提交后以 (表名, 有新增或更新的股票代码列表) 调用
+
+    参数:
+    listener (callable): 回调函数
+    """
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+def _notify_change(table, codes):
+    for listener in list(_change_listeners):
+        try:
+            listener(table, codes)
+        except Exception as e:
+            print(f"价格数据变化回调出错: {e}")
+
+
+def prepare_price_frame(price_df, code=None):
+    """
+    将Futu K线DataFrame整理为 stock_price 表的列格式
+
+    参数:
+    price_df (DataFrame): K线数据，包含 time_key 或 time 列
+    code (str): 股票代码；为None时使用数据中的 code 列（支持多只股票）
+
+    返回:
+    DataFrame: 按 PRICE_COLUMNS 排列的数据
+    """
+    df = price_df.rename(columns={'time_key': 'time'})
+    if code is not None:
+        df = df.assign(code=code)
+    df = df[PRICE_COLUMNS].copy()
+    # 成交量可能因为缺失值变成浮点数，COPY 到 BIGINT 前转换回整数
+    df['volume'] = pd.to_numeric(df['volume'], errors='coerce').round().astype('Int64')
+    return df
+
+
+def upsert_stock_prices(engine, price_df, code=None, table='stock_price'):
+    """
+    通过 COPY 将价格数据批量写入暂存表，再合并到 stock_price（或其他同结构的K线表）
+
+    重复写入同一 (time, code) 会更新已有记录而不是报主键冲突，
+    数值未变化的记录不会产生更新。
+
+    参数:
+    engine: 数据库引擎
+    price_df (DataFrame): K线数据，可以包含多只股票（需有 code 列）
+    code (str): 单只股票时的股票代码
+    table (str): 目标表，例如 stock_price 或 stock_price_1m
+
+    返回:
+    dict: {'rows': 输入行数, 'inserted': 新增行数, 'updated': 更新行数, 'unchanged': 未变化行数}
+    """
+    df = prepare_price_frame(price_df, code)
+    stats = {'rows': len(df), 'inserted': 0, 'updated': 0, 'unchanged': 0}
+    if df.empty:
+        return stats
+
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        cursor.execute(f"""
+        CREATE TEMP TABLE {table}_staging (
+            time TIMESTAMP NOT NULL,
+            code VARCHAR(20) NOT NULL,
+            open NUMERIC(19, 4),
+            close NUMERIC(19, 4),
+            high NUMERIC(19, 4),
+            low NUMERIC(19, 4),
+            volume BIGINT,
+            turnover NUMERIC(19, 4),
+            seq BIGSERIAL
+        ) ON COMMIT DROP
+        """)
+        cursor.copy_expert(
+            f"COPY {table}_staging ({', '.join(PRICE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+        # 同一批次内的重复记录只保留最后一条，再合并到正式表
+        cursor.execute(f"""
+        WITH upserted AS (
+            INSERT INTO {table} AS target (time, code, open, close, high, low, volume, turnover)
+            SELECT DISTINCT ON (time, code) time, code, open, close, high, low, volume, turnover
+            FROM {table}_staging
+            ORDER BY time, code, seq DESC
+            ON CONFLICT (time, code) DO UPDATE SET
+                open = EXCLUDED.open,
+                close = EXCLUDED.close,
+                high = EXCLUDED.high,
+                low = EXCLUDED.low,
+                volume = EXCLUDED.volume,
+                turnover = EXCLUDED.turnover
+            WHERE (target.open, target.close, target.high, target.low,
+                   target.volume, target.turnover)
+                  IS DISTINCT FROM
+                  (EXCLUDED.open, EXCLUDED.close, EXCLUDED.high, EXCLUDED.low,
+                   EXCLUDED.volume, EXCLUDED.turnover)
+            RETURNING code, time, (xmax = 0) AS inserted
+        )
+        SELECT code, COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted), MIN(time)
+        FROM upserted
+        GROUP BY code
+        """)
+        per_code = cursor.fetchall()
+        inserted = sum(row[1] for row in per_code)
+        updated = sum(row[2] for row in per_code)
+        if table == 'stock_price':
+            # 日K汇总表与价格数据在同一事务中更新，API读取时无需扫描价格表
+            apply_summary_deltas(cursor, [(row[0], row[1], row[3]) for row in per_code])
+        raw_conn.commit()
+        cursor.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+    stats['inserted'] = int(inserted or 0)
+    stats['updated'] = int(updated or 0)
+    stats['unchanged'] = stats['rows'] - stats['inserted'] - stats['updated']
+    if per_code:
+        _notify_change(table, [row[0] for row in per_code])
+    return stats
+
+
+def upsert_price_frames(engine, frames, batch_rows=500000):
+    """
+    将多只股票的K线数据合并为少量 COPY 批次写入
+
+    参数:
+    engine: 数据库引擎
+    frames (dict): 股票代码到K线DataFrame的映射
+    batch_rows (int): 单个 COPY 批次的最大行数
+
+    返回:
+    dict: 所有批次的合计统计
+    """
+    totals = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0}
+    batch, batch_size = [], 0
+    started = time.time()
+
+    def flush_batch():
+        if not batch:
+            return
+        try:
+            stats = upsert_stock_prices(engine, pd.concat(batch, ignore_index=True))
+            for k in totals:
+                totals[k] += stats[k]
+        except Exception as e:
+            print(f"批量写入价格数据时出错: {e}")
+            traceback.print_exc()
+
+    for code, price_df in frames.items():
+        if price_df is None or price_df.empty:
+            continue
+        batch.append(prepare_price_frame(price_df, code))
+        batch_size += len(price_df)
+        if batch_size >= batch_rows:
+            flush_batch()
+            batch, batch_size = [], 0
+    flush_batch()
+
+    print(f"批量写入 {totals['rows']} 条价格记录: 新增 {totals['inserted']}, 更新 {totals['updated']}, "
+          f"未变化 {totals['unchanged']}, 耗时 {time.time() - started:.2f}秒")
+    return totals
+
+
+class BarBatchWriter:
+    """
+    K线批量写入器
+
+    实时推送的分钟K线会被反复更新，逐条写库开销太大。
+    这里按 (time, code) 缓冲最新值，每个刷新周期用一次 COPY 合并写入。
+    """
+
+    def __init__(self, engine, table, flush_interval=5.0):
+        self.engine = engine
+        self.table = table
+        self.flush_interval = flush_interval
+        self._rows = {}
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._thread = None
+
+    def add(self, code, time_key, open_, close, high, low, volume, turnover):
+        """缓冲一根K线，同一根K线只保留最新值"""
+        with self._lock:
+            self._rows[(time_key, code)] = (time_key, code, open_, close, high, low, volume, turnover)
+
+    def start(self):
+        if self._running.is_set():
+            return
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name=f"{self.table}-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 1)
+            self._thread = None
+        self.flush()
+
+    def flush(self):
+        """
+        写入缓冲的K线
+
+        返回:
+        dict: upsert_stock_prices 的统计，没有数据时返回None
+        """
+        with self._lock:
+            rows, self._rows = self._rows, {}
+        if not rows:
+            return None
+        df = pd.DataFrame(list(rows.values()), columns=PRICE_COLUMNS)
+        try:
+            return upsert_stock_prices(self.engine, df, table=self.table)
+        except Exception as e:
+            print(f"批量写入 {self.table} 时出错: {e}")
+            traceback.print_exc()
+            # 写入失败时放回缓冲区，下个周期重试（不覆盖更新的值）
+            with self._lock:
+                for key, row in rows.items():
+                    self._rows.setdefault(key, row)
+            return None
+
+    def _run(self):
+        while self._running.is_set():
+            time.sleep(self.flush_interval)
+            self.flush()
@@ -15,6 +15,22 @@ DB_CONFIG = {
     "database": os.getenv("DB_NAME", "stockdb")
 }
 
+# 数据库连接池配置（按使用方角色区分，进程内每个角色共享一个连接池）
+def _pool_config(role, pool_size, max_overflow):
+    prefix = f"DB_POOL_{role.upper()}_"
+    return {
+        "pool_size": int(os.getenv(prefix + "SIZE", str(pool_size))),
+        "max_overflow": int(os.getenv(prefix + "MAX_OVERFLOW", str(max_overflow))),
+        "pool_timeout": int(os.getenv(prefix + "TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv(prefix + "RECYCLE", "1800"))
+    }
+
+DB_POOL_CONFIG = {
+    "default": _pool_config("default", 5, 10),
+    "fetcher": _pool_config("fetcher", 5, 10),
+    "api": _pool_config("api", 10, 20)
+}
+
 # Redis配置
 REDIS_CONFIG = {
     "host": os.getenv("REDIS_HOST", "localhost"),
@@ -23,6 +39,89 @@ REDIS_CONFIG = {
     "decode_responses": True
 }
 
+# Redis批量写入配置（实时行情和K线）
+REDIS_WRITER_CONFIG = {
+    "flush_interval": float(os.getenv("REDIS_FLUSH_INTERVAL_MS", "50")) / 1000.0,
+    "max_batch": int(os.getenv("REDIS_FLUSH_MAX_BATCH", "1000")),
+    # 是否使用 MULTI/EXEC 事务提交每个批次
+    "transaction": os.getenv("REDIS_FLUSH_TRANSACTION", "false").lower() == "true"
+}
+
+# API响应缓存配置（按股票数据版本失效）
+RESPONSE_CACHE_CONFIG = {
+    "enabled": os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true",
+    # 缓存条目上限，超出后按最近访问时间淘汰
+    "max_entries": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000")),
+    # 单个响应超过该大小（字节）时不缓存
+    "max_entry_bytes": int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(2 * 1024 * 1024))),
+    # 兜底过期时间（秒），正常情况下由数据版本变化使缓存失效
+    "ttl": int(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+}
+
+# 增量指标状态配置（分析时只对新增或更新的K线计算指标）
+INDICATOR_STATE_CONFIG = {
+    "enabled": os.getenv("INDICATOR_STATE_ENABLED", "true").lower() == "true",
+    # local: 每个API进程各自保存；redis: 保存在Redis中由多个API进程共享
+    "backend": os.getenv("INDICATOR_STATE_BACKEND", "local"),
+    # 进程内最多保存的序列数量，超出后按最近访问时间淘汰
+    "max_entries": int(os.getenv("INDICATOR_STATE_MAX_ENTRIES", "5000")),
+    # Redis中状态的过期时间（秒）
+    "ttl": int(os.getenv("INDICATOR_STATE_TTL", "86400"))
+}
+
+# 相同请求合并配置（多个并发的相同分析请求共享一次计算）
+SINGLEFLIGHT_CONFIG = {
+    # 是否使用Redis锁在多个API进程之间合并请求
+    "redis_lock": os.getenv("SINGLEFLIGHT_REDIS_LOCK", "false").lower() == "true",
+    # 等待共享结果的最长时间（秒）
+    "timeout": float(os.getenv("SINGLEFLIGHT_TIMEOUT", "30")),
+    # Redis锁的过期时间（秒），持有锁的进程异常退出后其他进程最多等待这么久
+    "lock_ttl": float(os.getenv("SINGLEFLIGHT_LOCK_TTL", "30")),
+    # 其他进程等待结果时的轮询间隔（秒）
+    "poll_interval": float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", "0.05"))
+}
+
+# API速率限制配置
+# 策略格式 {"limit": 周期内允许的请求数, "period": 周期秒数, "local_batch": 每次从Redis预取的令牌数}
+# local_batch 大于1时，进程内先消耗预取的令牌，大部分请求不需要访问Redis
+def _json_env(name, default):
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError as e:
+        print(f"环境变量 {name} 不是有效的JSON: {e}")
+        return default
+
+
+RATE_LIMIT_CONFIG = {
+    "enabled": os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true",
+    # 默认策略：按客户端IP限制
+    "default": {
+        "limit": int(os.getenv("RATE_LIMIT_REQUESTS", "10")),
+        "period": float(os.getenv("RATE_LIMIT_SECONDS", "60")),
+        "local_batch": int(os.getenv("RATE_LIMIT_LOCAL_BATCH", "1"))
+    },
+    # 按路由覆盖的策略，例如 {"/health": {"limit": 120, "period": 60}}
+    "routes": _json_env("RATE_LIMIT_ROUTE_POLICIES", {}),
+    # 按API密钥覆盖的策略，命中时按密钥而不是IP计数，例如 {"<api-key>": {"limit": 6000, "period": 60, "local_batch": 20}}
+    "api_keys": _json_env("RATE_LIMIT_KEY_POLICIES", {}),
+    # 是否在进程内缓存拒绝结果和预取令牌，减少Redis访问
+    "local_fast_path": os.getenv("RATE_LIMIT_LOCAL_FAST_PATH", "true").lower() == "true"
+}
+
+# 实时推送配置（接入进程通过Redis发布行情变化，API进程推送给WebSocket/SSE客户端）
+REALTIME_CONFIG = {
+    "channel": os.getenv("REALTIME_CHANNEL", "stock:updates"),
+    # 每个客户端两次推送之间的最短间隔（秒），期间的变化合并为一条消息
+    "throttle_interval": float(os.getenv("REALTIME_THROTTLE_INTERVAL", "0.5")),
+    # 单个客户端最多订阅的股票数量
+    "max_codes_per_client": int(os.getenv("REALTIME_MAX_CODES_PER_CLIENT", "500")),
+    # SSE心跳间隔（秒）
+    "heartbeat_interval": float(os.getenv("REALTIME_HEARTBEAT_INTERVAL", "15"))
+}
+
 # Futu API配置
 FUTU_CONFIG = {
     "host": os.getenv("FUTU_HOST", "host.docker.internal"),
@@ -30,6 +129,71 @@ FUTU_CONFIG = {
 }
 
 
+# 行情接入流水线配置
+INGEST_CONFIG = {
+    "workers": int(os.getenv("INGEST_WORKERS", "4")),
+    "queue_size": int(os.getenv("INGEST_QUEUE_SIZE", "10000")),
+    # 报价队列满时的处理策略: block / drop_newest / drop_oldest（K线从不丢弃）
+    "overflow_policy": os.getenv("INGEST_OVERFLOW_POLICY", "drop_oldest"),
+    "block_timeout": float(os.getenv("INGEST_BLOCK_TIMEOUT", "0.05"))
+}
+
+
+# 历史K线回填配置
+BACKFILL_CONFIG = {
+    "concurrency": int(os.getenv("BACKFILL_CONCURRENCY", "4")),
+    # Futu 历史K线接口频率限制：每 30 秒最多 60 次请求
+    "rate_limit_requests": int(os.getenv("BACKFILL_RATE_LIMIT_REQUESTS", "60")),
+    "rate_limit_window": float(os.getenv("BACKFILL_RATE_LIMIT_WINDOW", "30")),
+    "page_size": int(os.getenv("BACKFILL_PAGE_SIZE", "1000")),
+    # 系统启动时回填的天数
+    "initial_days": int(os.getenv("BACKFILL_INITIAL_DAYS", "60"))
+}
+
+
+# 增量同步配置
+SYNC_CONFIG = {
+    # 没有同步水位的股票在该窗口内检查缺口
+    "lookback_days": int(os.getenv("SYNC_LOOKBACK_DAYS", os.getenv("BACKFILL_INITIAL_DAYS", "60"))),
+    # 单只股票缺口区间过多时合并为一个区间请求
+    "max_ranges_per_code": int(os.getenv("SYNC_MAX_RANGES_PER_CODE", "5")),
+    # 有水位的股票每隔多少天重新在回看窗口内检查一次缺口，0表示不检查
+    "gap_check_days": int(os.getenv("SYNC_GAP_CHECK_DAYS", "7"))
+}
+
+
+# 分钟K线配置
+INTRADAY_CONFIG = {
+    "enabled": os.getenv("INTRADAY_ENABLED", "true").lower() == "true",
+    # 系统启动时回填的分钟K线天数
+    "backfill_days": int(os.getenv("INTRADAY_BACKFILL_DAYS", "5")),
+    # 实时分钟K线批量写库的周期（秒）
+    "flush_interval": float(os.getenv("INTRADAY_FLUSH_INTERVAL", "5")),
+    # 分钟K线超表的分块时间间隔
+    "chunk_interval": os.getenv("INTRADAY_CHUNK_INTERVAL", "1 day")
+}
+
+
+# TimescaleDB 存储策略配置（分块间隔、压缩阈值、保留时长），值为空表示不设置
+def _timescale_policy(table, chunk_interval, compress_after, retention):
+    prefix = f"TS_{table.upper()}_"
+    return {
+        "chunk_interval": os.getenv(prefix + "CHUNK_INTERVAL", chunk_interval or "") or None,
+        "compress_after": os.getenv(prefix + "COMPRESS_AFTER", compress_after or "") or None,
+        "retention": os.getenv(prefix + "RETENTION", retention or "") or None
+    }
+
+TIMESCALE_POLICY_CONFIG = {
+    "stock_price": _timescale_policy("stock_price", "90 days", "180 days", None),
+    "stock_price_1m": _timescale_policy("stock_price_1m", INTRADAY_CONFIG["chunk_interval"], "7 days", "365 days"),
+    # 分钟周期的连续聚合名为 <表名>_agg（<表名> 是重新标记时间的视图），环境变量仍按表名
+    "stock_price_5m_agg": _timescale_policy("stock_price_5m", None, None, "730 days"),
+    "stock_price_15m_agg": _timescale_policy("stock_price_15m", None, None, "1095 days"),
+    "stock_price_60m_agg": _timescale_policy("stock_price_60m", None, None, None),
+    "stock_price_1w": _timescale_policy("stock_price_1w", None, None, None)
+}
+
+
 # 从JSON文件读取要跟踪的股票
 def load_stocks_from_json(json_file_path='stocks_config.json'):
     try:
@@ -0,0 +1,174 @@
+# Backend/db_engine.py
+import atexit
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from config import DB_CONFIG, DB_POOL_CONFIG
+
+
+class TimedQueuePool(QueuePool):
+    """记录获取连接等待时间的连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.wait_stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+        }
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            with self._wait_lock:
+                self.wait_stats['timeouts'] += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._wait_lock:
+            self.wait_stats['checkouts'] += 1
+            self.wait_stats['total_wait'] += waited
+            if waited > self.wait_stats['max_wait']:
+                self.wait_stats['max_wait'] = waited
+        return conn
+
+    def recreate(self):
+        # 连接池被重建时（例如dispose）保留同样的等待统计实现
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """异步引擎（asyncpg）使用的带等待统计连接池"""
+
+
+_engines = {}
+_async_engines = {}
+_lock = threading.Lock()
+
+
+def get_connection_url(driver="postgresql"):
+    return f"{driver}://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+
+
+def get_engine(role="default"):
+    """
+    获取进程内共享的数据库引擎（首次调用时创建）
+
+    参数:
+    role (str): 使用方角色，例如 "fetcher" 或 "api"，每个角色使用独立配置的连接池
+
+    返回:
+    Engine: SQLAlchemy 引擎
+    """
+    engine = _engines.get(role)
+    if engine is not None:
+        return engine
+
+    with _lock:
+        engine = _engines.get(role)
+        if engine is None:
+            pool_config = DB_POOL_CONFIG.get(role, DB_POOL_CONFIG["default"])
+            engine = create_engine(
+                get_connection_url(),
+                poolclass=TimedQueuePool,
+                pool_size=pool_config["pool_size"],          # 连接池常驻连接数
+                max_overflow=pool_config["max_overflow"],    # 允许的最大溢出连接数
+                pool_timeout=pool_config["pool_timeout"],    # 获取连接的超时时间
+                pool_recycle=pool_config["pool_recycle"],    # 回收连接的时间(秒)
+                pool_pre_ping=True                           # 使用前 ping 检查连接是否有效
+            )
+            _engines[role] = engine
+            print(f"已创建数据库连接池 [{role}]: pool_size={pool_config['pool_size']}, "
+                  f"max_overflow={pool_config['max_overflow']}")
+    return engine
+
+
+def create_async_db_engine(role="api"):
+    """
+    创建异步数据库引擎（asyncpg驱动），供FastAPI在应用生命周期内使用
+
+    异步引擎绑定创建它的事件循环，因此不做懒加载缓存，
+    由调用方在 lifespan 中创建并在退出时调用 dispose_async_engines() 关闭。
+
+    参数:
+    role (str): 使用方角色，连接池大小取自 DB_POOL_CONFIG
+
+    返回:
+    AsyncEngine: SQLAlchemy 异步引擎
+    """
+    pool_config = DB_POOL_CONFIG.get(role, DB_POOL_CONFIG["default"])
+    engine = create_async_engine(
+        get_connection_url("postgresql+asyncpg"),
+        poolclass=TimedAsyncQueuePool,
+        pool_size=pool_config["pool_size"],
+        max_overflow=pool_config["max_overflow"],
+        pool_timeout=pool_config["pool_timeout"],
+        pool_recycle=pool_config["pool_recycle"],
+        pool_pre_ping=True
+    )
+    with _lock:
+        _async_engines[role] = engine
+    print(f"已创建异步数据库连接池 [{role}]: pool_size={pool_config['pool_size']}, "
+          f"max_overflow={pool_config['max_overflow']}")
+    return engine
+
+
+async def dispose_async_engines():
+    """关闭所有异步连接池（在创建它们的事件循环中调用）"""
+    with _lock:
+        engines = list(_async_engines.items())
+        _async_engines.clear()
+    for role, engine in engines:
+        try:
+            await engine.dispose()
+            print(f"已关闭异步数据库连接池 [{role}]")
+        except Exception as e:
+            print(f"关闭异步数据库连接池 [{role}] 时出错: {e}")
+
+
+def get_pool_stats():
+    """
+    获取所有连接池的统计信息
+
+    返回:
+    dict: 角色到统计信息的映射，包括已签出连接数、溢出连接数和等待时间
+    """
+    stats = {}
+    pools = [(role, engine.pool) for role, engine in list(_engines.items())]
+    pools += [(f"{role}-async", engine.sync_engine.pool) for role, engine in list(_async_engines.items())]
+    for role, pool in pools:
+        wait_stats = dict(getattr(pool, 'wait_stats', {}))
+        checkouts = wait_stats.get('checkouts', 0)
+        stats[role] = {
+            'pool_size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(0, pool.overflow()),
+            'checkouts': checkouts,
+            'timeouts': wait_stats.get('timeouts', 0),
+            'avg_wait_ms': (wait_stats.get('total_wait', 0.0) / checkouts * 1000) if checkouts else 0.0,
+            'max_wait_ms': wait_stats.get('max_wait', 0.0) * 1000,
+        }
+    return stats
+
+
+def dispose_all():
+    """关闭所有连接池中的连接（进程退出时调用）"""
+    with _lock:
+        for role, engine in list(_engines.items()):
+            try:
+                engine.dispose()
+                print(f"已关闭数据库连接池 [{role}]")
+            except Exception as e:
+                print(f"关闭数据库连接池 [{role}] 时出错: {e}")
+        _engines.clear()
+
+
+atexit.register(dispose_all)
@@ -0,0 +1,121 @@
+# Backend/downsample.py
+import re
+import numpy as np
+
+DOWNSAMPLE_LTTB = "lttb"  # 价格折线：最大三角形三桶算法，保留走势形状
+DOWNSAMPLE_OHLC = "ohlc"  # K线：按时间桶聚合开高低收，成交量求和
+DOWNSAMPLE_METHODS = (DOWNSAMPLE_LTTB, DOWNSAMPLE_OHLC)
+# 降采样结果的点数上限（也是未指定 max_points 时按桶聚合的上限）
+DOWNSAMPLE_MAX_POINTS = 20000
+
+_BUCKET_PATTERN = re.compile(r"^\s*(\d+)\s*(second|minute|hour|day|week|month)s?\s*$", re.IGNORECASE)
+
+
+def parse_bucket(bucket):
+    """
+    校验时间桶参数，例如 "1 week"、"15 minutes"
+
+    返回:
+    str: 规范化后的 INTERVAL 字符串，格式不合法时抛出 ValueError
+    """
+    match = _BUCKET_PATTERN.match(bucket or "")
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"无效的时间桶: {bucket}，示例: '1 day', '1 week', '15 minutes'")
+    return f"{int(match.group(1))} {match.group(2).lower()}s"
+
+
+_BUCKET_SECONDS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400, 'week': 604800, 'month': 2592000}
+
+
+def bucket_seconds(bucket):
+    """
+    时间桶的近似秒数（月按30天计），用于比较桶的大小
+
+    参数:
+    bucket (str): parse_bucket 规范化后的 INTERVAL 字符串
+    """
+    count, unit = bucket.split()
+    return int(count) * _BUCKET_SECONDS[unit.rstrip('s')]
+
+
+def bucket_for_span(first_time, last_time, max_points):
+    """
+    根据数据时间跨度计算时间桶，使桶的数量不超过 max_points
+
+    桶需要以 first_time 为起点对齐：跨度为 span 时桶数为 floor(span / 桶宽) + 1，
+    桶宽取 floor(span / max_points) + 1 秒保证 span / 桶宽 < max_points。
+
+    返回:
+    str: INTERVAL 字符串（秒）
+    """
+    span = int((last_time - first_time).total_seconds()) if first_time and last_time else 0
+    return f"{span // max(1, max_points) + 1} seconds"
+
+
+def lttb(x, y, threshold):
+    """
+    最大三角形三桶（Largest-Triangle-Three-Buckets）降采样
+
+    首尾两点固定保留，中间的点平均分为 threshold-2 个桶，
+    每个桶选出与上一个选中点和下一个桶平均点构成三角形面积最大的点。
+
+    参数:
+    x (ndarray): 横坐标（时间戳），升序
+    y (ndarray): 纵坐标（价格）
+    threshold (int): 输出点数
+
+    返回:
+    tuple: (选中点的下标, 每个桶的起始下标)，两者长度相同，可用于对成交量等按桶求和
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        indices = np.arange(n)
+        return indices, indices
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # 中间桶的边界：edges[k] 到 edges[k+1] 为第k个桶
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    starts = np.concatenate(([0], edges[:-1], [n - 1]))
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for k in range(threshold - 2):
+        lo, hi = edges[k], edges[k + 1]
+        next_hi = edges[k + 2] if k + 2 < len(edges) else n
+        avg_x = x[hi:next_hi].mean()
+        avg_y = np.nanmean(y[hi:next_hi]) if not np.all(np.isnan(y[hi:next_hi])) else y[a]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[k + 1] = a
+    return selected, starts
+
+
+def lttb_columns(columns, max_points):
+    """
+    对列式K线数据做LTTB降采样：按收盘价选点，成交量和成交额按桶求和
+
+    参数:
+    columns (dict): rows_to_columns 格式的数据（time 为ISO字符串）
+    max_points (int): 最多输出的点数
+
+    返回:
+    dict: 同样格式的降采样结果
+    """
+    n = len(columns['time'])
+    if n <= max_points:
+        return columns
+
+    x = np.array(columns['time'], dtype='datetime64[s]').astype(np.int64)
+    y = np.array([np.nan if v is None else v for v in columns['close']], dtype=float)
+    indices, starts = lttb(x, y, max_points)
+
+    result = {name: [values[i] for i in indices] for name, values in columns.items()
+              if name not in ('volume', 'turnover')}
+    for name in ('volume', 'turnover'):
+        values = np.array([0 if v is None else v for v in columns[name]], dtype=float)
+        sums = np.add.reduceat(values, starts)
+        result[name] = [int(v) for v in sums] if name == 'volume' else sums.tolist()
+    return result
@@ -0,0 +1,415 @@
+# Backend/indicator_state.py
+import json
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+from indicators import ema, diff
+
+SMA_WINDOWS = (5, 10, 20, 30, 60)
+RSI_PERIOD = 14
+VOLUME_WINDOW = 5
+EMA_FAST, EMA_SLOW, EMA_SIGNAL = 12, 26, 9
+
+INDICATOR_STATE_KEY = "stock:indicator_state:{key}"
+
+# 保存的序列开头K线数量：查询窗口的起点一次最多前移这么多根K线时仍可增量更新
+HEAD_BARS = 10
+
+_ALPHA = {span: 2.0 / (span + 1.0) for span in (EMA_FAST, EMA_SLOW, EMA_SIGNAL)}
+
+
+def _ema_step(previous, value, span):
+    alpha = _ALPHA[span]
+    return (1.0 - alpha) * previous + alpha * value
+
+
+def _signal_decay(ratio, length):
+    """sum(c^(length-j) * ratio^j, j=1..length)，c 为信号线的衰减系数"""
+    decay = 1.0 - _ALPHA[EMA_SIGNAL]
+    return ratio * (ratio ** length - decay ** length) / (ratio - decay)
+
+
+class IndicatorState:
+    """
+    一个K线序列（从起始K线到最新K线）的增量指标状态
+
+    保存 EMA 累加值、各均线窗口的滚动和、最近的收盘价/涨跌幅/成交量以及序列开头的收盘价，
+    追加一根K线、替换最新K线（当天K线盘中更新）或去掉最早的K线（查询窗口起点前移）都是常数时间。
+    指标的定义与 StockAIAnalyzer 对同一段数据做完整计算的结果相同。
+    """
+
+    def __init__(self, key, first_time):
+        self.key = key
+        self.first_time = first_time
+        self.last_time = None
+        self.count = 0
+        self.total_sum = 0.0
+        self.closes = deque(maxlen=max(SMA_WINDOWS))
+        self.sums = {w: 0.0 for w in SMA_WINDOWS}
+        # 最近的涨跌幅，RSI在计算时直接对这14个值求和，避免连续平盘时残留舍入误差
+        self.gains = deque(maxlen=RSI_PERIOD)
+        self.losses = deque(maxlen=RSI_PERIOD)
+        self.volumes = deque(maxlen=VOLUME_WINDOW)
+        # 序列开头的收盘价，窗口起点前移时用来修正 EMA
+        self.head = deque(maxlen=HEAD_BARS)
+        # 当前和最新K线之前的 EMA 值（替换最新K线时从之前的值重新递推）
+        self.ema_fast = self.ema_slow = self.signal = None
+        self.prev_ema_fast = self.prev_ema_slow = self.prev_signal = None
+        self._appends_since_resum = 0
+
+    @classmethod
+    def from_bars(cls, key, first_time, last_time, close, volume):
+        """
+        对完整序列做一次向量化计算得到状态（首次使用或历史数据变化后的回退路径）
+
+        参数:
+        key (str): 序列标识，例如 "K_DAY:US.AAPL:30"
+        first_time, last_time (str): 第一根和最后一根K线的时间
+        close, volume (ndarray): 按时间排序的收盘价和成交量（不含 NaN）
+
+        返回:
+        IndicatorState
+        """
+        state = cls(key, first_time)
+        n = len(close)
+        state.last_time = last_time
+        state.count = n
+        state.total_sum = float(close.sum())
+        state.closes.extend(close[-state.closes.maxlen:].tolist())
+        state.head.extend(close[:HEAD_BARS].tolist())
+        state._resum()
+
+        delta = diff(close[-(RSI_PERIOD + 1):])
+        # 与完整计算一致：序列的第一个差分计为0
+        state.gains.extend(np.where(delta > 0, delta, 0.0)[-RSI_PERIOD:].tolist())
+        state.losses.extend(np.where(delta < 0, -delta, 0.0)[-RSI_PERIOD:].tolist())
+        state.volumes.extend(volume[-VOLUME_WINDOW:].tolist())
+
+        fast, slow = ema(close, EMA_FAST), ema(close, EMA_SLOW)
+        signal = ema(fast - slow, EMA_SIGNAL)
+        state.ema_fast, state.ema_slow, state.signal = float(fast[-1]), float(slow[-1]), float(signal[-1])
+        if n > 1:
+            state.prev_ema_fast, state.prev_ema_slow = float(fast[-2]), float(slow[-2])
+            state.prev_signal = float(signal[-2])
+        return state
+
+    def append(self, bar_time, close, volume):
+        """追加一根新K线"""
+        if self.count:
+            change = close - self.closes[-1]
+            self.prev_ema_fast, self.prev_ema_slow, self.prev_signal = self.ema_fast, self.ema_slow, self.signal
+            self.ema_fast = _ema_step(self.ema_fast, close, EMA_FAST)
+            self.ema_slow = _ema_step(self.ema_slow, close, EMA_SLOW)
+            self.signal = _ema_step(self.signal, self.ema_fast - self.ema_slow, EMA_SIGNAL)
+        else:
+            change = 0.0
+            self.ema_fast = self.ema_slow = close
+            self.signal = 0.0
+
+        n = len(self.closes)
+        for w in SMA_WINDOWS:
+            self.sums[w] += close
+            if n >= w:
+                self.sums[w] -= self.closes[n - w]
+        self.closes.append(close)
+        if self.count < HEAD_BARS:
+            self.head.append(close)
+        self.gains.append(max(change, 0.0))
+        self.losses.append(max(-change, 0.0))
+        self.volumes.append(volume)
+        self.total_sum += close
+        self.count += 1
+        self.last_time = bar_time
+
+        # 周期性重新求和，消除浮点累积误差
+        self._appends_since_resum += 1
+        if self._appends_since_resum >= self.closes.maxlen:
+            self._resum()
+
+    def replace_last(self, close, volume):
+        """替换最新K线的收盘价和成交量（当天的K线在盘中被多次更新）"""
+        delta = close - self.closes[-1]
+        for w in SMA_WINDOWS:
+            self.sums[w] += delta
+        self.total_sum += delta
+        self.closes[-1] = close
+        self.volumes[-1] = volume
+        if self.count <= HEAD_BARS:
+            self.head[-1] = close
+
+        if self.count > 1:
+            change = close - self.closes[-2]
+            self.gains[-1] = max(change, 0.0)
+            self.losses[-1] = max(-change, 0.0)
+            self.ema_fast = _ema_step(self.prev_ema_fast, close, EMA_FAST)
+            self.ema_slow = _ema_step(self.prev_ema_slow, close, EMA_SLOW)
+            self.signal = _ema_step(self.prev_signal, self.ema_fast - self.ema_slow, EMA_SIGNAL)
+        else:
+            self.ema_fast = self.ema_slow = close
+
+    def drop_first(self, k, first_time, window):
+        """
+        窗口起点前移：去掉序列最早的k根K线，结果与从新起点完整计算相同
+
+        参数:
+        k (int): 去掉的K线数量（不超过保存的开头K线数量）
+        first_time (str): 新的第一根K线时间
+        window (ndarray): 新序列的收盘价（至少包含开头部分）
+        """
+        values = list(self.head)[:k] + [float(window[0])]
+        for i in range(k):
+            self._drop_oldest(values[i], values[i + 1])
+        self.head = deque(window[:min(HEAD_BARS, self.count)].tolist(), maxlen=HEAD_BARS)
+        self.first_time = first_time
+
+    def _drop_oldest(self, oldest, following):
+        # 以 x0 为起点的 EMA 与以 x1 为起点的 EMA 在 L 步后相差 c^L * (x0 - x1)；
+        # 信号线起点为0，差值是两条 EMA 修正量的加权和，有闭式解
+        n = self.count
+        length = n - 1
+        delta = oldest - following
+        fast, slow = 1.0 - _ALPHA[EMA_FAST], 1.0 - _ALPHA[EMA_SLOW]
+        signal_alpha = _ALPHA[EMA_SIGNAL]
+        self.ema_fast -= fast ** length * delta
+        self.ema_slow -= slow ** length * delta
+        self.signal -= signal_alpha * delta * (_signal_decay(fast, length) - _signal_decay(slow, length))
+        self.prev_ema_fast -= fast ** (length - 1) * delta
+        self.prev_ema_slow -= slow ** (length - 1) * delta
+        self.prev_signal -= signal_alpha * delta * (_signal_decay(fast, length - 1) - _signal_decay(slow, length - 1))
+
+        # 只有覆盖整个序列的窗口包含最早的K线
+        if n <= self.closes.maxlen:
+            self.closes.popleft()
+        for w in SMA_WINDOWS:
+            if n <= w:
+                self.sums[w] -= oldest
+        # 新的第一根K线的涨跌幅计为0
+        if n <= RSI_PERIOD:
+            self.gains.popleft()
+            self.losses.popleft()
+        if n <= RSI_PERIOD + 1:
+            self.gains[0] = self.losses[0] = 0.0
+        if n <= VOLUME_WINDOW:
+            self.volumes.popleft()
+        self.total_sum -= oldest
+        self.count -= 1
+
+    def sum_matches(self, expected, exclude_last=False):
+        """检查除最新K线外的历史收盘价之和是否一致，用于发现历史数据被改写"""
+        total = self.total_sum - (self.closes[-1] if exclude_last else 0.0)
+        return abs(total - expected) <= 1e-9 * max(1.0, abs(expected))
+
+    @property
+    def last_close(self):
+        return self.closes[-1]
+
+    @property
+    def last_volume(self):
+        return self.volumes[-1]
+
+    def recent_closes(self):
+        """最近的收盘价（最多 max(SMA_WINDOWS) 个），用于计算支撑位和阻力位"""
+        return np.array(self.closes)
+
+    def analysis(self):
+        """
+        生成与 StockAIAnalyzer._perform_technical_analysis 相同格式的分析结果
+
+        返回:
+        dict: 技术分析结果
+        """
+        n = self.count
+        latest = self.closes[-1]
+        analysis = {'latest_price': float(latest)}
+        if n > 1:
+            previous = self.closes[-2]
+            analysis['previous_price'] = float(previous)
+            analysis['price_change'] = float(latest - previous)
+            analysis['price_change_percent'] = float((latest - previous) / previous * 100)
+        else:
+            analysis['previous_price'] = None
+            analysis['price_change'] = 0
+            analysis['price_change_percent'] = 0
+
+        for w in SMA_WINDOWS:
+            analysis[f'sma{w}'] = float(self.sums[w] / w) if n >= w else None
+
+        analysis['rsi'] = None
+        if n >= RSI_PERIOD:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rs = np.float64(sum(self.gains)) / np.float64(sum(self.losses))
+                value = 100.0 - 100.0 / (1.0 + rs)
+            analysis['rsi'] = None if np.isnan(value) else float(value)
+
+        macd_line = self.ema_fast - self.ema_slow
+        analysis['macd'] = float(macd_line)
+        analysis['macd_signal'] = float(self.signal)
+        analysis['macd_histogram'] = float(macd_line - self.signal)
+
+        analysis['volume'] = int(self.volumes[-1])
+        if n > 5:
+            analysis['volume_5day_avg'] = float(sum(self.volumes) / VOLUME_WINDOW)
+        return analysis
+
+    def to_dict(self):
+        return {
+            'key': self.key, 'first_time': self.first_time, 'last_time': self.last_time,
+            'count': self.count, 'total_sum': self.total_sum,
+            'closes': list(self.closes), 'head': list(self.head), 'sums': {str(w): s for w, s in self.sums.items()},
+            'gains': list(self.gains), 'losses': list(self.losses), 'volumes': list(self.volumes),
+            'ema': [self.ema_fast, self.ema_slow, self.signal],
+            'prev_ema': [self.prev_ema_fast, self.prev_ema_slow, self.prev_signal],
+            'appends_since_resum': self._appends_since_resum,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data['key'], data['first_time'])
+        state.last_time = data['last_time']
+        state.count = data['count']
+        state.total_sum = data['total_sum']
+        state.closes.extend(data['closes'])
+        state.head.extend(data.get('head', []))
+        state.sums = {int(w): s for w, s in data['sums'].items()}
+        state.gains.extend(data['gains'])
+        state.losses.extend(data['losses'])
+        state.volumes.extend(data['volumes'])
+        state.ema_fast, state.ema_slow, state.signal = data['ema']
+        state.prev_ema_fast, state.prev_ema_slow, state.prev_signal = data['prev_ema']
+        state._appends_since_resum = data.get('appends_since_resum', 0)
+        return state
+
+    def _resum(self):
+        self._appends_since_resum = 0
+        closes = list(self.closes)
+        n = len(closes)
+        for w in SMA_WINDOWS:
+            self.sums[w] = float(sum(closes[n - w:])) if n >= w else float(sum(closes))
+
+
+class IndicatorStateStore:
+    """
+    增量指标状态存储：进程内LRU，或保存在Redis中供多个API进程共享
+
+    每个序列标识只保存一个状态；读取时返回副本，并发的分析请求互不影响。
+    """
+
+    def __init__(self, redis_client=None, max_entries=5000, ttl=86400):
+        """
+        参数:
+        redis_client: redis.Redis 客户端，为None时只使用进程内存储
+        max_entries (int): 进程内最多保存的状态数量
+        ttl (int): Redis中状态的过期时间（秒）
+        """
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'appends': 0, 'replaces': 0, 'rebases': 0, 'rebuilds': 0, 'errors': 0}
+
+    def get(self, key):
+        try:
+            if self.redis is not None:
+                raw = self.redis.get(INDICATOR_STATE_KEY.format(key=key))
+                return IndicatorState.from_dict(json.loads(raw)) if raw else None
+            with self._lock:
+                data = self._local.get(key)
+                if data is None:
+                    return None
+                self._local.move_to_end(key)
+            return IndicatorState.from_dict(data)
+        except Exception as e:
+            self.record('errors')
+            print(f"读取指标状态 {key} 时出错: {e}")
+            return None
+
+    def put(self, state):
+        data = state.to_dict()
+        try:
+            if self.redis is not None:
+                self.redis.set(INDICATOR_STATE_KEY.format(key=state.key), json.dumps(data), ex=self.ttl)
+                return
+            with self._lock:
+                self._local[state.key] = data
+                self._local.move_to_end(state.key)
+                while len(self._local) > self.max_entries:
+                    self._local.popitem(last=False)
+        except Exception as e:
+            self.record('errors')
+            print(f"保存指标状态 {state.key} 时出错: {e}")
+
+    def sync(self, key, times, close, volume):
+        """
+        使状态与查询得到的序列对齐：最新K线未变时直接使用，最新K线被更新时替换，
+        多了一根新K线时追加，查询窗口起点前移时去掉最早的K线；
+        历史被改写、出现缺口或没有状态时按完整序列重建
+
+        参数:
+        key (str): 序列标识
+        times (tuple): 第一根、倒数第二根（只有一根K线时为None）和最后一根K线的时间
+        close, volume (ndarray): 按时间排序的收盘价和成交量（不含 NaN）
+
+        返回:
+        IndicatorState: 与序列最新K线对应的状态
+        """
+        first_time, previous_time, last_time = times
+        state = self.get(key)
+        rebased = state is not None and state.first_time != first_time
+        if state is not None and state.last_time == last_time and self._matches(state, first_time, close, False):
+            if rebased:
+                self.record('rebases')
+            if state.last_close != close[-1] or state.last_volume != volume[-1]:
+                state.replace_last(float(close[-1]), float(volume[-1]))
+                self.record('replaces')
+                self.put(state)
+            else:
+                self.record('hits')
+            return state
+        if (state is not None and previous_time is not None and state.last_time == previous_time
+                and self._matches(state, first_time, close, True)):
+            state.append(last_time, float(close[-1]), float(volume[-1]))
+            if rebased:
+                self.record('rebases')
+            self.record('appends')
+            self.put(state)
+            return state
+
+        state = IndicatorState.from_bars(key, first_time, last_time, close, volume)
+        self.record('rebuilds')
+        self.put(state)
+        return state
+
+    @staticmethod
+    def _matches(state, first_time, close, appending):
+        history = len(close) - 1
+        expected_count = history if appending else history + 1
+        if state.first_time != first_time:
+            # 查询窗口的起点前移了k根K线：保存的开头K线中，未去掉的部分必须与新序列的开头相同
+            k = state.count - expected_count
+            head = list(state.head)
+            if not 0 < k <= len(head) or state.count - k < 2:
+                return False
+            if not np.array_equal(close[:len(head) - k], head[k:]):
+                return False
+            state.drop_first(k, first_time, close[:state.count - k])
+
+        # 状态中已确定的收盘价（追加时为全部，否则不含最新K线）必须与序列中最新K线之前的部分相同
+        recent = list(state.closes) if appending else list(state.closes)[:-1]
+        if len(recent) > history or not np.array_equal(close[history - len(recent):history], recent):
+            return False
+        history_sum = float(close[:history].sum())
+        return state.count == expected_count and state.sum_matches(history_sum, exclude_last=not appending)
+
+    def record(self, event):
+        with self._lock:
+            self._stats[event] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_entries'] = len(self._local)
+            syncs = stats['hits'] + stats['appends'] + stats['replaces'] + stats['rebuilds']
+            stats['rebuild_rate'] = round(stats['rebuilds'] / syncs, 4) if syncs else 0.0
+        stats['backend'] = 'redis' if self.redis is not None else 'local'
+        return stats
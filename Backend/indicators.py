@@ -0,0 +1,216 @@
+# Backend/indicators.py
+import numpy as np
+
+# 指标计算内核：输入输出都是按时间升序的 float64 数组，
+# 结果与分析器原先的 pandas 计算（rolling().mean()、ewm(adjust=False)）一致，
+# 包括序列中间的 NaN（例如缺失的收盘价），窗口未满的位置为 NaN。
+# 二维数组按列（第0维为时间）同时计算多只股票。
+
+RSI_SIMPLE = "simple"  # 涨跌幅的简单移动平均（与原 pandas 逻辑相同）
+RSI_WILDER = "wilder"  # Wilder 平滑：首个值为简单平均，之后按 1/period 递推
+RSI_METHODS = (RSI_SIMPLE, RSI_WILDER)
+
+# EMA 分块递推时每块内部权重的最大动态范围，避免指数溢出并控制舍入误差
+_EMA_MAX_RANGE = 1e100
+
+
+def as_array(values):
+    """转换为连续的 float64 数组，None 视为 NaN"""
+    if isinstance(values, np.ndarray) and values.dtype == np.float64:
+        return np.ascontiguousarray(values)
+    return np.array(values, dtype=np.float64)
+
+
+def sma(values, window):
+    """
+    简单移动平均（累积和实现），窗口内有 NaN 时结果为 NaN，等价于 Series.rolling(window).mean()
+
+    参数:
+    values (ndarray): 输入序列，二维时每列一只股票
+    window (int): 窗口长度
+
+    返回:
+    ndarray: 与输入形状相同的均值序列
+    """
+    values = as_array(values)
+    n = len(values)
+    result = np.full(values.shape, np.nan)
+    if window <= 0 or n < window:
+        return result
+
+    missing = np.isnan(values)
+    # 减去每列第一个有效值再累加，降低长序列累积和的舍入误差
+    offset = np.take_along_axis(values, np.argmax(~missing, axis=0)[None, ...], axis=0)[0]
+    offset = np.where(np.isnan(offset), 0.0, offset)
+    shifted = np.where(missing, 0.0, values - offset)
+
+    sums = np.cumsum(shifted, axis=0)
+    sums[window:] = sums[window:] - sums[:-window]
+    result[window - 1:] = sums[window - 1:] / window + offset
+
+    if missing.any():
+        counts = np.cumsum(missing, axis=0)
+        counts[window:] = counts[window:] - counts[:-window]
+        result[window - 1:][counts[window - 1:] > 0] = np.nan
+    return result
+
+
+def ema(values, span):
+    """
+    指数移动平均，等价于 Series.ewm(span=span, adjust=False).mean()
+
+    y[0] = x[0]，y[t] = (1 - a) * y[t-1] + a * x[t]，a = 2 / (span + 1)。
+    递推按块展开为累积和：块内 y[i] = c^(i+1) * y_prev + a * c^i * Σ x[k] * c^(-k)，
+    块长度保证 c^(-k) 不超过 _EMA_MAX_RANGE。
+    开头的 NaN 输出为 NaN（二维时每列的起点可以不同）。
+    中间有 NaN 的列按 ewm(ignore_na=False) 的方式逐行递推：NaN 处沿用上一个值，
+    之后的有效值按经过的行数衰减旧值的权重。
+
+    参数:
+    values (ndarray): 输入序列，二维时每列一只股票
+    span (int): 周期
+
+    返回:
+    ndarray: 与输入形状相同的 EMA 序列
+    """
+    values = as_array(values)
+    n = len(values)
+    if not n:
+        return np.full(values.shape, np.nan)
+
+    # 减去每列第一个有效值后开头的 NaN 填0：0序列的 EMA 仍为0，
+    # 因此从第0行开始递推与从第一个有效值开始递推结果相同
+    leading = np.cumsum(~np.isnan(values), axis=0) == 0
+    first = np.take_along_axis(values, np.argmax(~leading, axis=0)[None, ...], axis=0)[0]
+    values = np.where(leading, 0.0, values - first)
+
+    alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+
+    gaps = np.isnan(values)
+    if gaps.any():
+        if values.ndim == 1:
+            result = _ema_with_gaps(values, alpha)
+        else:
+            # 只有包含中间 NaN 的列逐行递推，其余列仍走分块累积和
+            columns = gaps.any(axis=0)
+            result = np.empty(values.shape)
+            result[:, columns] = _ema_with_gaps(values[:, columns], alpha)
+            result[:, ~columns] = ema(values[:, ~columns], span)
+        result += first
+        result[leading] = np.nan
+        return result
+    block = n if decay <= 0 else max(1, int(np.log(_EMA_MAX_RANGE) / -np.log(decay)))
+
+    result = np.empty(values.shape)
+    prev = result[0] = values[0]
+    shape = (-1,) + (1,) * (values.ndim - 1)
+    powers = (decay ** np.arange(1, min(block, n) + 1)).reshape(shape)  # c^1 .. c^block
+    position = 1
+    while position < n:
+        chunk = values[position:position + block]
+        m = len(chunk)
+        p = powers[:m]
+        # Σ x[k] * c^(-k) 的前缀和，再乘以 c^i 还原
+        weighted = np.cumsum(chunk / p, axis=0) * p
+        result[position:position + m] = p * prev + alpha * weighted
+        prev = result[position + m - 1]
+        position += m
+    result += first
+    result[leading] = np.nan
+    return result
+
+
+def _ema_with_gaps(values, alpha):
+    # 与 pandas ewm(adjust=False, ignore_na=False) 相同：旧值权重每行乘以 (1 - a)，遇到有效值后归一化并重置为1
+    decay = 1.0 - alpha
+    result = np.empty(values.shape)
+    weighted = values[0].copy()
+    old_weight = np.ones(values.shape[1:])
+    result[0] = weighted
+    for i in range(1, len(values)):
+        current = values[i]
+        observed = ~np.isnan(current)
+        old_weight = old_weight * decay
+        update = (old_weight * weighted + alpha * current) / (old_weight + alpha)
+        weighted = np.where(observed, update, weighted)
+        old_weight = np.where(observed, 1.0, old_weight)
+        result[i] = weighted
+    return result
+
+
+def diff(values):
+    """一阶差分，首个元素为 NaN"""
+    values = as_array(values)
+    result = np.empty_like(values)
+    result[:1] = np.nan
+    np.subtract(values[1:], values[:-1], out=result[1:])
+    return result
+
+
+def rsi(close, period=14, method=RSI_SIMPLE):
+    """
+    相对强弱指标
+
+    二维输入中各列开头的 NaN 不会使结果为 NaN（差分计为0），
+    窗口跨越各列起点的位置需要由调用方按有效K线数屏蔽。
+
+    参数:
+    close (ndarray): 收盘价，二维时每列一只股票
+    period (int): 周期
+    method (str): RSI_SIMPLE（与原 pandas 逻辑一致）或 RSI_WILDER
+
+    返回:
+    ndarray: 与输入形状相同的 RSI 序列
+    """
+    delta = diff(close)
+    # 与 Series.where(delta > 0, 0) 一致：首个差分（NaN）计为 0
+    with np.errstate(invalid='ignore'):
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+
+    if method == RSI_SIMPLE:
+        avg_gain = sma(gain, period)
+        avg_loss = sma(loss, period)
+    elif method == RSI_WILDER:
+        avg_gain = _wilder(gain, period)
+        avg_loss = _wilder(loss, period)
+    else:
+        raise ValueError(f"不支持的RSI计算方式: {method}，可选 {', '.join(RSI_METHODS)}")
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+        return 100.0 - 100.0 / (1.0 + rs)
+
+
+def _wilder(values, period):
+    # 第一个值为前 period 个变化（不含首个差分）的简单平均，之后 y[t] = y[t-1] + (x[t] - y[t-1]) / period
+    n = len(values)
+    result = np.full(values.shape, np.nan)
+    if n <= period:
+        return result
+    seeded = values[period:].copy()
+    seeded[0] = values[1:period + 1].mean(axis=0)
+    # Wilder 平滑等价于 alpha = 1/period 的 EMA（span = 2*period - 1）
+    result[period:] = ema(seeded, 2 * period - 1)
+    return result
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """
+    MACD 指标
+
+    返回:
+    tuple: (MACD线, 信号线, 柱状图)，均为与输入形状相同的数组
+    """
+    close = as_array(close)
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def last_value(values):
+    """取序列最后一个值，NaN 或空序列返回 None"""
+    if not len(values) or np.isnan(values[-1]):
+        return None
+    return float(values[-1])
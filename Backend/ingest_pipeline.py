@@ -0,0 +1,222 @@
+# Backend/ingest_pipeline.py
+import threading
+import time
+import traceback
+from collections import deque, namedtuple
+
+# 报价队列满时的处理策略（K线是持久化数据，不受容量限制，也从不丢弃）
+OVERFLOW_BLOCK = "block"              # 阻塞等待（最多 block_timeout 秒），超时后丢弃新报价
+OVERFLOW_DROP_NEWEST = "drop_newest"  # 直接丢弃新报价
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # 丢弃队列中最旧的报价，为新报价腾出位置
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST)
+
+
+class TickRecord(namedtuple('TickRecord', ['code', 'price', 'received_at'])):
+    """实时报价记录，同一股票未处理的报价只保留最新一条"""
+    __slots__ = ()
+
+    @property
+    def coalesce_key(self):
+        return ('tick', self.code)
+
+
+class BarRecord(namedtuple('BarRecord', ['code', 'ktype', 'time_key', 'open', 'close', 'high', 'low',
+                                         'volume', 'turnover', 'received_at'])):
+    """K线记录，同一股票同一周期同一根K线未处理的推送只保留最新一条"""
+    __slots__ = ()
+
+    @property
+    def coalesce_key(self):
+        return ('bar', self.code, self.ktype, self.time_key)
+
+
+class _Shard:
+    """
+    单个工作线程对应的队列，同一股票总是落在同一分片上以保证处理顺序
+
+    K线和报价分开排队：报价队列有界并按溢出策略丢弃，K线队列无界，
+    存储变慢时K线只会积压而不会被报价挤掉；工作线程优先处理K线。
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.bars = deque()
+        self.ticks = deque()
+        self.pending = {}
+        self.cond = threading.Condition()
+
+    def depth(self):
+        return len(self.bars) + len(self.ticks)
+
+
+class IngestPipeline:
+    """
+    行情接入流水线
+
+    Futu回调线程只负责解析推送并调用 submit() 入队，
+    由工作线程池异步完成Redis和数据库写入，存储变慢时不会阻塞推送线程。
+    """
+
+    def __init__(self, handler, num_workers=4, max_queue_size=10000,
+                 overflow_policy=OVERFLOW_DROP_OLDEST, block_timeout=0.05, name="ingest"):
+        """
+        参数:
+        handler (callable): 处理单条记录的函数
+        num_workers (int): 工作线程数量
+        max_queue_size (int): 所有分片报价队列的总容量（K线队列不限容量）
+        overflow_policy (str): 报价队列满时的处理策略，见 OVERFLOW_POLICIES
+        block_timeout (float): block 策略下最长等待时间（秒）
+        name (str): 线程名前缀
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的队列溢出策略: {overflow_policy}")
+
+        self.handler = handler
+        self.num_workers = max(1, int(num_workers))
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.name = name
+
+        shard_size = max(1, int(max_queue_size) // self.num_workers)
+        self._shards = [_Shard(shard_size) for _ in range(self.num_workers)]
+        self._threads = []
+        self._running = threading.Event()
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'coalesced': 0,
+            'dropped': 0,
+            'processed': 0,
+            'errors': 0,
+            'last_lag': 0.0,
+            'max_lag': 0.0,
+        }
+
+    def start(self):
+        """启动工作线程"""
+        if self._running.is_set():
+            return
+        self._running.set()
+        for i, shard in enumerate(self._shards):
+            thread = threading.Thread(target=self._worker, args=(shard,),
+                                      name=f"{self.name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"接入流水线已启动: {self.num_workers} 个工作线程, 溢出策略 {self.overflow_policy}")
+
+    def stop(self, timeout=5.0):
+        """停止工作线程，尽量处理完已入队的记录"""
+        deadline = time.time() + timeout
+        while self.queue_depth() > 0 and time.time() < deadline:
+            time.sleep(0.05)
+        self._running.clear()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.time()))
+        self._threads = []
+
+    def submit(self, record):
+        """
+        提交一条记录（在Futu回调线程中调用）
+
+        参数:
+        record: TickRecord 或 BarRecord
+
+        返回:
+        bool: 记录是否被接收（合并也视为接收）
+        """
+        key = record.coalesce_key
+        shard = self._shards[hash(record.code) % self.num_workers]
+
+        with shard.cond:
+            if key in shard.pending:
+                # 尚未处理的同一键记录直接用新值覆盖
+                shard.pending[key] = record
+                self._incr('coalesced')
+                return True
+
+            if isinstance(record, BarRecord):
+                self._enqueue(shard, shard.bars, key, record)
+                return True
+
+            if len(shard.ticks) >= shard.max_size:
+                if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                    self._incr('dropped')
+                    return False
+                if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                    old_key = shard.ticks.popleft()
+                    shard.pending.pop(old_key, None)
+                    self._incr('dropped')
+                else:
+                    # block 策略：等待工作线程取走记录（wait 期间释放锁）
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(shard.ticks) >= shard.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._incr('dropped')
+                            return False
+                        shard.cond.wait(remaining)
+                        if key in shard.pending:
+                            # 等待期间同一股票的报价已入队，合并到该记录
+                            shard.pending[key] = record
+                            self._incr('coalesced')
+                            return True
+
+            self._enqueue(shard, shard.ticks, key, record)
+            return True
+
+    def _enqueue(self, shard, keys, key, record):
+        # 调用方持有 shard.cond
+        keys.append(key)
+        shard.pending[key] = record
+        self._incr('enqueued')
+        shard.cond.notify_all()
+
+    def queue_depth(self):
+        """当前所有分片中待处理的记录数"""
+        return sum(shard.depth() for shard in self._shards)
+
+    def stats(self):
+        """
+        获取流水线运行统计
+
+        返回:
+        dict: 队列深度、入队/合并/丢弃/处理数量以及处理延迟（秒）
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self.queue_depth()
+        stats['bar_queue_depth'] = sum(len(shard.bars) for shard in self._shards)
+        stats['workers'] = self.num_workers
+        stats['overflow_policy'] = self.overflow_policy
+        return stats
+
+    def _incr(self, name, value=1):
+        with self._stats_lock:
+            self._stats[name] += value
+
+    def _worker(self, shard):
+        while self._running.is_set():
+            with shard.cond:
+                if not shard.bars and not shard.ticks:
+                    shard.cond.wait(0.5)
+                    continue
+                key = shard.bars.popleft() if shard.bars else shard.ticks.popleft()
+                record = shard.pending.pop(key, None)
+                # 唤醒等待报价队列空位的提交方
+                shard.cond.notify_all()
+            if record is None:
+                continue
+
+            try:
+                self.handler(record)
+                lag = time.time() - record.received_at
+                with self._stats_lock:
+                    self._stats['processed'] += 1
+                    self._stats['last_lag'] = lag
+                    if lag > self._stats['max_lag']:
+                        self._stats['max_lag'] = lag
+            except Exception as e:
+                self._incr('errors')
+                print(f"接入流水线处理 {record.code} 时出错: {e}")
+                traceback.print_exc()
@@ -0,0 +1,216 @@
+# Backend/ma_engine.py
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import text
+
+# 需要维护的均线周期
+MA_WINDOWS = (5, 10, 20, 30, 60)
+
+
+class MovingAverageState:
+    """
+    单只股票的均线滚动窗口状态
+
+    使用定长环形缓冲区保存最近的日收盘价，并为每个均线周期维护滚动和，
+    这样实时报价到来时读取均线是O(1)操作，日K收盘时推进窗口也只需常数次加减。
+    """
+
+    def __init__(self, code, windows=MA_WINDOWS):
+        self.code = code
+        self.windows = tuple(sorted(windows))
+        self.max_window = self.windows[-1]
+        self.closes = deque(maxlen=self.max_window)
+        self.sums = {w: 0.0 for w in self.windows}
+        self.last_bar_time = None
+        self._appends_since_resum = 0
+        # 均线数值变化后置为True，写入Redis后由调用方清除
+        self.dirty = True
+
+    def seed(self, bars):
+        """
+        用历史日K初始化窗口
+
+        参数:
+        bars (list): 按时间升序排列的 (time, close) 列表
+        """
+        self.closes.clear()
+        self.last_bar_time = None
+        for bar_time, close in bars:
+            if close is None:
+                continue
+            self.closes.append(float(close))
+            self.last_bar_time = bar_time
+        self._resum()
+        self.dirty = True
+
+    def push_bar(self, bar_time, close):
+        """
+        推进一根日K收盘价
+
+        如果与最后一根K线时间相同（同一天的K线被多次推送），则替换最后一个收盘价；
+        如果是更早的K线则忽略。
+
+        参数:
+        bar_time (datetime): K线时间
+        close (float): 收盘价
+
+        返回:
+        bool: 窗口是否发生了变化
+        """
+        if close is None:
+            return False
+        close = float(close)
+
+        if self.last_bar_time is not None and bar_time < self.last_bar_time:
+            return False
+
+        if self.last_bar_time is not None and bar_time == self.last_bar_time and self.closes:
+            # 替换当天的收盘价，只需修正各窗口的差值
+            delta = close - self.closes[-1]
+            if delta == 0:
+                return False
+            self.closes[-1] = close
+            for w in self.windows:
+                self.sums[w] += delta
+        else:
+            n = len(self.closes)
+            for w in self.windows:
+                self.sums[w] += close
+                # 移出该窗口最早的收盘价
+                if n >= w:
+                    self.sums[w] -= self.closes[n - w]
+            self.closes.append(close)
+            self.last_bar_time = bar_time
+            # 周期性重新求和，消除浮点累积误差
+            self._appends_since_resum += 1
+            if self._appends_since_resum >= self.max_window:
+                self._resum()
+
+        self.dirty = True
+        return True
+
+    def moving_averages(self):
+        """
+        获取当前各周期均线
+
+        返回:
+        dict: {'MA5': float或None, ...}，数据不足的周期为None
+        """
+        n = len(self.closes)
+        return {f"MA{w}": (self.sums[w] / w if n >= w else None) for w in self.windows}
+
+    def _resum(self):
+        self._appends_since_resum = 0
+        closes = list(self.closes)
+        n = len(closes)
+        for w in self.windows:
+            self.sums[w] = float(sum(closes[n - w:])) if n >= w else float(sum(closes))
+
+
+class MovingAverageRegistry:
+    """
+    所有跟踪股票的均线状态注册表（线程安全）
+
+    启动时通过一次SQL为全部股票预热窗口，之后只在日K收盘时推进，
+    实时报价路径上不再访问数据库。
+    """
+
+    def __init__(self, windows=MA_WINDOWS):
+        self.windows = tuple(sorted(windows))
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def get(self, code):
+        with self._lock:
+            return self._states.get(code)
+
+    def is_seeded(self, code):
+        with self._lock:
+            return code in self._states
+
+    def seed_from_db(self, engine, codes):
+        """
+        一次查询为多只股票加载最近的日K收盘价
+
+        参数:
+        engine: 数据库引擎
+        codes (list): 股票代码列表
+
+        返回:
+        int: 成功预热的股票数量
+        """
+        codes = list(codes)
+        if not codes:
+            return 0
+
+        max_window = self.windows[-1]
+        query = text("""
+        SELECT code, time, close FROM (
+            SELECT code, time, close,
+                   ROW_NUMBER() OVER (PARTITION BY code ORDER BY time DESC) AS rn
+            FROM stock_price
+            WHERE code = ANY(:codes)
+        ) t
+        WHERE rn <= :limit
+        ORDER BY code, time
+        """)
+
+        bars_by_code = {code: [] for code in codes}
+        with engine.connect() as conn:
+            result = conn.execute(query, {"codes": codes, "limit": max_window})
+            for row in result:
+                bars_by_code.setdefault(row.code, []).append((row.time, row.close))
+
+        seeded = 0
+        with self._lock:
+            for code, bars in bars_by_code.items():
+                state = MovingAverageState(code, self.windows)
+                state.seed(bars)
+                self._states[code] = state
+                if bars:
+                    seeded += 1
+
+        print(f"均线引擎已预热 {seeded}/{len(codes)} 支股票")
+        return seeded
+
+    def push_bar(self, code, bar_time, close):
+        """
+        推进指定股票的日K窗口
+
+        参数:
+        code (str): 股票代码
+        bar_time (datetime或str): K线时间，字符串格式为 "%Y-%m-%d %H:%M:%S"
+        close (float): 收盘价
+
+        返回:
+        bool: 窗口是否发生了变化
+        """
+        if isinstance(bar_time, str):
+            bar_time = datetime.strptime(bar_time, "%Y-%m-%d %H:%M:%S")
+
+        with self._lock:
+            state = self._states.get(code)
+            if state is None:
+                state = MovingAverageState(code, self.windows)
+                self._states[code] = state
+            return state.push_bar(bar_time, close)
+
+    def snapshot(self, code):
+        """
+        获取均线值以及是否需要重新写入Redis，读取后清除变更标记
+
+        返回:
+        tuple: (均线字典或None, 是否有变化)
+        """
+        with self._lock:
+            state = self._states.get(code)
+            if state is None:
+                return None, False
+            changed = state.dirty
+            state.dirty = False
+            return state.moving_averages(), changed
+
+
+# 进程内共享的均线注册表
+ma_registry = MovingAverageRegistry()
@@ -0,0 +1,289 @@
+# Backend/panel.py
+import numpy as np
+from indicators import as_array, sma, rsi, macd
+from ranking import recommendation_text
+
+MA_PERIODS = (5, 10, 20, 30, 60)
+RSI_PERIOD = 14
+
+# 建议动作的编码
+ACTION_HOLD, ACTION_BUY, ACTION_SELL = 0, 1, -1
+ACTION_NAMES = {ACTION_HOLD: 'HOLD', ACTION_BUY: 'BUY', ACTION_SELL: 'SELL'}
+
+# 交易建议规则的参数，默认值与 StockAIAnalyzer._generate_recommendations 相同
+# ma_periods 从短到长依次对应规则中的 5/10/20/30/60 日均线，ma_confidence 为价格低于对应均线时的置信度
+DEFAULT_RULE_PARAMS = {
+    'ma_periods': MA_PERIODS,
+    'ma_confidence': (0.6, 0.65, 0.7, 0.75, 0.8),
+    'alignment_confidence': 0.7,
+    'rsi_overbought': 70,
+    'rsi_oversold': 30,
+    'rsi_confidence': 0.65,
+    'rsi_boost': 0.15,
+    'rsi_cap': 0.85,
+    'macd_confidence': 0.6,
+    'macd_boost': 0.1,
+    'macd_cap': 0.9,
+}
+
+SCREENER_FIELDS = [
+    'code', 'time', 'latest_price', 'previous_price', 'price_change_percent',
+    'sma5', 'sma10', 'sma20', 'sma30', 'sma60', 'rsi', 'macd', 'macd_signal', 'macd_histogram',
+    'volume', 'volume_5day_avg', 'recommendation_level', 'recommendation_text',
+    'action', 'confidence', 'risk_level',
+]
+
+
+class PricePanel:
+    """
+    多只股票的 (K线 × 股票) 价格矩阵
+
+    每列是一只股票，按K线位置右对齐：最后一行是每只股票的最新K线，
+    历史较短的股票在开头补 NaN。不同市场的交易日不同（例如港股和美股的假期），
+    按日历日期对齐会在序列中间插入空值，右对齐则保证每列的滚动窗口
+    只包含该股票自己的K线，结果与逐只股票分析一致。
+    """
+
+    def __init__(self, codes, close, volume, last_time):
+        """
+        参数:
+        codes (list): 股票代码，与矩阵的列对应
+        close (ndarray): 收盘价矩阵，形状为 (K线数, 股票数)
+        volume (ndarray): 成交量矩阵
+        last_time (list): 每只股票最新K线的时间
+        """
+        self.codes = list(codes)
+        self.close = close
+        self.volume = volume
+        self.last_time = list(last_time)
+        # 每个位置之前（含）该股票的有效K线数
+        self.counts = np.cumsum(~np.isnan(close), axis=0)
+        self._indicators = None
+
+    @classmethod
+    def from_columns(cls, columns, presorted=False):
+        """
+        由一次查询得到的列式数据构建面板
+
+        参数:
+        columns (dict): 包含 code、time、close、volume 列的字典
+        presorted (bool): 数据是否已按 (code, time) 排序（查询带 ORDER BY code, time 时可跳过排序）
+
+        返回:
+        PricePanel
+        """
+        codes = np.asarray(columns['code'], dtype=str)
+        if not len(codes):
+            empty = np.empty((0, 0))
+            return cls([], empty, empty, [])
+
+        close = as_array(columns['close'])
+        volume = as_array(columns['volume'])
+        order = None
+        if not presorted:
+            order = np.lexsort((np.asarray(columns['time']).astype(str), codes))
+            codes, close, volume = codes[order], close[order], volume[order]
+
+        # 同一股票的数据连续排列，按相邻代码是否相同切分
+        starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+        counts = np.diff(np.append(starts, len(codes)))
+        length = counts.max()
+        # 第i只股票的第k根K线放在第 (length - counts[i] + k) 行
+        column = np.repeat(np.arange(len(starts)), counts)
+        row = np.arange(len(codes)) - np.repeat(starts, counts) + np.repeat(length - counts, counts)
+
+        close_matrix = np.full((length, len(starts)), np.nan)
+        volume_matrix = np.full((length, len(starts)), np.nan)
+        close_matrix[row, column] = close
+        volume_matrix[row, column] = volume
+
+        last = starts + counts - 1
+        if order is not None:
+            last = order[last]
+        times = columns['time']
+        last_time = [t.isoformat() if hasattr(t, 'isoformat') else t for t in (times[i] for i in last)]
+        return cls(codes[starts].tolist(), close_matrix, volume_matrix, last_time)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def indicators(self):
+        """
+        对所有股票同时计算指标
+
+        返回:
+        dict: 指标名到 (K线数, 股票数) 矩阵的映射
+        """
+        if self._indicators is None:
+            close = self.close
+            result = {f'sma{period}': sma(close, period) for period in MA_PERIODS}
+            values = rsi(close, RSI_PERIOD)
+            # 差分在各列起点计为0，有效K线不足一个窗口的位置需要屏蔽
+            values[self.counts < RSI_PERIOD] = np.nan
+            result['rsi'] = values
+            result['macd'], result['macd_signal'], result['macd_histogram'] = macd(close, 12, 26, 9)
+            result['volume_5day_avg'] = sma(self.volume, 5)
+            self._indicators = result
+        return self._indicators
+
+    def latest(self):
+        """
+        每只股票最新K线的价格和指标
+
+        返回:
+        dict: 字段名到长度为股票数的数组的映射
+        """
+        n = len(self.close)
+        count = self.counts[-1] if n else np.zeros(0)
+        latest = {name: values[-1] for name, values in self.indicators().items()}
+        latest['latest_price'] = self.close[-1]
+        previous = self.close[-2] if n > 1 else np.full(len(self), np.nan)
+        latest['previous_price'] = np.where(count > 1, previous, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            change = np.where(count > 1, (self.close[-1] - previous) / previous * 100, 0.0)
+        latest['price_change_percent'] = change
+        latest['volume'] = self.volume[-1]
+        latest['volume_5day_avg'] = np.where(count > 5, latest['volume_5day_avg'], np.nan)
+        return latest
+
+    def screener(self):
+        """
+        生成选股表：每只股票一行，包含最新指标、推荐级别和规则给出的建议
+
+        返回:
+        dict: SCREENER_FIELDS 中每个字段的值列表（NaN 转换为 None）
+        """
+        latest = self.latest()
+        ma = {period: latest[f'sma{period}'] for period in MA_PERIODS}
+        levels = recommendation_levels(latest['latest_price'], ma)
+        actions, confidence, high_risk = evaluate_rules(latest)
+
+        table = {'code': self.codes, 'time': self.last_time}
+        for name in ('latest_price', 'previous_price', 'price_change_percent', 'sma5', 'sma10', 'sma20',
+                     'sma30', 'sma60', 'rsi', 'macd', 'macd_signal', 'macd_histogram', 'volume_5day_avg'):
+            table[name] = _to_list(latest[name])
+        table['volume'] = [None if np.isnan(v) else int(v) for v in latest['volume']]
+        table['recommendation_level'] = levels.tolist()
+        table['recommendation_text'] = [recommendation_text(level) for level in table['recommendation_level']]
+        table['action'] = [ACTION_NAMES[a] for a in actions.tolist()]
+        table['confidence'] = confidence.tolist()
+        table['risk_level'] = ['HIGH' if h else 'MEDIUM' for h in high_risk.tolist()]
+        return {name: table[name] for name in SCREENER_FIELDS}
+
+
+def _to_list(values):
+    return [None if np.isnan(v) else float(v) for v in values.tolist()]
+
+
+def _present(values):
+    # 与分析器中 `if analysis['sma5']` 的判断一致：None(NaN) 和 0 都视为无效
+    return ~np.isnan(values) & (values != 0)
+
+
+def recommendation_levels(price, ma):
+    """
+    向量化的推荐级别，规则与数据接入进程的 calculate_recommendation_level 相同
+
+    参数:
+    price (ndarray): 当前价格
+    ma (dict): 均线周期到均线值数组的映射，周期越长级别越高
+
+    返回:
+    ndarray: 推荐级别（1-6）
+    """
+    with np.errstate(invalid='ignore'):
+        conditions = [(ma[period] > 0) & (price < ma[period]) for period in sorted(ma, reverse=True)]
+    return np.select(conditions, list(range(1, len(conditions) + 1)), len(conditions) + 1)
+
+
+def rule_signals(latest, params=None):
+    """
+    交易建议规则中各条件的布尔数组（可以是每只股票最新K线的一维数组，也可以是整段历史的二维矩阵）
+
+    参数:
+    latest (dict): 字段名到数组的映射（latest_price、params 中各周期的 sma{周期}、rsi、macd、macd_signal、macd_histogram）
+    params (dict): 规则参数，缺少的项使用 DEFAULT_RULE_PARAMS
+
+    返回:
+    dict: 条件名到数组的映射；ma_confidence 为价格低于均线规则的置信度（0表示不满足）
+    """
+    params = {**DEFAULT_RULE_PARAMS, **(params or {})}
+    periods = params['ma_periods']
+    price = latest['latest_price']
+    with np.errstate(invalid='ignore'):
+        # 价格低于均线：周期越长置信度越高，只取最先满足的一条
+        has_price = _present(price)
+        conditions = [has_price & _present(latest[f'sma{p}']) & (price < latest[f'sma{p}'])
+                      for p in reversed(periods)]
+        ma_confidence = np.select(conditions, list(reversed(params['ma_confidence'])), 0.0)
+
+        # 均线多头/空头排列（最短的三条均线）
+        short, middle, long = (latest[f'sma{p}'] for p in periods[:3])
+        aligned = _present(short) & _present(middle) & _present(long)
+        bullish = aligned & (short > middle) & (middle > long) & (price > short)
+        bearish = aligned & ~bullish & (short < middle) & (middle < long) & (price < short)
+
+        # RSI超买超卖
+        rsi_values = latest['rsi']
+        overbought = _present(rsi_values) & (rsi_values > params['rsi_overbought'])
+        oversold = _present(rsi_values) & ~overbought & (rsi_values < params['rsi_oversold'])
+
+        # MACD金叉死叉
+        macd_line, signal_line, histogram = latest['macd'], latest['macd_signal'], latest['macd_histogram']
+        has_macd = ~np.isnan(macd_line) & ~np.isnan(signal_line)
+        golden = has_macd & (macd_line > signal_line) & (histogram > 0)
+        dead = has_macd & ~golden & (macd_line < signal_line) & (histogram < 0)
+
+    return {
+        'ma_confidence': ma_confidence,
+        'bullish': bullish, 'bearish': bearish,
+        'overbought': overbought, 'oversold': oversold,
+        'golden': golden, 'dead': dead,
+    }
+
+
+def evaluate_rules(latest, signals=None, params=None):
+    """
+    向量化的交易建议规则，与 StockAIAnalyzer._generate_recommendations 的判断顺序相同
+
+    参数:
+    latest (dict): 字段名到数组的映射，见 rule_signals
+    signals (dict): 已计算的 rule_signals 结果，为None时由 latest 计算
+    params (dict): 规则参数，缺少的项使用 DEFAULT_RULE_PARAMS
+
+    返回:
+    tuple: (动作编码数组, 置信度数组, 是否高风险数组)，形状与输入数组相同
+    """
+    params = {**DEFAULT_RULE_PARAMS, **(params or {})}
+    if signals is None:
+        signals = rule_signals(latest, params)
+    shape = np.shape(latest['latest_price'])
+    action = np.full(shape, ACTION_HOLD, dtype=np.int8)
+    confidence = np.full(shape, 0.5)
+
+    below_ma = signals['ma_confidence'] > 0
+    action[below_ma] = ACTION_BUY
+    confidence[below_ma] = signals['ma_confidence'][below_ma]
+
+    bullish, bearish = signals['bullish'], signals['bearish']
+    action[bullish] = ACTION_BUY
+    action[bearish] = ACTION_SELL
+    confidence[bullish | bearish] = params['alignment_confidence']
+
+    rsi_weights = (params['rsi_confidence'], params['rsi_boost'], params['rsi_cap'])
+    _apply_signal(action, confidence, signals['overbought'], ACTION_SELL, *rsi_weights)
+    _apply_signal(action, confidence, signals['oversold'], ACTION_BUY, *rsi_weights)
+    macd_weights = (params['macd_confidence'], params['macd_boost'], params['macd_cap'])
+    _apply_signal(action, confidence, signals['golden'], ACTION_BUY, *macd_weights)
+    _apply_signal(action, confidence, signals['dead'], ACTION_SELL, *macd_weights)
+
+    return action, confidence, signals['overbought'] | signals['oversold']
+
+
+def _apply_signal(action, confidence, mask, signal, base, boost, cap):
+    # 与当前建议相同则提高置信度，否则改为该建议
+    same = mask & (action == signal)
+    confidence[same] = np.minimum(cap, confidence[same] + boost)
+    switch = mask & (action != signal)
+    action[switch] = signal
+    confidence[switch] = base
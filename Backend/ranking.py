@@ -0,0 +1,176 @@
+# Backend/ranking.py
+import json
+
+# 排名有序集合：分数为推荐级别，同分的成员按股票代码字典序排列，
+# 因此 ZRANGE 的顺序就是 (recommendation_level, code)
+RANKING_KEY = "stock:ranking"
+# 每只股票已格式化的排名快照（价格、推荐级别、均线关系等），由数据接入进程维护
+RANKING_SNAPSHOT_KEY = "stock:rank_snapshot:{code}"
+
+RECOMMENDATION_TEXTS = {
+    1: "强烈推荐",
+    2: "推荐",
+    3: "考虑买入",
+    4: "关注",
+    5: "轻度关注",
+}
+
+_MA_PERIODS = (5, 10, 20, 30, 60)
+
+
+def recommendation_text(level):
+    """根据推荐级别获取文本描述"""
+    return RECOMMENDATION_TEXTS.get(level, "不推荐")
+
+
+def snapshot_key(code):
+    return RANKING_SNAPSHOT_KEY.format(code=code)
+
+
+def build_snapshot(code, price, recommendation_level, ma_values, updated_at):
+    """
+    生成一只股票的排名快照（与 /api/ranked_stocks 返回的条目格式一致）
+
+    参数:
+    code (str): 股票代码
+    price (float): 当前价格
+    recommendation_level (int): 推荐级别
+    ma_values (dict): 均线值，键为 MA5、MA10 等
+    updated_at (str): 报价时间
+
+    返回:
+    dict: 排名条目
+    """
+    relations = []
+    closest_ma = None
+    closest_diff = float('inf')
+    for period in _MA_PERIODS:
+        ma_value = ma_values.get(f"MA{period}")
+        if not ma_value:
+            continue
+        if price < ma_value:
+            relations.append(f"低于{period}日均线")
+        # 计算与最接近的均线的差距
+        diff = abs(price - ma_value)
+        if diff < closest_diff:
+            closest_diff = diff
+            closest_ma = (period, ma_value)
+
+    closest_ma_text = ""
+    if closest_ma:
+        closest_ma_text = f"距MA{closest_ma[0]}: {(price / closest_ma[1] - 1) * 100:.2f}%"
+
+    return {
+        'code': code,
+        'price': price,
+        'recommendation_level': recommendation_level,
+        'recommendation_text': recommendation_text(recommendation_level),
+        'ma_relations': relations,
+        'closest_ma': closest_ma_text,
+        'updated_at': updated_at
+    }
+
+
+def update_ranking(writer, snapshot):
+    """
+    通过批量写入器更新排名有序集合和快照哈希（同一刷新周期内只保留最新值）
+
+    参数:
+    writer: RedisBatchWriter
+    snapshot (dict): build_snapshot 的结果
+    """
+    writer.hset(snapshot_key(snapshot['code']), {
+        'price': snapshot['price'],
+        'recommendation_level': snapshot['recommendation_level'],
+        'recommendation_text': snapshot['recommendation_text'],
+        'ma_relations': json.dumps(snapshot['ma_relations'], ensure_ascii=False),
+        'closest_ma': snapshot['closest_ma'],
+        'updated_at': snapshot['updated_at'] or ""
+    })
+    writer.zadd(RANKING_KEY, {snapshot['code']: snapshot['recommendation_level']})
+
+
+def prune_ranking(redis_client, tracked_codes):
+    """
+    移除不再跟踪的股票（在数据接入进程启动时调用）
+
+    返回:
+    int: 移除的股票数量
+    """
+    tracked = set(tracked_codes)
+    stale = [code for code in redis_client.zrange(RANKING_KEY, 0, -1) if code not in tracked]
+    if stale:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zrem(RANKING_KEY, *stale)
+        pipe.delete(*[snapshot_key(code) for code in stale])
+        pipe.execute()
+    return len(stale)
+
+
+def _parse_snapshot(code, fields):
+    return {
+        'code': code,
+        'price': float(fields['price']),
+        'recommendation_level': int(fields['recommendation_level']),
+        'recommendation_text': fields.get('recommendation_text') or recommendation_text(int(fields['recommendation_level'])),
+        'ma_relations': json.loads(fields.get('ma_relations') or "[]"),
+        'closest_ma': fields.get('closest_ma', ""),
+        'updated_at': fields.get('updated_at', "")
+    }
+
+
+def _range_args(limit, min_level, max_level):
+    if min_level is None and max_level is None:
+        return (0, -1 if limit is None else limit - 1), {}
+    return ("-inf" if min_level is None else min_level, "+inf" if max_level is None else max_level), {
+        'byscore': True,
+        'offset': None if limit is None else 0,
+        'num': limit
+    }
+
+
+def _parse_snapshots(codes, snapshots):
+    result = []
+    for code, fields in zip(codes, snapshots):
+        # 有序集合和快照在同一批次中写入，快照缺失只可能是被手动删除
+        if not fields:
+            continue
+        try:
+            result.append(_parse_snapshot(code, fields))
+        except (KeyError, ValueError) as e:
+            print(f"解析 {code} 排名快照时出错: {e}")
+    return result
+
+
+def get_ranking(redis_client, limit=None, min_level=None, max_level=None):
+    """同步版本的 read_ranking（redis.Redis 客户端）"""
+    bounds, options = _range_args(limit, min_level, max_level)
+    codes = redis_client.zrange(RANKING_KEY, *bounds, **options)
+    if not codes:
+        return []
+    pipe = redis_client.pipeline(transaction=False)
+    for code in codes:
+        pipe.hgetall(snapshot_key(code))
+    return _parse_snapshots(codes, pipe.execute())
+
+
+async def read_ranking(redis_client, limit=None, min_level=None, max_level=None):
+    """
+    读取排名：一次 ZRANGE 加一次流水线读取快照
+
+    参数:
+    redis_client: redis.asyncio 客户端
+    limit (int): 最多返回的股票数量，为None时返回全部
+    min_level, max_level (int): 推荐级别范围（包含），为None时不限制
+
+    返回:
+    list: 按 (recommendation_level, code) 排序的排名条目
+    """
+    bounds, options = _range_args(limit, min_level, max_level)
+    codes = await redis_client.zrange(RANKING_KEY, *bounds, **options)
+    if not codes:
+        return []
+    pipe = redis_client.pipeline(transaction=False)
+    for code in codes:
+        pipe.hgetall(snapshot_key(code))
+    return _parse_snapshots(codes, await pipe.execute())
@@ -0,0 +1,169 @@
+# Backend/rate_limiter.py
+import hashlib
+import time
+from collections import namedtuple
+
+RATE_LIMIT_KEY_PREFIX = "ratelimit"
+
+# GCRA（通用信元速率算法）：每个键只保存一个“理论到达时间”(TAT)，
+# 检查、扣减和过期设置在一次脚本调用中原子完成，时间取Redis服务器时钟，各API进程一致。
+# ARGV: 每个请求的间隔(毫秒), 允许的突发容量(毫秒), 本次消耗的令牌数
+# 返回: {是否允许, 需等待的毫秒数, 剩余令牌数}
+_GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + emission * cost
+local allow_at = new_tat - tolerance
+if allow_at > now then
+    return {0, math.ceil(allow_at - now), math.floor((tolerance - (tat - now)) / emission)}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now) + 1)
+return {1, 0, math.floor((tolerance - (new_tat - now)) / emission)}
+"""
+
+
+class RateLimitPolicy(namedtuple('RateLimitPolicy', ['name', 'limit', 'period', 'local_batch'])):
+    """速率限制策略：period 秒内最多 limit 个请求"""
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, name, config):
+        limit = max(1, int(config.get('limit', 10)))
+        return cls(name, limit, float(config.get('period', 60)),
+                   max(1, min(int(config.get('local_batch', 1)), limit)))
+
+    @property
+    def emission_ms(self):
+        return self.period * 1000.0 / self.limit
+
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'retry_after'])
+
+
+class _LocalState:
+    __slots__ = ('blocked_until', 'tokens', 'lease_expires', 'shared_remaining')
+
+    def __init__(self):
+        self.blocked_until = 0.0
+        self.tokens = 0
+        self.lease_expires = 0.0
+        # 最近一次访问Redis时其他进程仍可使用的配额
+        self.shared_remaining = 0
+
+
+class RateLimiter:
+    """
+    基于Redis Lua脚本的速率限制器（GCRA），每次检查只有一次Redis往返
+
+    进程内快速路径:
+    - Redis拒绝后，在需要等待的时间内直接在本地拒绝，不再访问Redis
+    - 策略的 local_batch 大于1时，一次从Redis预取多个令牌，在本地依次消耗；
+      预取的令牌已在Redis中扣减，因此多进程部署时总量仍然受限
+    """
+
+    def __init__(self, redis_client, local_fast_path=True, max_local_keys=100000):
+        """
+        参数:
+        redis_client: redis.asyncio 客户端
+        local_fast_path (bool): 是否启用进程内快速路径
+        max_local_keys (int): 本地状态最多保留的键数量
+        """
+        self.redis = redis_client
+        self.local_fast_path = local_fast_path
+        self.max_local_keys = max_local_keys
+        self._script = redis_client.register_script(_GCRA_SCRIPT)
+        self._local = {}
+        self._stats = {'checks': 0, 'redis_calls': 0, 'local_allowed': 0, 'local_denied': 0,
+                       'denied': 0, 'errors': 0}
+
+    async def hit(self, policy, identity):
+        """
+        检查并消耗一次请求配额
+
+        参数:
+        policy (RateLimitPolicy): 适用的策略
+        identity (str): 计数主体，例如客户端IP或API密钥摘要
+
+        返回:
+        RateLimitResult: 是否允许、剩余请求数和需等待的秒数
+        """
+        self._stats['checks'] += 1
+        key = f"{RATE_LIMIT_KEY_PREFIX}:{policy.name}:{identity}"
+        now = time.monotonic()
+
+        state = None
+        if self.local_fast_path:
+            state = self._local.get(key)
+            if state is not None:
+                if state.blocked_until > now:
+                    self._stats['local_denied'] += 1
+                    self._stats['denied'] += 1
+                    return RateLimitResult(False, policy.limit, 0, state.blocked_until - now)
+                if state.tokens > 0 and state.lease_expires > now:
+                    state.tokens -= 1
+                    self._stats['local_allowed'] += 1
+                    return RateLimitResult(True, policy.limit, state.shared_remaining + state.tokens, 0.0)
+
+        cost = policy.local_batch if self.local_fast_path else 1
+        try:
+            allowed, retry_ms, remaining = await self._call(key, policy, cost)
+            if not allowed and cost > 1:
+                # 剩余配额不足一个批次时退回到逐个请求
+                cost = 1
+                allowed, retry_ms, remaining = await self._call(key, policy, cost)
+        except Exception as e:
+            # Redis不可用时放行，速率限制不能影响接口可用性
+            self._stats['errors'] += 1
+            print(f"速率限制检查出错: {e}")
+            return RateLimitResult(True, policy.limit, policy.limit, 0.0)
+
+        if self.local_fast_path:
+            if state is None:
+                state = self._local_state(key)
+            if allowed:
+                state.tokens = cost - 1
+                state.shared_remaining = max(0, remaining)
+                # 预取的令牌只在对应的时间段内有效，未用完的令牌随之作废
+                state.lease_expires = now + policy.emission_ms * cost / 1000.0
+            else:
+                state.tokens = 0
+                state.blocked_until = now + retry_ms / 1000.0
+
+        if not allowed:
+            self._stats['denied'] += 1
+            return RateLimitResult(False, policy.limit, 0, retry_ms / 1000.0)
+        return RateLimitResult(True, policy.limit, max(0, int(remaining)) + (cost - 1), 0.0)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['local_keys'] = len(self._local)
+        return stats
+
+    async def _call(self, key, policy, cost):
+        self._stats['redis_calls'] += 1
+        emission = policy.emission_ms
+        result = await self._script(keys=[key], args=[emission, emission * policy.limit, cost])
+        return int(result[0]), int(result[1]), int(result[2])
+
+    def _local_state(self, key):
+        if len(self._local) >= self.max_local_keys:
+            # 清理已过期的本地状态
+            now = time.monotonic()
+            self._local = {k: s for k, s in self._local.items()
+                           if s.blocked_until > now or s.lease_expires > now}
+            if len(self._local) >= self.max_local_keys:
+                self._local.clear()
+        state = self._local[key] = _LocalState()
+        return state
+
+
+def identity_for_api_key(api_key):
+    """API密钥只以摘要形式出现在Redis键中"""
+    return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
@@ -0,0 +1,206 @@
+# Backend/realtime_hub.py
+import asyncio
+import json
+
+
+class Subscriber:
+    """
+    一个实时推送客户端的订阅状态
+
+    收到的变化按股票合并到 pending 中，发送端每个节流周期最多取走一次，
+    客户端处理慢时只会拿到合并后的最新值，不会积压消息。
+    """
+
+    def __init__(self, hub, max_codes):
+        self.hub = hub
+        self.max_codes = max_codes
+        self.codes = set()
+        self.pending = {}
+        self.event = asyncio.Event()
+
+    def deliver(self, code, delta):
+        fields = self.pending.get(code)
+        if fields is None:
+            self.pending[code] = dict(delta)
+        else:
+            fields.update(delta)
+        self.event.set()
+
+    def take(self):
+        pending, self.pending = self.pending, {}
+        self.event.clear()
+        return pending
+
+
+class RealtimeHub:
+    """
+    实时推送中心（API进程内）
+
+    每个API进程只订阅一个Redis频道，数据接入进程在每个刷新批次中
+    发布所有股票的变化，由本进程按订阅关系分发给WebSocket/SSE客户端。
+
+    消息格式: {"t": 发布时间戳, "d": {股票代码: {"p": 价格, "ts": 报价时间, "l": 推荐级别, "ma": {...}}}}
+    """
+
+    def __init__(self, redis_client, channel, throttle_interval=0.5, max_codes_per_client=500):
+        """
+        参数:
+        redis_client: redis.asyncio 客户端
+        channel (str): 发布频道
+        throttle_interval (float): 每个客户端两次推送之间的最短间隔（秒）
+        max_codes_per_client (int): 单个客户端最多订阅的股票数量
+        """
+        self.redis = redis_client
+        self.channel = channel
+        self.throttle_interval = throttle_interval
+        self.max_codes_per_client = max_codes_per_client
+        self._by_code = {}
+        self._subscribers = set()
+        self._task = None
+        self._stats = {'messages': 0, 'deltas': 0, 'deliveries': 0, 'errors': 0}
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def subscribe(self, codes=()):
+        """创建订阅者并订阅指定股票"""
+        subscriber = Subscriber(self, self.max_codes_per_client)
+        self._subscribers.add(subscriber)
+        self.update_codes(subscriber, add=codes)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.update_codes(subscriber, remove=list(subscriber.codes))
+        self._subscribers.discard(subscriber)
+
+    def update_codes(self, subscriber, add=(), remove=()):
+        """
+        调整订阅的股票
+
+        返回:
+        list: 新增订阅的股票代码
+        """
+        for code in remove:
+            if code in subscriber.codes:
+                subscriber.codes.discard(code)
+                subscriber.pending.pop(code, None)
+                listeners = self._by_code.get(code)
+                if listeners is not None:
+                    listeners.discard(subscriber)
+                    if not listeners:
+                        del self._by_code[code]
+        added = []
+        for code in add:
+            if code in subscriber.codes or len(subscriber.codes) >= subscriber.max_codes:
+                continue
+            subscriber.codes.add(code)
+            self._by_code.setdefault(code, set()).add(subscriber)
+            added.append(code)
+        return added
+
+    async def snapshot(self, codes):
+        """
+        读取股票的当前实时状态，作为客户端订阅后的第一条消息
+
+        返回:
+        dict: 股票代码到与推送消息相同格式字段的映射
+        """
+        codes = list(codes)
+        if not codes:
+            return {}
+        pipe = self.redis.pipeline(transaction=False)
+        for code in codes:
+            pipe.hgetall(f"stock:realtime:{code}")
+            pipe.hgetall(f"stock:ma:{code}")
+        results = await pipe.execute()
+
+        snapshot = {}
+        for i, code in enumerate(codes):
+            realtime, ma = results[2 * i], results[2 * i + 1]
+            entry = {}
+            if realtime.get('price'):
+                entry['p'] = float(realtime['price'])
+                entry['ts'] = realtime.get('time')
+            if realtime.get('recommendation_level'):
+                entry['l'] = int(realtime['recommendation_level'])
+            if ma:
+                entry['ma'] = {k: (None if v == 'null' else float(v)) for k, v in ma.items() if k.startswith('MA')}
+            if entry:
+                snapshot[code] = entry
+        return snapshot
+
+    async def updates(self, subscriber, heartbeat=None):
+        """
+        异步迭代订阅者的合并更新，每个节流周期最多产生一次
+
+        参数:
+        subscriber (Subscriber): 订阅者
+        heartbeat (float): 超过该时间没有更新时产生一次 None，用于发送心跳；为None时不产生
+
+        返回:
+        异步生成器，产生 {股票代码: 变化字段} 字典或 None
+        """
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.event.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            batch = subscriber.take()
+            if batch:
+                yield batch
+            await asyncio.sleep(self.throttle_interval)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['subscribers'] = len(self._subscribers)
+        stats['codes'] = len(self._by_code)
+        return stats
+
+    def _dispatch(self, deltas):
+        for code, delta in deltas.items():
+            listeners = self._by_code.get(code)
+            if not listeners:
+                continue
+            for subscriber in listeners:
+                subscriber.deliver(code, delta)
+            self._stats['deliveries'] += len(listeners)
+        self._stats['deltas'] += len(deltas)
+
+    async def _listen(self):
+        # 断线后自动重新订阅
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                print(f"实时推送: 已订阅频道 {self.channel}")
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    self._stats['messages'] += 1
+                    try:
+                        self._dispatch(json.loads(message['data']).get('d', {}))
+                    except (ValueError, AttributeError) as e:
+                        self._stats['errors'] += 1
+                        print(f"实时推送: 无法解析消息: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"实时推送: 订阅出错，稍后重试: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
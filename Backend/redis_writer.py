@@ -0,0 +1,245 @@
+# Backend/redis_writer.py
+import json
+import threading
+import time
+import traceback
+
+
+class RedisBatchWriter:
+    """
+    合并写入的Redis批量写入器
+
+    在一个刷新周期内缓冲所有写操作：同一个哈希键的同一字段只保留最新值，
+    同一个列表键的追加合并为一次 RPUSH + LTRIM，
+    同一个有序集合成员只保留最新分数，
+    同一股票的实时变化合并后在每个批次中作为一条消息发布，
+    然后通过一次 pipeline（可选 MULTI/EXEC 事务）发送到Redis。
+    """
+
+    def __init__(self, client, flush_interval=0.05, max_batch=1000, transaction=False, channel=None):
+        """
+        参数:
+        client: redis.Redis 客户端
+        flush_interval (float): 刷新周期（秒）
+        max_batch (int): 缓冲的写操作数达到该值时立即刷新
+        transaction (bool): 是否使用 MULTI/EXEC 包裹每个批次
+        channel (str): 发布实时变化的频道，为None时不发布
+        """
+        self.client = client
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, int(max_batch))
+        self.transaction = transaction
+        self.channel = channel
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = threading.Event()
+        self._thread = None
+        self._reset_buffers()
+
+        self._stats = {
+            'buffered': 0,
+            'coalesced': 0,
+            'flushes': 0,
+            'commands': 0,
+            'published': 0,
+            'errors': 0,
+            'requeued': 0,
+        }
+
+    def _reset_buffers(self):
+        self._hashes = {}
+        self._lists = {}
+        self._zsets = {}
+        self._deltas = {}
+        self._pending = 0
+
+    def start(self):
+        """启动后台刷新线程"""
+        if self._running.is_set():
+            return
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name="redis-batch-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程并刷新剩余数据"""
+        self._running.clear()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.flush()
+
+    def hset(self, key, mapping):
+        """
+        缓冲哈希字段写入，同一周期内同一字段只保留最新值
+
+        参数:
+        key (str): 哈希键
+        mapping (dict): 字段到值的映射
+        """
+        if not mapping:
+            return
+        with self._lock:
+            fields = self._hashes.get(key)
+            if fields is None:
+                fields = self._hashes[key] = {}
+            for field, value in mapping.items():
+                if field in fields:
+                    self._stats['coalesced'] += 1
+                else:
+                    self._pending += 1
+                fields[field] = value
+            self._stats['buffered'] += len(mapping)
+            full = self._pending >= self.max_batch
+        if full:
+            self._wakeup.set()
+
+    def rpush_capped(self, key, value, max_len):
+        """
+        缓冲列表追加，刷新时合并为一次 RPUSH 和一次 LTRIM
+
+        参数:
+        key (str): 列表键
+        value (str): 追加的值
+        max_len (int): 列表保留的最大长度
+        """
+        with self._lock:
+            entry = self._lists.get(key)
+            if entry is None:
+                entry = self._lists[key] = [[], max_len]
+            entry[0].append(value)
+            entry[1] = max_len
+            self._pending += 1
+            self._stats['buffered'] += 1
+            full = self._pending >= self.max_batch
+        if full:
+            self._wakeup.set()
+
+    def zadd(self, key, mapping):
+        """
+        缓冲有序集合成员的分数更新，同一周期内同一成员只保留最新分数
+
+        参数:
+        key (str): 有序集合键
+        mapping (dict): 成员到分数的映射
+        """
+        if not mapping:
+            return
+        with self._lock:
+            members = self._zsets.get(key)
+            if members is None:
+                members = self._zsets[key] = {}
+            for member, score in mapping.items():
+                if member in members:
+                    self._stats['coalesced'] += 1
+                else:
+                    self._pending += 1
+                members[member] = score
+            self._stats['buffered'] += len(mapping)
+            full = self._pending >= self.max_batch
+        if full:
+            self._wakeup.set()
+
+    def publish_delta(self, code, delta):
+        """
+        缓冲一只股票的实时变化（价格、均线、推荐级别），刷新时所有股票合并为一条发布消息
+
+        参数:
+        code (str): 股票代码
+        delta (dict): 变化的字段
+        """
+        if not self.channel or not delta:
+            return
+        with self._lock:
+            fields = self._deltas.get(code)
+            if fields is None:
+                self._deltas[code] = dict(delta)
+            else:
+                fields.update(delta)
+
+    def flush(self):
+        """
+        将缓冲的写操作作为一个批次发送到Redis
+
+        返回:
+        int: 本次发送的命令数量
+        """
+        with self._lock:
+            hashes, lists, zsets, deltas = self._hashes, self._lists, self._zsets, self._deltas
+            self._reset_buffers()
+
+        if not hashes and not lists and not zsets and not deltas:
+            return 0
+
+        commands = 0
+        try:
+            pipe = self.client.pipeline(transaction=self.transaction)
+            for key, fields in hashes.items():
+                pipe.hset(key, mapping=fields)
+                commands += 1
+            for key, (values, max_len) in lists.items():
+                # 只需要保留最后 max_len 个值
+                pipe.rpush(key, *values[-max_len:])
+                pipe.ltrim(key, -max_len, -1)
+                commands += 2
+            for key, members in zsets.items():
+                pipe.zadd(key, members)
+                commands += 1
+            if deltas:
+                # 数据写入之后再发布，订阅方收到消息时Redis中已是最新值
+                pipe.publish(self.channel, json.dumps({'t': time.time(), 'd': deltas}, separators=(',', ':')))
+                commands += 1
+            pipe.execute()
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['commands'] += commands
+                self._stats['published'] += len(deltas)
+        except Exception as e:
+            # 未发送的批次合并回缓冲区，下一个刷新周期重试
+            self._requeue(hashes, lists, zsets, deltas)
+            with self._lock:
+                self._stats['errors'] += 1
+                self._stats['requeued'] += commands
+            print(f"批量写入Redis时出错，{commands} 条命令将在下次刷新时重试: {e}")
+            traceback.print_exc()
+            return 0
+        return commands
+
+    def _requeue(self, hashes, lists, zsets, deltas):
+        # 发送失败期间缓冲的写操作更新，合并时保留较新的值
+        with self._lock:
+            for key, fields in hashes.items():
+                self._hashes[key] = {**fields, **self._hashes.get(key, {})}
+            for key, (values, max_len) in lists.items():
+                entry = self._lists.get(key)
+                if entry is None:
+                    self._lists[key] = [values[-max_len:], max_len]
+                else:
+                    entry[0] = (values + entry[0])[-entry[1]:]
+            for key, members in zsets.items():
+                self._zsets[key] = {**members, **self._zsets.get(key, {})}
+            for code, delta in deltas.items():
+                self._deltas[code] = {**delta, **self._deltas.get(code, {})}
+            self._pending = (sum(len(fields) for fields in self._hashes.values())
+                             + sum(len(values) for values, _ in self._lists.values())
+                             + sum(len(members) for members in self._zsets.values()))
+
+    def stats(self):
+        """
+        获取写入统计
+
+        返回:
+        dict: 缓冲/合并的写操作数、刷新次数、实际发送的命令数，以及发送失败后重新排队的命令数
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = self._pending
+        return stats
+
+    def _run(self):
+        while self._running.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
@@ -0,0 +1,194 @@
+# Backend/response_cache.py
+import json
+import time
+from datetime import date
+
+# 每只股票每张K线表的数据版本，写入新数据时递增
+DATA_VERSION_KEY = "stock:data_version:{table}:{code}"
+CACHE_KEY_PREFIX = "cache:resp"
+# 记录缓存条目最近访问时间的有序集合，用于LRU淘汰
+CACHE_LRU_KEY = f"{CACHE_KEY_PREFIX}:lru"
+# 跨进程汇总的命中统计
+CACHE_STATS_KEY = f"{CACHE_KEY_PREFIX}:stats"
+
+
+def json_default(value):
+    # 分析结果中可能混入numpy标量
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def data_version_key(table, code):
+    return DATA_VERSION_KEY.format(table=table, code=code)
+
+
+def bump_data_versions(redis_client, table, codes):
+    """
+    递增股票的数据版本，使依赖这些数据的API缓存失效（由数据接入进程调用）
+
+    参数:
+    redis_client: 同步Redis客户端
+    table (str): 发生变化的K线表
+    codes (list): 数据发生变化的股票代码
+    """
+    if not redis_client or not codes:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for code in codes:
+            pipe.incr(data_version_key(table, code))
+        pipe.execute()
+    except Exception as e:
+        print(f"更新数据版本时出错: {e}")
+
+
+class ResponseCache:
+    """
+    API响应缓存（Redis，异步客户端）
+
+    缓存键包含 (接口, 股票代码, 参数, 数据版本)，股票写入新K线后版本递增，
+    旧版本的条目不再被读取，随后按LRU或兜底过期时间清除。
+    """
+
+    def __init__(self, redis_client, max_entries=5000, max_entry_bytes=2 * 1024 * 1024, ttl=86400):
+        """
+        参数:
+        redis_client: redis.asyncio 客户端
+        max_entries (int): 缓存条目上限
+        max_entry_bytes (int): 单个条目的最大字节数
+        ttl (int): 兜底过期时间（秒）
+        """
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'oversize': 0, 'errors': 0}
+
+    def _entry_key(self, endpoint, code, params, version):
+        # 查询窗口相对于当天计算，日期变化后即使没有新数据也使用新的键
+        parts = [f"{k}={params[k]}" for k in sorted(params)]
+        return f"{CACHE_KEY_PREFIX}:{endpoint}:{code}:{':'.join(parts)}:{date.today().isoformat()}:v{version}"
+
+    async def get_version(self, code, table='stock_price'):
+        return await self.redis.get(data_version_key(table, code)) or "0"
+
+    async def get(self, endpoint, code, params, table='stock_price'):
+        """
+        读取缓存
+
+        返回:
+        tuple: (缓存的值或None, 当前数据版本)
+        """
+        version = await self.get_version(code, table)
+        key = self._entry_key(endpoint, code, params, version)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.zadd(CACHE_LRU_KEY, {key: time.time()}, xx=True)
+        # 查询次数随读取一起提交，命中时只有这一次往返；未命中次数在未命中时单独记录
+        pipe.hincrby(CACHE_STATS_KEY, f"{endpoint}:lookups", 1)
+        payload, _, _ = await pipe.execute()
+
+        hit = payload is not None
+        self._stats['hits' if hit else 'misses'] += 1
+        if not hit:
+            await self.redis.hincrby(CACHE_STATS_KEY, f"{endpoint}:misses", 1)
+        return (json.loads(payload) if hit else None), version
+
+    async def set(self, endpoint, code, params, version, value, ttl=None):
+        """
+        写入缓存，并在条目超出上限时淘汰最久未访问的条目
+
+        参数:
+        ttl (int): 本条目的过期时间（秒），None表示使用默认的兜底过期时间
+        """
+        payload = json.dumps(value, ensure_ascii=False, default=json_default)
+        if len(payload) > self.max_entry_bytes:
+            self._stats['oversize'] += 1
+            return
+
+        key = self._entry_key(endpoint, code, params, version)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(key, payload, ex=min(ttl, self.ttl) if ttl else self.ttl)
+        pipe.zadd(CACHE_LRU_KEY, {key: time.time()})
+        pipe.zcard(CACHE_LRU_KEY)
+        _, _, count = await pipe.execute()
+        self._stats['sets'] += 1
+
+        overflow = count - self.max_entries
+        if overflow > 0:
+            evicted = await self.redis.zpopmin(CACHE_LRU_KEY, overflow)
+            if evicted:
+                await self.redis.delete(*[member for member, _ in evicted])
+                self._stats['evictions'] += len(evicted)
+
+    async def get_or_compute(self, endpoint, code, params, compute, table='stock_price', singleflight=None,
+                             ttl=None):
+        """
+        读取缓存，未命中时调用 compute() 生成结果并写入缓存
+
+        参数:
+        endpoint (str): 接口名称
+        code (str): 股票代码
+        params (dict): 影响结果的其他参数
+        compute: 无参数的协程函数，返回可JSON序列化的结果；返回None表示不缓存
+        table (str): 结果依赖的K线表
+        singleflight (SingleFlight): 未命中时用于合并相同请求，只有一个请求执行计算和写缓存
+        ttl (int): 条目过期时间（秒），结果不随数据版本变化的部分（如连续聚合的物化）需要按时间过期
+
+        返回:
+        tuple: (结果, 是否命中缓存)
+        """
+        try:
+            value, version = await self.get(endpoint, code, params, table)
+        except Exception as e:
+            # Redis不可用时直接计算，不影响接口可用性
+            self._stats['errors'] += 1
+            print(f"读取响应缓存时出错: {e}")
+            return await compute(), False
+        if value is not None:
+            return value, True
+
+        async def compute_and_store():
+            value = await compute()
+            if value is not None:
+                try:
+                    await self.set(endpoint, code, params, version, value, ttl)
+                except Exception as e:
+                    self._stats['errors'] += 1
+                    print(f"写入响应缓存时出错: {e}")
+            return value
+
+        if singleflight is None:
+            return await compute_and_store(), False
+        # 合并键包含数据版本，数据更新后的请求不会拿到旧版本的计算结果
+        key = self._entry_key(endpoint, code, params, version)[len(CACHE_KEY_PREFIX) + 1:]
+        return await singleflight.do(key, compute_and_store), False
+
+    async def stats(self):
+        """
+        获取缓存统计
+
+        返回:
+        dict: 本进程的命中统计，以及所有API进程汇总的按接口命中率
+        """
+        local = dict(self._stats)
+        lookups = local['hits'] + local['misses']
+        local['hit_ratio'] = local['hits'] / lookups if lookups else 0.0
+
+        endpoints = {}
+        shared = await self.redis.hgetall(CACHE_STATS_KEY)
+        for field, value in shared.items():
+            endpoint, kind = field.rsplit(":", 1)
+            endpoints.setdefault(endpoint, {'lookups': 0, 'misses': 0})[kind] = int(value)
+        for entry in endpoints.values():
+            total = entry.pop('lookups', 0)
+            entry['hits'] = max(total - entry['misses'], 0)
+            entry['hit_ratio'] = entry['hits'] / total if total else 0.0
+
+        return {
+            'local': local,
+            'endpoints': endpoints,
+            'entries': await self.redis.zcard(CACHE_LRU_KEY),
+            'max_entries': self.max_entries,
+        }
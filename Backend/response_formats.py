@@ -0,0 +1,141 @@
+# Backend/response_formats.py
+import io
+import json
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+
+# MessagePack 和 Arrow 已列入 requirements.txt，精简安装缺少时对应格式返回 406
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+FORMAT_ROWS = "rows"        # 默认：每行一个对象的JSON
+FORMAT_COLUMNS = "columns"  # 每个字段一个数组的JSON
+FORMAT_MSGPACK = "msgpack"
+FORMAT_ARROW = "arrow"
+FORMAT_NDJSON = "ndjson"    # 流式：每行一个JSON对象
+FORMAT_CSV = "csv"          # 流式：CSV
+FORMATS = (FORMAT_ROWS, FORMAT_COLUMNS, FORMAT_MSGPACK, FORMAT_ARROW, FORMAT_NDJSON, FORMAT_CSV)
+STREAM_FORMATS = (FORMAT_NDJSON, FORMAT_CSV)
+
+MEDIA_TYPES = {
+    FORMAT_COLUMNS: "application/vnd.stock.columns+json",
+    FORMAT_MSGPACK: "application/msgpack",
+    FORMAT_ARROW: "application/vnd.apache.arrow.stream",
+    FORMAT_NDJSON: "application/x-ndjson",
+    FORMAT_CSV: "text/csv",
+}
+
+# Accept 头中可以识别的媒体类型
+_ACCEPT_FORMATS = (
+    (FORMAT_ARROW, ("application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.file")),
+    (FORMAT_MSGPACK, ("application/msgpack", "application/x-msgpack")),
+    (FORMAT_COLUMNS, ("application/vnd.stock.columns+json",)),
+    (FORMAT_NDJSON, ("application/x-ndjson", "application/jsonl")),
+    (FORMAT_CSV, ("text/csv",)),
+)
+
+# 列式格式中的价格字段（股票代码作为顶层字段只出现一次）
+PRICE_COLUMN_FIELDS = ['time', 'open', 'close', 'high', 'low', 'volume', 'turnover']
+
+# 直接在数据库中把 NUMERIC 转为浮点数，避免在Python中逐个转换
+PRICE_COLUMNS_SELECT = """
+    SELECT time,
+           CAST(open AS DOUBLE PRECISION) AS open,
+           CAST(close AS DOUBLE PRECISION) AS close,
+           CAST(high AS DOUBLE PRECISION) AS high,
+           CAST(low AS DOUBLE PRECISION) AS low,
+           volume,
+           CAST(turnover AS DOUBLE PRECISION) AS turnover
+"""
+
+
+def negotiate_format(request, requested=None, allowed=FORMATS):
+    """
+    确定响应格式：优先使用 format 查询参数，其次是 Accept 头，默认逐行JSON
+
+    参数:
+    request: FastAPI 请求
+    requested (str): format 查询参数
+    allowed (tuple): 该接口支持的格式
+
+    返回:
+    str: FORMATS 之一
+    """
+    if requested:
+        if requested not in allowed:
+            raise HTTPException(status_code=400, detail=f"不支持的响应格式: {requested}，可选 {', '.join(allowed)}")
+        fmt = requested
+    else:
+        accept = request.headers.get("accept", "")
+        fmt = next((f for f, types in _ACCEPT_FORMATS
+                    if f in allowed and any(t in accept for t in types)), FORMAT_ROWS)
+
+    if fmt == FORMAT_MSGPACK and msgpack is None:
+        raise HTTPException(status_code=406, detail="服务器未安装 msgpack，无法返回 MessagePack 格式")
+    if fmt == FORMAT_ARROW and pa is None:
+        raise HTTPException(status_code=406, detail="服务器未安装 pyarrow，无法返回 Arrow 格式")
+    return fmt
+
+
+def rows_to_columns(rows):
+    """
+    将 PRICE_COLUMNS_SELECT 查询结果按列转置（不构建逐行字典）
+
+    返回:
+    dict: 字段名到值列表的映射，时间为ISO格式字符串
+    """
+    if rows:
+        columns = {name: list(values) for name, values in zip(PRICE_COLUMN_FIELDS, zip(*rows))}
+    else:
+        columns = {name: [] for name in PRICE_COLUMN_FIELDS}
+    columns['time'] = [t.isoformat() for t in columns['time']]
+    return columns
+
+
+def columns_to_rows(code, columns):
+    """将列式数据转换回逐行格式（用于已降采样、行数有限的数据）"""
+    return [dict(zip(PRICE_COLUMN_FIELDS, values), code=code)
+            for values in zip(*(columns[name] for name in PRICE_COLUMN_FIELDS))]
+
+
+def _arrow_table(columns, metadata):
+    table = pa.table({
+        'time': pa.array(columns['time'], type=pa.string()).cast(pa.timestamp('ms')),
+        'open': pa.array(columns['open'], type=pa.float64()),
+        'close': pa.array(columns['close'], type=pa.float64()),
+        'high': pa.array(columns['high'], type=pa.float64()),
+        'low': pa.array(columns['low'], type=pa.float64()),
+        'volume': pa.array(columns['volume'], type=pa.int64()),
+        'turnover': pa.array(columns['turnover'], type=pa.float64()),
+    })
+    return table.replace_schema_metadata({k: json.dumps(v, ensure_ascii=False) for k, v in metadata.items()})
+
+
+def encode_columns(payload, fmt):
+    """
+    将列式响应编码为指定格式
+
+    参数:
+    payload (dict): 包含 'columns'（rows_to_columns 的结果）以及其他顶层字段的响应
+    fmt (str): FORMAT_COLUMNS / FORMAT_MSGPACK / FORMAT_ARROW
+
+    返回:
+    Response: 对应媒体类型的响应；Arrow 格式中其他顶层字段放在 schema 元数据里（JSON字符串）
+    """
+    if fmt == FORMAT_MSGPACK:
+        return Response(content=msgpack.packb(payload, use_bin_type=True), media_type=MEDIA_TYPES[fmt])
+    if fmt == FORMAT_ARROW:
+        metadata = {k: v for k, v in payload.items() if k != 'columns'}
+        table = _arrow_table(payload['columns'], metadata)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(content=sink.getvalue(), media_type=MEDIA_TYPES[fmt])
+    return JSONResponse(content=payload, media_type=MEDIA_TYPES[FORMAT_COLUMNS])
@@ -0,0 +1,165 @@
+# Backend/singleflight.py
+import asyncio
+import json
+import uuid
+from response_cache import json_default
+
+SINGLEFLIGHT_KEY_PREFIX = "singleflight"
+
+# 只有锁的持有者才能释放锁
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlightError(Exception):
+    """其他进程执行共享计算时出错"""
+
+
+class SingleFlightTimeout(Exception):
+    """等待共享计算结果超时"""
+
+
+class SingleFlight:
+    """
+    相同请求合并（singleflight）
+
+    同一个键同时只执行一次计算，并发的相同请求等待并共享这次计算的结果或异常。
+    提供Redis客户端时还会通过Redis锁在多个API进程之间合并：
+    拿到锁的进程负责计算并把结果短暂写入Redis，其他进程轮询读取。
+    """
+
+    def __init__(self, redis_client=None, timeout=30.0, lock_ttl=30.0, poll_interval=0.05, result_ttl=10.0):
+        """
+        参数:
+        redis_client: redis.asyncio 客户端，为None时只在进程内合并
+        timeout (float): 等待共享结果的最长时间（秒）
+        lock_ttl (float): Redis锁的过期时间（秒）
+        poll_interval (float): 等待其他进程结果时的轮询间隔（秒）
+        result_ttl (float): 共享结果在Redis中保留的时间（秒）
+        """
+        self.redis = redis_client
+        self.timeout = timeout
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self._inflight = {}
+        self._release_lock = redis_client.register_script(_RELEASE_LOCK_SCRIPT) if redis_client else None
+        self._stats = {'calls': 0, 'executions': 0, 'shared': 0, 'remote_shared': 0, 'timeouts': 0, 'errors': 0}
+
+    async def do(self, key, fn, timeout=None):
+        """
+        执行或加入针对 key 的计算
+
+        参数:
+        key (str): 请求键，相同键的并发请求共享结果
+        fn: 无参数的协程函数
+        timeout (float): 本次调用的等待超时，默认使用构造参数
+
+        返回:
+        fn() 的结果；计算抛出的异常会传递给所有等待者，超时抛出 SingleFlightTimeout
+        """
+        self._stats['calls'] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._execute(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+        else:
+            self._stats['shared'] += 1
+
+        try:
+            # shield: 某个等待者超时或被取消不会中断其他等待者共享的计算
+            return await asyncio.wait_for(asyncio.shield(task), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self._stats['timeouts'] += 1
+            raise SingleFlightTimeout(f"等待 {key} 的计算结果超时")
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['inflight'] = len(self._inflight)
+        return stats
+
+    def _on_done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 取出异常，避免所有等待者都已超时时产生未处理异常的警告
+        if not task.cancelled() and task.exception() is not None:
+            self._stats['errors'] += 1
+
+    async def _execute(self, key, fn):
+        if self.redis is None:
+            self._stats['executions'] += 1
+            return await fn()
+
+        lock_key = f"{SINGLEFLIGHT_KEY_PREFIX}:lock:{key}"
+        result_key = f"{SINGLEFLIGHT_KEY_PREFIX}:result:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception as e:
+            # Redis不可用时退化为进程内合并
+            print(f"获取合并请求锁时出错: {e}")
+            self._stats['executions'] += 1
+            return await fn()
+
+        if acquired:
+            return await self._execute_as_leader(fn, lock_key, result_key, token)
+
+        value, found = await self._wait_for_remote(lock_key, result_key)
+        if found:
+            self._stats['remote_shared'] += 1
+            return value
+        # 持有锁的进程没有留下结果（例如进程退出），由本进程自己计算
+        self._stats['executions'] += 1
+        return await fn()
+
+    async def _execute_as_leader(self, fn, lock_key, result_key, token):
+        self._stats['executions'] += 1
+        result_ttl_ms = int(self.result_ttl * 1000)
+        payload = None
+        try:
+            value = await fn()
+            payload = {'value': value}
+        except Exception as e:
+            payload = {'error': str(e)}
+            raise
+        finally:
+            try:
+                if payload is not None:
+                    await self.redis.set(result_key, json.dumps(payload, ensure_ascii=False, default=json_default),
+                                         px=result_ttl_ms)
+                await self._release_lock(keys=[lock_key], args=[token])
+            except Exception as e:
+                print(f"发布合并请求结果时出错: {e}")
+        return value
+
+    async def _wait_for_remote(self, lock_key, result_key):
+        """
+        等待持有锁的其他进程发布结果
+
+        返回:
+        tuple: (结果, 是否拿到结果)；其他进程计算失败时抛出 SingleFlightError
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl
+        while loop.time() < deadline:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(result_key)
+            pipe.exists(lock_key)
+            payload, locked = await pipe.execute()
+            if payload is None and not locked:
+                # 锁可能恰好在两次读取之间释放，再确认一次结果
+                payload = await self.redis.get(result_key)
+            if payload is not None:
+                payload = json.loads(payload)
+                if 'error' in payload:
+                    raise SingleFlightError(payload['error'])
+                return payload['value'], True
+            if not locked:
+                return None, False
+            await asyncio.sleep(self.poll_interval)
+        return None, False
@@ -1,4 +1,3 @@
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
@@ -7,7 +6,10 @@ import traceback
 # 在 stock_data_fetcher.py 文件顶部的导入部分，添加:
 from config import DB_CONFIG, FUTU_CONFIG, STOCKS_TO_TRACK, REDIS_CONFIG
 # 在 stock_ai_analyzer.py 文件顶部的导入部分，添加:
-from config import REDIS_CONFIG
+from config import REDIS_CONFIG, INDICATOR_STATE_CONFIG
+from ranking import get_ranking, recommendation_text
+from indicators import as_array, sma, rsi, macd, last_value
+from indicator_state import IndicatorStateStore
 
 class StockAIAnalyzer:
     """股票AI分析器"""
@@ -26,31 +28,51 @@ class StockAIAnalyzer:
         except Exception as e:
             print(f"AI分析器Redis连接错误: {e}")
             self.redis_client = None
+        
+        # 增量指标状态
+        self.state_store = None
+        if INDICATOR_STATE_CONFIG["enabled"]:
+            use_redis = INDICATOR_STATE_CONFIG["backend"] == "redis" and self.redis_client is not None
+            self.state_store = IndicatorStateStore(
+                self.redis_client if use_redis else None,
+                max_entries=INDICATOR_STATE_CONFIG["max_entries"],
+                ttl=INDICATOR_STATE_CONFIG["ttl"]
+            )
     
-    def analyze_stock(self, stock_data):
+    def analyze_stock(self, stock_data, state_key=None):
         """
         分析股票数据并生成交易建议
         
         参数:
-        stock_data (list): 包含股票价格数据的列表
+        stock_data (list/dict): 股票价格数据（逐行列表或列式字典）
+        state_key (str): 序列标识（例如 "K_DAY:US.AAPL:30"），提供时使用增量指标状态，
+            同一序列的后续请求只需处理新增或更新的K线
         
         返回:
         dict: 包含分析结果和交易建议的字典
         """
-        # 转换为pandas DataFrame进行分析
-        df = pd.DataFrame(stock_data)
+        columns = self._to_columns(stock_data)
         
-        # 确保时间列是datetime类型
-        df['time'] = pd.to_datetime(df['time'])
+        # 查询结果已按时间排序，只有乱序时才需要排序
+        times = np.asarray(columns['time']).astype(str)
+        order = slice(None) if np.all(times[1:] >= times[:-1]) else np.argsort(times, kind='stable')
+        close = as_array(columns['close'])[order]
+        volume = as_array(columns['volume'])[order]
         
-        # 排序数据，确保按时间先后顺序
-        df = df.sort_values('time')
+        state = None
+        if state_key and self.state_store is not None and np.isfinite(close).all() and np.isfinite(volume).all():
+            times = np.asarray(columns['time'], dtype=object)[order]
+            state = self.state_store.sync(state_key, self._state_times(times), close, volume)
         
         # 执行分析
-        analysis = self._perform_technical_analysis(df)
+        if state is not None:
+            analysis = state.analysis()
+            close = state.recent_closes()
+        else:
+            analysis = self._perform_technical_analysis(close, volume)
         
         # 生成建议
-        recommendations = self._generate_recommendations(df, analysis)
+        recommendations = self._generate_recommendations(close, analysis)
         
         # 结合分析和建议
         result = {
@@ -61,6 +83,55 @@ class StockAIAnalyzer:
         
         return result
     
+    def analyze_stocks(self, stock_data):
+        """
+        批量分析多只股票：数据按 (code, time) 排序后，对每只股票的连续区间调用指标内核
+        
+        参数:
+        stock_data (list/dict): 包含 code 字段的价格数据（逐行列表或列式字典）
+        
+        返回:
+        dict: 股票代码到分析结果的映射，结果格式与 analyze_stock 相同
+        """
+        columns = self._to_columns(stock_data)
+        if not len(columns.get('code', ())):
+            return {}
+        
+        codes = np.asarray(columns['code']).astype(str)
+        order = np.lexsort((np.asarray(columns['time']).astype(str), codes))
+        codes = codes[order]
+        close = as_array(columns['close'])[order]
+        volume = as_array(columns['volume'])[order]
+        
+        # 每只股票的起止位置
+        starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+        ends = np.append(starts[1:], len(codes))
+        
+        timestamp = datetime.now().isoformat()
+        results = {}
+        for start, end in zip(starts, ends):
+            analysis = self._perform_technical_analysis(close[start:end], volume[start:end])
+            results[str(codes[start])] = {
+                'analysis': analysis,
+                'recommendations': self._generate_recommendations(close[start:end], analysis),
+                'timestamp': timestamp
+            }
+        return results
+    
+    def _state_times(self, times):
+        """第一根、倒数第二根和最后一根K线的时间，统一为ISO格式字符串"""
+        def fmt(t):
+            return t.isoformat() if hasattr(t, 'isoformat') else str(t)
+        return fmt(times[0]), fmt(times[-2]) if len(times) > 1 else None, fmt(times[-1])
+    
+    def _to_columns(self, stock_data):
+        """逐行数据转换为列式字典（只取分析需要的字段）"""
+        if isinstance(stock_data, dict):
+            return stock_data
+        fields = ('code', 'time', 'close', 'volume')
+        return {field: [row.get(field) for row in stock_data] for field in fields
+                if not stock_data or field in stock_data[0]}
+    
     def analyze_realtime_stock(self, stock_code):
         """
         分析实时股票数据
@@ -133,10 +204,17 @@ class StockAIAnalyzer:
             traceback.print_exc()
             return {"error": f"分析出错: {str(e)}"}
     
-    def get_ranked_stocks(self):
+    def get_ranked_stocks(self, limit=None, min_level=None, max_level=None):
         """
         获取根据均线策略排序的股票列表
         
+        排名由数据接入进程在价格和均线变化时维护（有序集合 + 每只股票的排名快照），
+        这里只需一次 ZRANGE 和一次流水线读取。
+        
+        参数:
+        limit (int): 最多返回的股票数量，为None时返回全部
+        min_level, max_level (int): 推荐级别范围（包含）
+        
         返回:
         list: 排序后的股票列表
         """
@@ -144,98 +222,7 @@ class StockAIAnalyzer:
             return []
         
         try:
-            # 获取所有股票的实时数据
-            all_stocks = []
-            keys = self.redis_client.keys("stock:realtime:*")
-            
-            for key in keys:
-                stock_code = key.split(":")[-1]
-                realtime_data = self.redis_client.hgetall(key)
-                ma_data = self.redis_client.hgetall(f"stock:ma:{stock_code}")
-                
-                if not realtime_data or not ma_data:
-                    continue
-                
-                # 解析数据
-                try:
-                    current_price = float(realtime_data.get('price', 0))
-                    recommendation_level = int(realtime_data.get('recommendation_level', 6))
-                    updated_at = realtime_data.get('time', '')
-                    
-                    # 转换均线数据
-                    ma5 = float(ma_data.get('MA5', 0)) if ma_data.get('MA5') and ma_data.get('MA5') != "null" else None
-                    ma10 = float(ma_data.get('MA10', 0)) if ma_data.get('MA10') and ma_data.get('MA10') != "null" else None
-                    ma20 = float(ma_data.get('MA20', 0)) if ma_data.get('MA20') and ma_data.get('MA20') != "null" else None
-                    ma30 = float(ma_data.get('MA30', 0)) if ma_data.get('MA30') and ma_data.get('MA30') != "null" else None
-                    ma60 = float(ma_data.get('MA60', 0)) if ma_data.get('MA60') and ma_data.get('MA60') != "null" else None
-                    
-                    # 添加到列表
-                    all_stocks.append({
-                        'code': stock_code,
-                        'price': current_price,
-                        'recommendation_level': recommendation_level,
-                        'ma5': ma5,
-                        'ma10': ma10,
-                        'ma20': ma20,
-                        'ma30': ma30,
-                        'ma60': ma60,
-                        'updated_at': updated_at
-                    })
-                except Exception as e:
-                    print(f"处理 {stock_code} 数据时出错: {e}")
-                    continue
-            
-            # 根据推荐级别排序
-            sorted_stocks = sorted(all_stocks, key=lambda x: (x['recommendation_level'], x['code']))
-            
-            # 格式化结果
-            result = []
-            for stock in sorted_stocks:
-                # 计算与均线的关系
-                relations = []
-                if stock['ma5'] and stock['price'] < stock['ma5']:
-                    relations.append("低于5日均线")
-                if stock['ma10'] and stock['price'] < stock['ma10']:
-                    relations.append("低于10日均线")
-                if stock['ma20'] and stock['price'] < stock['ma20']:
-                    relations.append("低于20日均线")
-                if stock['ma30'] and stock['price'] < stock['ma30']:
-                    relations.append("低于30日均线")
-                if stock['ma60'] and stock['price'] < stock['ma60']:
-                    relations.append("低于60日均线")
-                
-                # 计算与最接近的均线的差距
-                closest_ma = None
-                closest_diff = float('inf')
-                ma_names = ['ma5', 'ma10', 'ma20', 'ma30', 'ma60']
-                
-                for ma_name in ma_names:
-                    ma_value = stock.get(ma_name)
-                    if ma_value:
-                        diff = abs(stock['price'] - ma_value)
-                        if diff < closest_diff:
-                            closest_diff = diff
-                            closest_ma = ma_name
-                
-                closest_ma_text = ""
-                if closest_ma:
-                    ma_label = closest_ma.upper()
-                    diff_percent = (stock['price'] / stock[closest_ma] - 1) * 100
-                    closest_ma_text = f"距{ma_label}: {diff_percent:.2f}%"
-                
-                # 构建结果
-                result.append({
-                    'code': stock['code'],
-                    'price': stock['price'],
-                    'recommendation_level': stock['recommendation_level'],
-                    'recommendation_text': self._get_recommendation_text(stock['recommendation_level']),
-                    'ma_relations': relations,
-                    'closest_ma': closest_ma_text,
-                    'updated_at': stock['updated_at']
-                })
-            
-            return result
-            
+            return get_ranking(self.redis_client, limit, min_level, max_level)
         except Exception as e:
             print(f"获取排序股票时出错: {e}")
             traceback.print_exc()
@@ -243,86 +230,53 @@ class StockAIAnalyzer:
     
     def _get_recommendation_text(self, level):
         """根据推荐级别获取文本描述"""
-        if level == 1:
-            return "强烈推荐"
-        elif level == 2:
-            return "推荐"
-        elif level == 3:
-            return "考虑买入"
-        elif level == 4:
-            return "关注"
-        elif level == 5:
-            return "轻度关注"
-        else:
-            return "不推荐"
+        return recommendation_text(level)
     
-    def _perform_technical_analysis(self, df):
+    def _perform_technical_analysis(self, close, volume):
         """
         执行技术分析
         
         参数:
-        df (DataFrame): 股票价格数据
+        close (ndarray): 按时间排序的收盘价
+        volume (ndarray): 对应的成交量
         
         返回:
         dict: 技术分析结果
         """
-        # 计算基本指标
         analysis = {}
         
-        # 1. 移动平均线
-        df['SMA5'] = df['close'].rolling(window=5).mean()
-        df['SMA10'] = df['close'].rolling(window=10).mean()
-        df['SMA20'] = df['close'].rolling(window=20).mean()
-        df['SMA30'] = df['close'].rolling(window=30).mean()  # 添加30日均线
-        df['SMA60'] = df['close'].rolling(window=60).mean()  # 添加60日均线
-        
-        # 2. 相对强弱指标(RSI)
-        delta = df['close'].diff()
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-        avg_gain = gain.rolling(window=14).mean()
-        avg_loss = loss.rolling(window=14).mean()
-        rs = avg_gain / avg_loss
-        df['RSI'] = 100 - (100 / (1 + rs))
-        
-        # 3. MACD
-        df['EMA12'] = df['close'].ewm(span=12, adjust=False).mean()
-        df['EMA26'] = df['close'].ewm(span=26, adjust=False).mean()
-        df['MACD'] = df['EMA12'] - df['EMA26']
-        df['Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-        df['Histogram'] = df['MACD'] - df['Signal']
-        
         # 获取最新值
-        latest = df.iloc[-1]
-        analysis['latest_price'] = float(latest['close'])
-        analysis['previous_price'] = float(df.iloc[-2]['close']) if len(df) > 1 else None
-        analysis['price_change'] = float(latest['close'] - df.iloc[-2]['close']) if len(df) > 1 else 0
-        analysis['price_change_percent'] = float((analysis['price_change'] / df.iloc[-2]['close']) * 100) if len(df) > 1 else 0
-        
-        # 技术指标
-        analysis['sma5'] = float(latest['SMA5']) if not np.isnan(latest['SMA5']) else None
-        analysis['sma10'] = float(latest['SMA10']) if not np.isnan(latest['SMA10']) else None
-        analysis['sma20'] = float(latest['SMA20']) if not np.isnan(latest['SMA20']) else None
-        analysis['sma30'] = float(latest['SMA30']) if not np.isnan(latest['SMA30']) else None
-        analysis['sma60'] = float(latest['SMA60']) if not np.isnan(latest['SMA60']) else None
-        analysis['rsi'] = float(latest['RSI']) if not np.isnan(latest['RSI']) else None
-        analysis['macd'] = float(latest['MACD']) if not np.isnan(latest['MACD']) else None
-        analysis['macd_signal'] = float(latest['Signal']) if not np.isnan(latest['Signal']) else None
-        analysis['macd_histogram'] = float(latest['Histogram']) if not np.isnan(latest['Histogram']) else None
+        n = len(close)
+        analysis['latest_price'] = float(close[-1])
+        analysis['previous_price'] = float(close[-2]) if n > 1 else None
+        analysis['price_change'] = float(close[-1] - close[-2]) if n > 1 else 0
+        analysis['price_change_percent'] = float((analysis['price_change'] / close[-2]) * 100) if n > 1 else 0
+        
+        # 技术指标：移动平均线、相对强弱指标(RSI)、MACD
+        analysis['sma5'] = last_value(sma(close, 5))
+        analysis['sma10'] = last_value(sma(close, 10))
+        analysis['sma20'] = last_value(sma(close, 20))
+        analysis['sma30'] = last_value(sma(close, 30))  # 添加30日均线
+        analysis['sma60'] = last_value(sma(close, 60))  # 添加60日均线
+        analysis['rsi'] = last_value(rsi(close, 14))
+        macd_line, signal_line, histogram = macd(close, 12, 26, 9)
+        analysis['macd'] = last_value(macd_line)
+        analysis['macd_signal'] = last_value(signal_line)
+        analysis['macd_histogram'] = last_value(histogram)
         
         # 成交量分析
-        analysis['volume'] = int(latest['volume']) if 'volume' in latest else None
-        if len(df) > 5:
-            analysis['volume_5day_avg'] = float(df['volume'].rolling(window=5).mean().iloc[-1])
+        analysis['volume'] = int(volume[-1]) if not np.isnan(volume[-1]) else None
+        if n > 5:
+            analysis['volume_5day_avg'] = float(sma(volume, 5)[-1])
         
         return analysis
     
-    def _generate_recommendations(self, df, analysis):
+    def _generate_recommendations(self, close, analysis):
         """
         根据技术分析生成交易建议
         
         参数:
-        df (DataFrame): 股票价格数据
+        close (ndarray): 按时间排序的收盘价
         analysis (dict): 技术分析结果
         
         返回:
@@ -426,7 +380,7 @@ class StockAIAnalyzer:
                 recommendations['reasons'].append("MACD死叉信号")
         
         # 计算支撑位和阻力位 (简化版本)
-        price_data = df['close'].tolist()
+        price_data = close.tolist()
         if len(price_data) >= 20:
             # 计算最近的支撑位 (近期低点)
             recent_lows = sorted(price_data[-20:])[:3]  # 最低的3个价格
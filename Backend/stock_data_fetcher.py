@@ -1,15 +1,26 @@
 import time
 from datetime import datetime, timedelta
 import pandas as pd
-import numpy as np
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from futu import *
 from apscheduler.schedulers.blocking import BlockingScheduler
-from config import DB_CONFIG, FUTU_CONFIG, STOCKS_TO_TRACK, REDIS_CONFIG
+from config import FUTU_CONFIG, STOCKS_TO_TRACK, REDIS_CONFIG, INGEST_CONFIG, REDIS_WRITER_CONFIG, INTRADAY_CONFIG, REALTIME_CONFIG
 import redis
 import json
 import threading
 import traceback
+from ma_engine import ma_registry
+from ingest_pipeline import IngestPipeline, TickRecord, BarRecord
+from redis_writer import RedisBatchWriter
+from db_engine import get_engine, get_pool_stats
+from bulk_loader import upsert_stock_prices, BarBatchWriter, add_change_listener
+from backfill import run_backfill
+from timescale_policy import apply_timescale_policies
+from timeframes import init_timeframe_tables, refresh_timeframe_aggregates, table_for_ktype
+from sync_planner import init_sync_state_table, sync_stock_data
+from stock_summary import init_stock_summary_table, ensure_stock_summary
+from response_cache import bump_data_versions
+from ranking import build_snapshot, update_ranking, prune_ranking
 
 # 创建Redis连接
 try:
@@ -24,17 +35,22 @@ except Exception as e:
     print(f"Redis连接错误: {e}")
     redis_client = None
 
-# 创建数据库连接
+# Redis批量写入器：实时行情和K线写入在刷新周期内合并，按批次通过pipeline发送
+redis_writer = RedisBatchWriter(
+    redis_client,
+    flush_interval=REDIS_WRITER_CONFIG["flush_interval"],
+    max_batch=REDIS_WRITER_CONFIG["max_batch"],
+    transaction=REDIS_WRITER_CONFIG["transaction"],
+    channel=REALTIME_CONFIG["channel"]
+) if redis_client else None
+
+# 价格数据写入后递增对应股票的数据版本，使API响应缓存失效
+if redis_client:
+    add_change_listener(lambda table, codes: bump_data_versions(redis_client, table, codes))
+
+# 获取数据库连接（进程内共享的连接池）
 def get_db_engine():
-    conn_str = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-    return create_engine(
-        conn_str,
-        pool_size=5,               # 设置连接池初始大小
-        max_overflow=10,           # 允许的最大溢出连接数
-        pool_timeout=30,           # 获取连接的超时时间
-        pool_recycle=1800,         # 回收连接的时间(秒)
-        pool_pre_ping=True         # 使用前 ping 检查连接是否有效
-    )
+    return get_engine("fetcher")
 
 
 # 初始化数据库模式
@@ -73,6 +89,9 @@ def init_database(engine):
         );
         """))
         
+        # 创建增量同步水位表
+        init_sync_state_table(conn)
+        
         # 将stock_price转换为超表(hypertable)
         try:
             conn.execute(text("""
@@ -81,7 +100,20 @@ def init_database(engine):
         except Exception as e:
             print(f"注意: {e}")
         
+        # 创建每只股票的统计汇总表（由批量写入增量维护），升级后首次启动时全量重建
+        init_stock_summary_table(conn)
+        ensure_stock_summary(conn)
+        
         conn.commit()
+    
+    # 创建分钟K线超表以及5分钟/15分钟/60分钟/周K连续聚合
+    try:
+        init_timeframe_tables(engine, INTRADAY_CONFIG["chunk_interval"])
+    except Exception as e:
+        print(f"初始化多周期K线表时出错: {e}")
+    
+    # 按配置应用分块间隔、压缩和数据保留策略
+    apply_timescale_policies(engine)
 
 # 添加到 stock_data_fetcher.py 文件中
 
@@ -167,30 +199,17 @@ class StockQuoteHandler(StockQuoteHandlerBase):
     def on_recv_rsp(self, rsp_pb):
         """
         实时报价回调处理
+
+        只解析推送并放入接入流水线，存储由工作线程完成，避免阻塞Futu推送线程
         """
         ret_code, data = super().on_recv_rsp(rsp_pb)
         if ret_code != RET_OK:
             print(f"StockQuoteHandler: 接收数据失败 - {data}")
             return RET_ERROR, data
-            
-        for index, row in data.iterrows():
-            stock_code = row['code']
-            last_price = row['last_price']
-            
-            # 存储实时价格到Redis
-            if redis_client:
-                try:
-                    # 存储最新价格
-                    redis_client.hset(f"stock:realtime:{stock_code}", "price", last_price)
-                    redis_client.hset(f"stock:realtime:{stock_code}", "time", datetime.now().isoformat())
-                    
-                    # 获取历史数据计算均线
-                    calculate_and_store_moving_averages(stock_code)
-                    
-                    # 记录日志
-                    #print(f"已更新 {stock_code} 实时价格: {last_price}")
-                except Exception as e:
-                    print(f"存储实时数据时出错: {e}")
+        
+        received_at = time.time()
+        for stock_code, last_price in zip(data['code'], data['last_price']):
+            ingest_pipeline.submit(TickRecord(stock_code, float(last_price), received_at))
         
         return RET_OK, data
 
@@ -202,6 +221,8 @@ class KLineHandler(CurKlineHandlerBase):
     def on_recv_rsp(self, rsp_pb):
         """
         实时K线回调处理
+
+        只解析推送并放入接入流水线，存储由工作线程完成，避免阻塞Futu推送线程
         """
         ret_code, data = super().on_recv_rsp(rsp_pb)
         if ret_code != RET_OK:
@@ -209,145 +230,212 @@ class KLineHandler(CurKlineHandlerBase):
             return RET_ERROR, data
             
         if data is not None and not data.empty:
-            for index, row in data.iterrows():
-                stock_code = row['code']
-                close_price = row['close']
-                k_time = row['time_key']
-                
-                # 存储K线数据到Redis
-                if redis_client:
-                    try:
-                        # 将当前K线数据存入Redis
-                        kline_data = {
-                            'code': stock_code,
-                            'time': k_time,
-                            'open': float(row['open']),
-                            'close': float(close_price),
-                            'high': float(row['high']),
-                            'low': float(row['low']),
-                            'volume': int(row['volume']),
-                            'turnover': float(row['turnover'])
-                        }
-                        
-                        # 将K线数据保存为列表
-                        redis_client.rpush(f"stock:kline:{stock_code}", json.dumps(kline_data))
-                        # 保留最近100条K线数据
-                        redis_client.ltrim(f"stock:kline:{stock_code}", -100, -1)
-                        
-                        #print(f"已更新 {stock_code} K线数据, 时间: {k_time}, 收盘价: {close_price}")
-                    except Exception as e:
-                        print(f"存储K线数据时出错: {e}")
-                        traceback.print_exc()
-                
-                # 尝试保存到数据库（如果是完整的日K）
-                engine = get_db_engine()
-                try:
-                    # 将时间字符串转换为日期
-                    k_date = datetime.strptime(k_time, "%Y-%m-%d %H:%M:%S")
-                    
-                    # 如果是日K的最后一条记录(下午收盘时间附近)，保存到数据库
-                    now = datetime.now()
-                    if k_date.hour >= 15 and k_date.minute >= 0:
-                        # 创建DataFrame并存储
-                        df = pd.DataFrame([{
-                            'time_key': k_time,
-                            'open': row['open'],
-                            'close': close_price,
-                            'high': row['high'],
-                            'low': row['low'],
-                            'volume': row['volume'],
-                            'turnover': row['turnover']
-                        }])
-                        store_stock_prices(engine, df, stock_code)
-                except Exception as e:
-                    print(f"保存完整K线数据到数据库时出错: {e}")
+            received_at = time.time()
+            columns = [data[c] for c in ('code', 'k_type', 'time_key', 'open', 'close', 'high', 'low', 'volume', 'turnover')]
+            for code, k_type, k_time, open_, close, high, low, volume, turnover in zip(*columns):
+                ingest_pipeline.submit(BarRecord(
+                    code, str(k_type), k_time, float(open_), float(close), float(high), float(low),
+                    int(volume), float(turnover), received_at
+                ))
         
         return RET_OK, data
 
+# 处理一条实时报价（接入流水线工作线程中执行）
+def process_quote_record(record):
+    stock_code = record.code
+    last_price = record.price
+    
+    # 存储实时价格到Redis
+    if redis_client:
+        try:
+            # 存储最新价格（同一刷新周期内只保留最新值）
+            quote_time = datetime.fromtimestamp(record.received_at).isoformat()
+            redis_writer.hset(f"stock:realtime:{stock_code}", {
+                "price": last_price,
+                "time": quote_time
+            })
+            # 发布给实时推送订阅方（p: 价格, ts: 时间）
+            redis_writer.publish_delta(stock_code, {"p": last_price, "ts": quote_time})
+            
+            # 使用内存均线窗口更新均线和推荐级别
+            calculate_and_store_moving_averages(stock_code, last_price, quote_time)
+            
+            # 记录日志
+            #print(f"已更新 {stock_code} 实时价格: {last_price}")
+        except Exception as e:
+            print(f"存储实时数据时出错: {e}")
+
+# 处理一条分钟K线推送（接入流水线工作线程中执行）
+def process_minute_kline_record(record):
+    # 分钟K线在同一分钟内会被反复推送，缓冲后按周期批量写入分钟K线表
+    minute_bar_writer.add(record.code, record.time_key, record.open, record.close, record.high,
+                          record.low, record.volume, record.turnover)
+
+# 处理一条日K推送（接入流水线工作线程中执行）
+def process_kline_record(record):
+    if record.ktype == KLType.K_1M:
+        process_minute_kline_record(record)
+        return
+    
+    stock_code = record.code
+    close_price = record.close
+    k_time = record.time_key
+    
+    # 存储K线数据到Redis
+    if redis_client:
+        try:
+            # 将当前K线数据存入Redis
+            kline_data = {
+                'code': stock_code,
+                'time': k_time,
+                'open': record.open,
+                'close': close_price,
+                'high': record.high,
+                'low': record.low,
+                'volume': record.volume,
+                'turnover': record.turnover
+            }
+            
+            # 将K线数据保存为列表，保留最近100条K线数据
+            redis_writer.rpush_capped(f"stock:kline:{stock_code}", json.dumps(kline_data), 100)
+            
+            #print(f"已更新 {stock_code} K线数据, 时间: {k_time}, 收盘价: {close_price}")
+        except Exception as e:
+            print(f"存储K线数据时出错: {e}")
+            traceback.print_exc()
+    
+    # 尝试保存到数据库（如果是完整的日K）
+    try:
+        # 将时间字符串转换为日期
+        k_date = datetime.strptime(k_time, "%Y-%m-%d %H:%M:%S")
+        
+        # 如果是日K的最后一条记录(下午收盘时间附近)，保存到数据库
+        if k_date.hour >= 15 and k_date.minute >= 0:
+            # 创建DataFrame并存储
+            df = pd.DataFrame([{
+                'time_key': k_time,
+                'open': record.open,
+                'close': close_price,
+                'high': record.high,
+                'low': record.low,
+                'volume': record.volume,
+                'turnover': record.turnover
+            }])
+            store_stock_prices(get_db_engine(), df, stock_code)
+            advance_moving_averages(stock_code, df)
+    except Exception as e:
+        print(f"保存完整K线数据到数据库时出错: {e}")
+
+# 按记录类型分发到对应的处理函数
+def process_ingest_record(record):
+    if isinstance(record, TickRecord):
+        process_quote_record(record)
+    elif isinstance(record, BarRecord):
+        process_kline_record(record)
+
+# 分钟K线批量写入器
+minute_bar_writer = BarBatchWriter(
+    get_db_engine(), table_for_ktype(KLType.K_1M), flush_interval=INTRADAY_CONFIG["flush_interval"]
+)
+
+# 行情接入流水线：回调线程入队，工作线程池负责存储
+ingest_pipeline = IngestPipeline(
+    process_ingest_record,
+    num_workers=INGEST_CONFIG["workers"],
+    max_queue_size=INGEST_CONFIG["queue_size"],
+    overflow_policy=INGEST_CONFIG["overflow_policy"],
+    block_timeout=INGEST_CONFIG["block_timeout"]
+)
+
+# 记录接入流水线的队列深度和延迟以及连接池状态，便于监控
+def report_ingest_stats():
+    stats = ingest_pipeline.stats()
+    print(f"接入流水线状态: 队列深度 {stats['queue_depth']}, 已处理 {stats['processed']}, "
+          f"合并 {stats['coalesced']}, 丢弃 {stats['dropped']}, 错误 {stats['errors']}, "
+          f"延迟 {stats['last_lag'] * 1000:.1f}ms (最大 {stats['max_lag'] * 1000:.1f}ms)")
+    if redis_writer:
+        writer_stats = redis_writer.stats()
+        print(f"Redis批量写入: 缓冲 {writer_stats['buffered']} 次写入, 合并 {writer_stats['coalesced']}, "
+              f"{writer_stats['flushes']} 个批次共 {writer_stats['commands']} 条命令")
+    for role, pool_stats in get_pool_stats().items():
+        print(f"数据库连接池 [{role}]: 已签出 {pool_stats['checked_out']}, 溢出 {pool_stats['overflow']}, "
+              f"平均等待 {pool_stats['avg_wait_ms']:.1f}ms (最大 {pool_stats['max_wait_ms']:.1f}ms)")
+    if redis_client:
+        try:
+            redis_client.hset("stock:ingest:stats", mapping={k: str(v) for k, v in stats.items()})
+        except Exception as e:
+            print(f"写入接入流水线状态时出错: {e}")
+
 # 计算并存储移动平均线
-def calculate_and_store_moving_averages(stock_code):
+def calculate_and_store_moving_averages(stock_code, current_price=None, quote_time=None):
     """
-    计算股票的各种移动平均线并存储到Redis
+    根据内存中的均线窗口更新股票的移动平均线和推荐级别到Redis
+
+    均线窗口在启动时一次性从数据库预热，日K收盘时推进，
+    因此实时报价路径上不再查询数据库或使用pandas计算。
     """
     if not redis_client:
         return
         
     try:
-        # 从数据库获取历史数据
-        engine = get_db_engine()
-        with engine.connect() as conn:
-            # 获取过去60天的数据用于计算均线
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=60)
-            
-            query = text("""
-            SELECT time, close
-            FROM stock_price
-            WHERE code = :code AND time BETWEEN :start_date AND :end_date
-            ORDER BY time
-            """)
-            
-            result = conn.execute(query, {"code": stock_code, 
-                                        "start_date": start_date, 
-                                        "end_date": end_date})
-            
-            # 转换为DataFrame
-            data = []
-            for row in result:
-                data.append({
-                    'time': row.time.isoformat(),
-                    'close': float(row.close) if row.close else None
-                })
-            
-            if not data:
-                print(f"没有找到 {stock_code} 的历史数据")
-                return
-                
-            df = pd.DataFrame(data)
-            
-            # 确保close数据为数值类型
-            df['close'] = pd.to_numeric(df['close'], errors='coerce')
+        # 尚未预热的股票（例如新加入跟踪列表）只在首次访问时查询一次数据库
+        if not ma_registry.is_seeded(stock_code):
+            ma_registry.seed_from_db(get_db_engine(), [stock_code])
+        
+        ma_values, changed = ma_registry.snapshot(stock_code)
+        if ma_values is None:
+            print(f"没有找到 {stock_code} 的历史数据")
+            return
+        
+        # 均线只在日K推进时变化，未变化时无需重复写入
+        if changed:
+            ma_data = dict(ma_values)
+            ma_data['updated_at'] = datetime.now().isoformat()
+            redis_writer.hset(f"stock:ma:{stock_code}", {k: str(v) if v is not None else "null" for k, v in ma_data.items()})
+            redis_writer.publish_delta(stock_code, {"ma": ma_values})
+        
+        # 获取实时价格
+        if current_price is None:
+            current_price, quote_time = redis_client.hmget(f"stock:realtime:{stock_code}", ["price", "time"])
+        if current_price:
+            current_price = float(current_price)
             
-            # 计算移动平均线
-            df['MA5'] = df['close'].rolling(window=5).mean()
-            df['MA10'] = df['close'].rolling(window=10).mean()
-            df['MA20'] = df['close'].rolling(window=20).mean()
-            df['MA30'] = df['close'].rolling(window=30).mean()
-            df['MA60'] = df['close'].rolling(window=60).mean()
+            # 计算推荐级别
+            recommendation_level = calculate_recommendation_level(current_price, ma_values)
             
-            # 获取最新的移动平均线值
-            latest = df.iloc[-1]
+            # 存储推荐级别
+            redis_writer.hset(f"stock:realtime:{stock_code}", {"recommendation_level": recommendation_level})
+            redis_writer.publish_delta(stock_code, {"l": recommendation_level})
             
-            # 存储到Redis
-            ma_data = {
-                'MA5': float(latest['MA5']) if not np.isnan(latest['MA5']) else None,
-                'MA10': float(latest['MA10']) if not np.isnan(latest['MA10']) else None,
-                'MA20': float(latest['MA20']) if not np.isnan(latest['MA20']) else None,
-                'MA30': float(latest['MA30']) if not np.isnan(latest['MA30']) else None,
-                'MA60': float(latest['MA60']) if not np.isnan(latest['MA60']) else None,
-                'updated_at': datetime.now().isoformat()
-            }
+            # 维护排名有序集合和已格式化的排名快照，API无需扫描键和排序
+            update_ranking(redis_writer, build_snapshot(stock_code, current_price, recommendation_level,
+                                                        ma_values, quote_time))
             
-            # 将均线数据保存到Redis
-            redis_client.hmset(f"stock:ma:{stock_code}", {k: str(v) if v is not None else "null" for k, v in ma_data.items()})
-            
-            # 获取实时价格
-            current_price = redis_client.hget(f"stock:realtime:{stock_code}", "price")
-            if current_price:
-                current_price = float(current_price)
-                
-                # 计算推荐级别
-                recommendation_level = calculate_recommendation_level(current_price, ma_data)
-                
-                # 存储推荐级别
-                redis_client.hset(f"stock:realtime:{stock_code}", "recommendation_level", recommendation_level)
-                
-                #print(f"{stock_code} 均线计算完成，当前价格: {current_price}，推荐级别: {recommendation_level}")
+            #print(f"{stock_code} 均线计算完成，当前价格: {current_price}，推荐级别: {recommendation_level}")
                 
     except Exception as e:
         print(f"计算 {stock_code} 均线时出错: {e}")
         traceback.print_exc()
 
+# 日K收盘后推进均线窗口
+def advance_moving_averages(stock_code, price_df):
+    """
+    将新存储的日K收盘价推进到均线窗口
+
+    参数:
+    stock_code: 股票代码
+    price_df: 包含 time_key 和 close 列的K线DataFrame
+    """
+    try:
+        if not ma_registry.is_seeded(stock_code):
+            # 数据已写入数据库，直接预热即可包含最新K线
+            ma_registry.seed_from_db(get_db_engine(), [stock_code])
+            return
+        for k_time, close in zip(price_df['time_key'], price_df['close']):
+            ma_registry.push_bar(stock_code, k_time, close)
+    except Exception as e:
+        print(f"推进 {stock_code} 均线窗口时出错: {e}")
+
 # 计算推荐级别
 def calculate_recommendation_level(current_price, ma_data):
     """
@@ -387,24 +475,13 @@ def calculate_recommendation_level(current_price, ma_data):
 
 # 将股票价格数据存储到数据库
 def store_stock_prices(engine, price_df, code):
-    # 重命名列以匹配我们的数据库模式
-    columns_map = {
-        'time_key': 'time',
-        'open': 'open',
-        'close': 'close',
-        'high': 'high',
-        'low': 'low',
-        'volume': 'volume',
-        'turnover': 'turnover'
-    }
-    
-    # 选择并重命名列
-    df = price_df[list(columns_map.keys())].rename(columns=columns_map)
-    df['code'] = code
-    
-    # 存储数据到数据库
-    df.to_sql('stock_price', engine, if_exists='append', index=False, method='multi')
-    print(f"已存储 {len(df)} 条 {code} 的价格记录")
+    """
+    以幂等方式写入股票价格（COPY到暂存表后按 (time, code) 合并），
+    重复推送或重复拉取同一根K线只会更新已有记录
+    """
+    stats = upsert_stock_prices(engine, price_df, code)
+    print(f"已存储 {stats['rows']} 条 {code} 的价格记录 (新增 {stats['inserted']}, 更新 {stats['updated']})")
+    return stats
 
 # 检查股票名称是否存在于数据库中
 def check_stock_names(engine, stock_codes):
@@ -557,6 +634,21 @@ def subscribe_realtime_data():
     订阅实时股票数据
     """
     try:
+        # 移除已不在跟踪列表中的股票排名
+        if redis_client:
+            removed = prune_ranking(redis_client, STOCKS_TO_TRACK)
+            if removed:
+                print(f"已从排名中移除 {removed} 支不再跟踪的股票")
+        
+        # 在收到推送前一次查询预热所有股票的均线窗口
+        ma_registry.seed_from_db(get_db_engine(), STOCKS_TO_TRACK)
+        
+        # 启动Redis批量写入线程和接入流水线工作线程
+        if redis_writer:
+            redis_writer.start()
+        minute_bar_writer.start()
+        ingest_pipeline.start()
+        
         quote_ctx = OpenQuoteContext(host=FUTU_CONFIG["host"], port=FUTU_CONFIG["port"])
         
         # 设置回调处理
@@ -580,6 +672,14 @@ def subscribe_realtime_data():
             print(f"订阅日K线失败: {data}")
         else:
             print(f"已成功订阅 {len(STOCKS_TO_TRACK)} 支股票的日K线")
+        
+        # 订阅1分钟K线（更粗的分钟周期由数据库连续聚合生成）
+        if INTRADAY_CONFIG["enabled"]:
+            ret, data = quote_ctx.subscribe(STOCKS_TO_TRACK, [SubType.K_1M], is_first_push=True)
+            if ret != RET_OK:
+                print(f"订阅1分钟K线失败: {data}")
+            else:
+                print(f"已成功订阅 {len(STOCKS_TO_TRACK)} 支股票的1分钟K线")
             
         # 初始计算所有股票的均线
         for stock_code in STOCKS_TO_TRACK:
@@ -589,6 +689,7 @@ def subscribe_realtime_data():
         print("实时数据订阅成功，保持连接...")
         while True:
             time.sleep(60)  # 每分钟检查一次
+            report_ingest_stats()
             
     except Exception as e:
         print(f"实时数据订阅出错: {e}")
@@ -597,6 +698,10 @@ def subscribe_realtime_data():
         if 'quote_ctx' in locals():
             quote_ctx.close()
             print("已关闭Futu API连接")
+        ingest_pipeline.stop()
+        minute_bar_writer.stop()
+        if redis_writer:
+            redis_writer.stop()
 
 # 获取股票基本信息
 def get_stock_info(quote_ctx, market):
@@ -695,21 +800,13 @@ def update_stock_data():
     quote_ctx = connect_futu_api()
     
     try:
-        # 获取今天和昨天的日期
-        end_date = datetime.now().strftime("%Y-%m-%d")
-        start_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        # 只获取每只股票缺失的日期区间（同步水位之后以及历史缺口）
+        summary = sync_stock_data(engine, quote_ctx, STOCKS_TO_TRACK)
         
-        # 更新每只股票的价格数据
-        for stock_code in STOCKS_TO_TRACK:
-            try:
-                stock_data = get_kline_data(quote_ctx, stock_code, start_date, end_date)
-                if stock_data is not None and not stock_data.empty:
-                    store_stock_prices(engine, stock_data, stock_code)
-                    #print(f"已更新 {stock_code} 数据")
-                else:
-                    print(f"{stock_code} 没有新数据")
-            except Exception as e:
-                print(f"更新 {stock_code} 时出错: {e}")
+        # 有新数据的股票重新预热均线窗口（缺口回补可能插入较早的K线）
+        updated_codes = sorted({r['code'] for r in summary['results'] if r['rows'] > 0})
+        if updated_codes:
+            ma_registry.seed_from_db(engine, updated_codes)
         
         # 更新缺失的股票名称
         update_missing_stock_names()
@@ -784,18 +881,14 @@ def initialize():
             # 初始数据加载
             print("获取初始历史数据...")
             
-            # 获取过去60天的数据（增加到60天用于计算所有均线）
-            end_date = datetime.now().strftime("%Y-%m-%d")
-            start_date = (datetime.now() - timedelta(days=60)).strftime("%Y-%m-%d")
+            # 增量同步：已有数据的股票只补缺失区间，新股票获取初始窗口（默认60天用于计算所有均线）
+            sync_stock_data(engine, quote_ctx, STOCKS_TO_TRACK)
             
-            for stock_code in STOCKS_TO_TRACK:
-                try:
-                    stock_data = get_kline_data(quote_ctx, stock_code, start_date, end_date)
-                    if stock_data is not None:
-                        store_stock_prices(engine, stock_data, stock_code)
-                        print(f"已加载 {stock_code} 的初始数据")
-                except Exception as e:
-                    print(f"加载 {stock_code} 的初始数据时出错: {e}")
+            # 回填最近几天的1分钟K线（重复写入是幂等的）
+            if INTRADAY_CONFIG["enabled"]:
+                intraday_start = (datetime.now() - timedelta(days=INTRADAY_CONFIG["backfill_days"])).strftime("%Y-%m-%d")
+                run_backfill(quote_ctx, engine, STOCKS_TO_TRACK, intraday_start, ktype=KLType.K_1M)
+                refresh_timeframe_aggregates(engine, start=datetime.strptime(intraday_start, "%Y-%m-%d"))
                 
         except Exception as e:
             print(f"获取历史数据时出错: {e}")
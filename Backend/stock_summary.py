@@ -0,0 +1,121 @@
+# Backend/stock_summary.py
+from sqlalchemy import text
+
+
+def init_stock_summary_table(conn):
+    """创建每只股票的统计汇总表，以及按代码查询最新K线所需的索引"""
+    conn.execute(text("""
+    CREATE TABLE IF NOT EXISTS stock_summary (
+        code VARCHAR(20) PRIMARY KEY,
+        record_count BIGINT NOT NULL DEFAULT 0,
+        first_time TIMESTAMP,
+        last_time TIMESTAMP,
+        latest_open NUMERIC(19, 4),
+        latest_close NUMERIC(19, 4),
+        latest_high NUMERIC(19, 4),
+        latest_low NUMERIC(19, 4),
+        latest_volume BIGINT,
+        latest_turnover NUMERIC(19, 4),
+        previous_close NUMERIC(19, 4),
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """))
+    conn.execute(text("""
+    CREATE INDEX IF NOT EXISTS stock_price_code_time_idx ON stock_price (code, time DESC);
+    """))
+
+
+# 取每只股票最新一根K线和前一根K线的收盘价（走 (code, time DESC) 索引）
+_LATEST_BARS_SQL = """
+CROSS JOIN LATERAL (
+    SELECT time, open, close, high, low, volume, turnover FROM stock_price
+    WHERE code = c.code ORDER BY time DESC LIMIT 1
+) l
+LEFT JOIN LATERAL (
+    SELECT close FROM stock_price
+    WHERE code = c.code AND time < l.time ORDER BY time DESC LIMIT 1
+) p ON TRUE
+"""
+
+
+def rebuild_stock_summary(conn):
+    """
+    用一次集合查询重建所有股票的统计（首次部署或数据被批量修改后使用）
+
+    返回:
+    int: 重建的股票数量
+    """
+    conn.execute(text(f"""
+    INSERT INTO stock_summary (code, record_count, first_time, last_time,
+                               latest_open, latest_close, latest_high, latest_low,
+                               latest_volume, latest_turnover, previous_close, updated_at)
+    SELECT c.code, c.record_count, c.first_time, l.time,
+           l.open, l.close, l.high, l.low, l.volume, l.turnover, p.close, CURRENT_TIMESTAMP
+    FROM (
+        SELECT code, COUNT(*) AS record_count, MIN(time) AS first_time
+        FROM stock_price GROUP BY code
+    ) c
+    {_LATEST_BARS_SQL}
+    ON CONFLICT (code) DO UPDATE SET
+        record_count = EXCLUDED.record_count,
+        first_time = EXCLUDED.first_time,
+        last_time = EXCLUDED.last_time,
+        latest_open = EXCLUDED.latest_open,
+        latest_close = EXCLUDED.latest_close,
+        latest_high = EXCLUDED.latest_high,
+        latest_low = EXCLUDED.latest_low,
+        latest_volume = EXCLUDED.latest_volume,
+        latest_turnover = EXCLUDED.latest_turnover,
+        previous_close = EXCLUDED.previous_close,
+        updated_at = EXCLUDED.updated_at
+    """))
+    return conn.execute(text("SELECT COUNT(*) FROM stock_summary")).scalar()
+
+
+def ensure_stock_summary(conn):
+    """汇总表为空而价格表有数据时（例如升级后首次启动）重建汇总"""
+    empty = conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM stock_summary)")).scalar()
+    has_prices = conn.execute(text("SELECT EXISTS (SELECT 1 FROM stock_price)")).scalar()
+    if empty and has_prices:
+        count = rebuild_stock_summary(conn)
+        print(f"已重建 {count} 支股票的统计汇总")
+
+
+def apply_summary_deltas(cursor, deltas):
+    """
+    在写入价格数据的同一事务中增量更新汇总表
+
+    record_count 和 first_time 只会增加，汇总假设 stock_price 没有数据保留策略
+    （apply_timescale_policies 拒绝为其设置保留）；手动删除数据后需调用 rebuild_stock_summary。
+
+    参数:
+    cursor: psycopg2 游标
+    deltas (list): (code, 新增行数, 本批最早时间) 列表
+    """
+    if not deltas:
+        return
+    codes = [d[0] for d in deltas]
+    inserted = [int(d[1]) for d in deltas]
+    first_times = [d[2] for d in deltas]
+    cursor.execute(f"""
+    INSERT INTO stock_summary AS s (code, record_count, first_time, last_time,
+                                    latest_open, latest_close, latest_high, latest_low,
+                                    latest_volume, latest_turnover, previous_close, updated_at)
+    SELECT c.code, c.inserted, c.first_time, l.time,
+           l.open, l.close, l.high, l.low, l.volume, l.turnover, p.close, CURRENT_TIMESTAMP
+    FROM UNNEST(%(codes)s::varchar[], %(inserted)s::bigint[], %(first_times)s::timestamp[])
+         AS c(code, inserted, first_time)
+    {_LATEST_BARS_SQL}
+    ON CONFLICT (code) DO UPDATE SET
+        record_count = s.record_count + EXCLUDED.record_count,
+        first_time = LEAST(s.first_time, EXCLUDED.first_time),
+        last_time = EXCLUDED.last_time,
+        latest_open = EXCLUDED.latest_open,
+        latest_close = EXCLUDED.latest_close,
+        latest_high = EXCLUDED.latest_high,
+        latest_low = EXCLUDED.latest_low,
+        latest_volume = EXCLUDED.latest_volume,
+        latest_turnover = EXCLUDED.latest_turnover,
+        previous_close = EXCLUDED.previous_close,
+        updated_at = EXCLUDED.updated_at
+    """, {"codes": codes, "inserted": inserted, "first_times": first_times})
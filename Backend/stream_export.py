@@ -0,0 +1,127 @@
+# Backend/stream_export.py
+import asyncio
+import csv
+import io
+import json
+from sqlalchemy import text
+from response_formats import PRICE_COLUMN_FIELDS, PRICE_COLUMNS_SELECT
+
+# 服务端游标每次取回的行数，同时也是每个输出分块的行数
+STREAM_CHUNK_ROWS = 2000
+# COPY 导出时在内存中排队的最大分块数，消费端变慢时反压数据库
+EXPORT_QUEUE_CHUNKS = 8
+
+
+def _format_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+async def stream_price_rows(engine, table, code, fmt, start_date=None, end_date=None):
+    """
+    通过服务端游标逐块输出单只股票的K线，内存占用与数据量无关
+
+    参数:
+    engine: 异步数据库引擎
+    table (str): K线表
+    code (str): 股票代码
+    fmt (str): "ndjson" 或 "csv"
+    start_date, end_date (datetime): 可选的时间范围
+
+    返回:
+    异步生成器，逐块产生编码后的字节
+    """
+    params = {"code": code}
+    condition = "code = :code"
+    if start_date is not None:
+        params["start_date"] = start_date
+        condition += " AND time >= :start_date"
+    if end_date is not None:
+        params["end_date"] = end_date
+        condition += " AND time <= :end_date"
+    query = text(f"""{PRICE_COLUMNS_SELECT}
+    FROM {table}
+    WHERE {condition}
+    ORDER BY time
+    """)
+
+    if fmt == "csv":
+        yield (",".join(['code'] + PRICE_COLUMN_FIELDS) + "\n").encode()
+
+    async with engine.connect() as conn:
+        result = await conn.stream(query.execution_options(yield_per=STREAM_CHUNK_ROWS), params)
+        async for rows in result.partitions(STREAM_CHUNK_ROWS):
+            buffer = io.StringIO()
+            if fmt == "csv":
+                writer = csv.writer(buffer, lineterminator="\n")
+                writer.writerows([code] + [_format_value(v) for v in row] for row in rows)
+            else:
+                for row in rows:
+                    record = {'code': code}
+                    record.update(zip(PRICE_COLUMN_FIELDS, (_format_value(v) for v in row)))
+                    buffer.write(json.dumps(record))
+                    buffer.write("\n")
+            yield buffer.getvalue().encode()
+
+
+async def copy_export(engine, table, codes, start_date=None, end_date=None):
+    """
+    多只股票批量导出：直接使用 COPY ... TO STDOUT 输出CSV，由数据库完成格式化
+
+    参数:
+    engine: 异步数据库引擎（asyncpg驱动）
+    table (str): K线表
+    codes (list): 股票代码
+    start_date, end_date (datetime): 可选的时间范围
+
+    返回:
+    异步生成器，逐块产生CSV字节（包含表头）
+    """
+    conditions = ["code = ANY($1::varchar[])"]
+    args = [list(codes)]
+    if start_date is not None:
+        args.append(start_date)
+        conditions.append(f"time >= ${len(args)}")
+    if end_date is not None:
+        args.append(end_date)
+        conditions.append(f"time <= ${len(args)}")
+    query = f"""
+    SELECT time, code, open, close, high, low, volume, turnover
+    FROM {table}
+    WHERE {' AND '.join(conditions)}
+    ORDER BY code, time
+    """
+
+    queue = asyncio.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    done = object()
+
+    async def output(chunk):
+        await queue.put(bytes(chunk))
+
+    async def run_copy():
+        try:
+            async with engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_from_query(query, *args, output=output,
+                                                            format='csv', header=True)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(done)
+
+    task = asyncio.ensure_future(run_copy())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # 客户端提前断开时停止COPY并归还连接
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
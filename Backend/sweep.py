@@ -0,0 +1,433 @@
+# Backend/sweep.py
+"""
+交易建议规则的参数扫描：按网格或随机抽样生成参数组合，对整个股票池回测每个组合，
+结果逐批追加到JSONL文件，中断后重新运行会跳过已完成的组合
+
+指标（各周期均线、RSI、MACD）与参数无关，按股票分组预先计算一次并缓存到磁盘，
+每个参数组合只需重新评估规则和计算收益。
+
+除综合建议（recommendations）外，还分别扫描 backtest.rule_positions 中的单条规则
+（ma_level_N、ma_alignment、rsi）。单条规则只依赖部分参数，取值相同的组合只回测一次。
+MACD规则没有可扫描的参数，结果见 backtest.py。
+
+说明: 综合建议中MACD规则最后判断，而金叉/死叉几乎每根K线都成立，最终动作基本由MACD决定，
+均线和RSI参数只通过置信度影响仓位（min_confidence：置信度低于该值的买入信号视为观望），
+很多组合的仓位完全相同；报告中仓位相同的组合只显示一次。
+规则中的 ±2% 动量阈值只影响建议理由，不改变建议动作，因此不参与扫描。
+
+用法: python sweep.py [--search grid|random] [--samples 200] [--grid grid.json] [--workers 8]
+                      [--results sweep_results.jsonl] [--cache-dir .sweep_cache]
+      python sweep.py --synthetic 100 --bars 2520 --search random --samples 20
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from config import STOCKS_TO_TRACK
+from db_engine import get_engine
+from timeframes import table_for_ktype
+from indicators import sma, rsi, macd
+from panel import (DEFAULT_RULE_PARAMS, RSI_PERIOD, ACTION_BUY, ACTION_SELL, recommendation_levels, rule_signals,
+                   evaluate_rules)
+from backtest import (PERIODS_PER_YEAR, load_history, synthetic_history, make_tasks, hold_positions,
+                      simulate, trade_stats, performance, sum_by_time, merge_daily)
+
+# 默认扫描的参数取值；未列出的参数使用 DEFAULT_RULE_PARAMS
+DEFAULT_GRID = {
+    'ma_periods': [[5, 10, 20, 30, 60], [5, 10, 20, 50, 100], [3, 8, 21, 34, 55], [10, 20, 30, 60, 120]],
+    'rsi_overbought': [65, 70, 75, 80],
+    'rsi_oversold': [20, 25, 30, 35],
+    'rsi_confidence': [0.6, 0.65, 0.7],
+    'macd_confidence': [0.55, 0.6, 0.65],
+    'min_confidence': [0.0, 0.6, 0.65, 0.7],
+}
+
+INDICATOR_FIELDS = ('rsi', 'macd', 'macd_signal', 'macd_histogram')
+
+# 扫描的规则及其依赖的参数（None 表示依赖所有参数）
+SWEEP_RULES = {
+    'recommendations': None,
+    **{f'ma_level_{level}': ('ma_periods',) for level in range(1, 6)},
+    'ma_alignment': ('ma_periods',),
+    'rsi': ('rsi_overbought', 'rsi_oversold'),
+}
+
+# 结果记录格式的版本，格式变化后旧记录不再复用
+RESULT_VERSION = 2
+
+
+def param_key(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def valid_params(params):
+    """过滤无意义的组合：均线周期必须严格递增，超卖阈值必须低于超买阈值"""
+    merged = {**DEFAULT_RULE_PARAMS, **params}
+    periods = list(merged['ma_periods'])
+    return (len(periods) == len(DEFAULT_RULE_PARAMS['ma_periods'])
+            and all(a < b for a, b in zip(periods, periods[1:]))
+            and merged['rsi_oversold'] < merged['rsi_overbought'])
+
+
+def generate_combinations(grid, search="grid", samples=100, seed=0):
+    """
+    生成参数组合（第一个总是默认参数，作为对比基准）
+
+    参数:
+    grid (dict): 参数名到候选值列表的映射
+    search (str): grid 遍历所有组合，random 随机抽样 samples 个不重复的组合
+    samples (int): 随机抽样的数量
+    seed (int): 随机种子，相同种子生成相同的组合，保证中断后可以继续
+
+    返回:
+    list: 参数字典列表
+    """
+    names = sorted(grid)
+    if search == "grid":
+        candidates = (dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names)))
+    elif search == "random":
+        rng = random.Random(seed)
+        total = int(np.prod([len(grid[n]) for n in names])) if names else 1
+        # 抽样次数上限避免网格很小时无限循环
+        candidates = ({n: rng.choice(grid[n]) for n in names} for _ in range(max(samples * 20, total * 5)))
+    else:
+        raise ValueError(f"不支持的搜索方式: {search}，可选 grid、random")
+
+    defaults = {n: DEFAULT_RULE_PARAMS.get(n, 0.0) for n in names}
+    defaults['ma_periods'] = list(defaults.get('ma_periods', DEFAULT_RULE_PARAMS['ma_periods']))
+    combos, seen = [defaults], {param_key(defaults)}
+    for params in candidates:
+        if search == "random" and len(combos) > samples:
+            break
+        key = param_key(params)
+        if key not in seen and valid_params(params):
+            seen.add(key)
+            combos.append(params)
+    return combos
+
+
+def rule_units(combos):
+    """
+    将参数组合展开为各规则的回测单元，单条规则只保留其依赖的参数，取值相同的只保留一个
+
+    返回:
+    list: (结果标识, 规则名, 参数) 列表，按组合顺序排列（每条规则的第一个单元使用默认参数）
+    """
+    units, seen = [], set()
+    for params in combos:
+        for rule, names in SWEEP_RULES.items():
+            used = dict(params) if names is None else {n: params.get(n, DEFAULT_RULE_PARAMS[n]) for n in names}
+            if 'ma_periods' in used:
+                used['ma_periods'] = list(used['ma_periods'])
+            key = param_key({'rule': rule, 'params': used})
+            if key not in seen:
+                seen.add(key)
+                units.append((key, rule, used))
+    return units
+
+
+def data_fingerprint(history):
+    """行情数据的指纹，用于区分不同数据下的指标缓存和结果记录"""
+    digest = hashlib.sha1()
+    for name in ('code', 'ts', 'close'):
+        digest.update(np.ascontiguousarray(history[name]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def cache_indicators(task):
+    """
+    进程池任务：计算一组股票与参数无关的指标并保存为 .npz（文件已存在时跳过）
+
+    参数:
+    task (tuple): (缓存文件路径, backtest.make_tasks 生成的任务, 均线周期列表)
+
+    返回:
+    str: 缓存文件路径
+    """
+    path, (codes, bounds, ts, close, volume, _), windows = task
+    if os.path.exists(path):
+        return path
+
+    columns = {name: [] for name in ('ts', 'close') + INDICATOR_FIELDS + tuple(f'sma{w}' for w in windows)}
+    new_bounds = []
+    position = 0
+    for start, end in bounds:
+        valid = np.isfinite(close[start:end]) & (close[start:end] > 0)
+        c = close[start:end][valid]
+        columns['ts'].append(ts[start:end][valid])
+        columns['close'].append(c)
+        for w in windows:
+            columns[f'sma{w}'].append(sma(c, w))
+        columns['rsi'].append(rsi(c, RSI_PERIOD))
+        for name, values in zip(INDICATOR_FIELDS[1:], macd(c, 12, 26, 9)):
+            columns[name].append(values)
+        new_bounds.append((position, position + len(c)))
+        position += len(c)
+
+    arrays = {name: np.concatenate(values) if values else np.array([]) for name, values in columns.items()}
+    arrays['codes'] = np.array(codes, dtype=str)
+    arrays['bounds'] = np.array(new_bounds, dtype=np.int64).reshape(-1, 2)
+    # 先写临时文件再改名，中断时不会留下不完整的缓存
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+    return path
+
+
+def unit_positions(rule, params, values, exit_position, levels):
+    """
+    单只股票在一个回测单元下的仓位
+
+    参数:
+    rule (str): SWEEP_RULES 中的规则名
+    params (dict): 该规则的参数
+    values (dict): 指标数组（含 latest_price）
+    exit_position (float): 卖出信号后的仓位
+    levels (dict): 均线周期到推荐级别数组的缓存，同一只股票的各个 ma_level 规则共用
+    """
+    if rule == 'recommendations':
+        action, confidence, _ = evaluate_rules(values, params=params)
+        buy = (action == ACTION_BUY) & (confidence >= params.get('min_confidence', 0.0))
+        return hold_positions(buy, action == ACTION_SELL, exit_position)
+
+    merged = {**DEFAULT_RULE_PARAMS, **params}
+    if rule.startswith('ma_level_'):
+        periods = tuple(merged['ma_periods'])
+        if periods not in levels:
+            levels[periods] = recommendation_levels(values['latest_price'],
+                                                    {period: values[f'sma{period}'] for period in periods})
+        return (levels[periods] <= int(rule.rsplit('_', 1)[1])).astype(np.float64)
+
+    signals = rule_signals(values, merged)
+    if rule == 'ma_alignment':
+        return hold_positions(signals['bullish'], signals['bearish'], exit_position)
+    return hold_positions(signals['oversold'], signals['overbought'], exit_position)
+
+
+def sweep_chunk(task):
+    """
+    进程池任务：对一组股票回测一批回测单元（每只股票的指标只读取一次，供所有单元使用）
+
+    参数:
+    task (tuple): (指标缓存文件路径, [(结果标识, 规则名, 参数), ...], 回测选项)
+
+    返回:
+    dict: 结果标识到 (按时间汇总的收益, 交易数, 盈利数, 年换手合计, 持仓占比合计, 股票数, 仓位摘要) 的映射
+    """
+    path, units, options = task
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    periods_per_year = options['periods_per_year']
+    exit_position = -1.0 if options['allow_short'] else 0.0
+    fields = [name for name in arrays if name.startswith('sma')] + list(INDICATOR_FIELDS)
+
+    totals = {key: {'times': [], 'returns': [], 'trades': 0, 'wins': 0, 'turnover': 0.0, 'exposure': 0.0,
+                    'symbols': 0, 'digest': hashlib.sha1()} for key, _, _ in units}
+    for start, end in arrays['bounds']:
+        if end - start < 2:
+            continue
+        close = arrays['close'][start:end]
+        values = {name: arrays[name][start:end] for name in fields}
+        values['latest_price'] = close
+        years = len(close) / periods_per_year
+        levels = {}
+        for key, rule, params in units:
+            position = unit_positions(rule, params, values, exit_position, levels)
+            gross, net, turnover = simulate(close, position, options['cost'])
+            trades, wins = trade_stats(position, gross)
+            total = totals[key]
+            total['times'].append(arrays['ts'][start:end])
+            total['returns'].append(net)
+            total['trades'] += trades
+            total['wins'] += wins
+            total['turnover'] += float(turnover.sum() / years)
+            total['exposure'] += float(np.abs(position).mean())
+            total['symbols'] += 1
+            total['digest'].update(position.tobytes())
+
+    return {key: (sum_by_time(t['times'], t['returns']), t['trades'], t['wins'], t['turnover'], t['exposure'],
+                  t['symbols'], t['digest'].hexdigest()) for key, t in totals.items()}
+
+
+def summarize(key, rule, params, outputs, periods_per_year, context):
+    """合并各组股票的结果，生成一个回测单元的结果记录（positions 为所有股票仓位的摘要，相同则结果相同）"""
+    parts = [output[key] for output in outputs]
+    times, sums, counts = merge_daily([part[0] for part in parts])
+    record = performance(sums / counts if len(counts) else sums, periods_per_year)
+    trades = sum(part[1] for part in parts)
+    wins = sum(part[2] for part in parts)
+    symbols = sum(part[5] for part in parts)
+    record.update({
+        'key': key,
+        'context': context,
+        'rule': rule,
+        'params': params,
+        'positions': hashlib.sha1("".join(part[6] for part in parts).encode()).hexdigest()[:16],
+        'symbols': symbols,
+        'trades': trades,
+        'hit_rate': wins / trades if trades else None,
+        'turnover': sum(part[3] for part in parts) / symbols if symbols else 0.0,
+        'exposure': sum(part[4] for part in parts) / symbols if symbols else 0.0,
+        'finished_at': datetime.now().isoformat(),
+    })
+    return record
+
+
+def load_results(path, context):
+    """读取结果文件中与当前数据和选项相同的记录"""
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 写入时被中断的最后一行
+                continue
+            if record.get('context') == context:
+                results[record['key']] = record
+    return results
+
+
+def run_sweep(history, combos, results_path, cache_dir, cost=0.0, allow_short=False, periods_per_year=252,
+              workers=None, batch_size=50):
+    """
+    回测所有参数组合下的各条规则，已完成的回测单元从结果文件读取
+
+    参数:
+    history (dict): backtest.load_history 或 synthetic_history 的结果
+    combos (list): generate_combinations 的结果
+    results_path (str): JSONL 结果文件
+    cache_dir (str): 指标缓存目录
+    cost, allow_short, periods_per_year: 回测选项，见 backtest.run_backtest
+    workers (int): 进程数，默认为CPU核数
+    batch_size (int): 每批回测的组合数量，每批完成后写入结果文件
+
+    返回:
+    list: 所有回测单元的结果记录，顺序同 rule_units
+    """
+    workers = workers or os.cpu_count() or 1
+    options = {'cost': cost, 'allow_short': allow_short, 'periods_per_year': periods_per_year}
+    windows = sorted({w for params in combos for w in params.get('ma_periods', DEFAULT_RULE_PARAMS['ma_periods'])})
+    fingerprint = data_fingerprint(history)
+    # 结果只在数据和回测选项都相同时复用
+    context = param_key({'data': fingerprint, 'options': options, 'version': RESULT_VERSION})
+
+    units = rule_units(combos)
+    results = load_results(results_path, context)
+    pending = [unit for unit in units if unit[0] not in results]
+    print(f"共 {len(combos)} 个参数组合，展开为 {len(units)} 个规则回测单元，"
+          f"已完成 {len(units) - len(pending)} 个，待回测 {len(pending)} 个")
+    if not pending:
+        return [results[key] for key, _, _ in units]
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    run = pool.map if pool else map
+    try:
+        started = time.time()
+        tasks = make_tasks(history, options, workers * 4)
+        # 缓存按数据、均线周期和分组方式区分
+        directory = os.path.join(cache_dir, f"{fingerprint}_{param_key(windows)}_{len(tasks)}")
+        os.makedirs(directory, exist_ok=True)
+        paths = list(run(cache_indicators, [(os.path.join(directory, f"chunk_{i:04d}.npz"), task, windows)
+                                            for i, task in enumerate(tasks)]))
+        print(f"指标缓存就绪 ({len(paths)} 组, 均线周期 {windows})，耗时 {time.time() - started:.1f}秒")
+
+        for offset in range(0, len(pending), batch_size):
+            started = time.time()
+            batch = pending[offset:offset + batch_size]
+            outputs = list(run(sweep_chunk, [(path, batch, options) for path in paths]))
+            with open(results_path, "a", encoding="utf-8") as f:
+                for key, rule, params in batch:
+                    results[key] = summarize(key, rule, params, outputs, periods_per_year, context)
+                    f.write(json.dumps(results[key], ensure_ascii=False) + "\n")
+            print(f"已完成 {offset + len(batch)}/{len(pending)} 个单元，本批耗时 {time.time() - started:.1f}秒")
+    finally:
+        if pool:
+            pool.shutdown()
+    return [results[key] for key, _, _ in units]
+
+
+def print_top(records, top):
+    """按规则输出默认参数和夏普比率最高的组合，仓位与已输出的组合完全相同的只计数不重复输出"""
+    def sharpe(record):
+        return record['sharpe'] if record['sharpe'] is not None else float('-inf')
+
+    for rule in SWEEP_RULES:
+        rule_records = [record for record in records if record['rule'] == rule]
+        if not rule_records:
+            continue
+        baseline = rule_records[0]
+        shown, seen, duplicates = [baseline], {baseline['positions']}, 0
+        for record in sorted(rule_records[1:], key=sharpe, reverse=True):
+            if record['positions'] in seen:
+                duplicates += 1
+            elif len(shown) <= top:
+                shown.append(record)
+                seen.add(record['positions'])
+
+        print(f"== {rule} ({len(rule_records)} 个参数组合) ==")
+        print(f"{'夏普':>7} {'总收益':>10} {'最大回撤':>9} {'胜率':>8} {'年换手':>8}  参数")
+        for record in shown:
+            label = "（默认参数）" if record is baseline else ""
+            value = "-" if record['sharpe'] is None else f"{record['sharpe']:.2f}"
+            hit_rate = "-" if record['hit_rate'] is None else f"{record['hit_rate'] * 100:.2f}%"
+            print(f"{value:>7} {record['total_return'] * 100:>9.2f}% {record['max_drawdown'] * 100:>8.2f}% "
+                  f"{hit_rate:>8} {record['turnover']:>8.2f}  {json.dumps(record['params'], sort_keys=True)}{label}")
+        if duplicates:
+            print(f"另有 {duplicates} 个组合的仓位与已列出的组合完全相同")
+        if rule == 'recommendations':
+            print("注: 综合建议由最后判断的MACD规则主导，均线和RSI参数只通过 min_confidence 影响仓位")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="交易建议规则参数扫描")
+    parser.add_argument("--codes", default=None, help="逗号分隔的股票代码，默认使用跟踪列表")
+    parser.add_argument("--ktype", default="K_DAY", choices=list(PERIODS_PER_YEAR), help="K线周期")
+    parser.add_argument("--since", default=None, help="开始日期 YYYY-MM-DD，默认全部历史")
+    parser.add_argument("--until", default=None, help="结束日期 YYYY-MM-DD")
+    parser.add_argument("--cost", type=float, default=0.0, help="单边交易成本（基点）")
+    parser.add_argument("--allow-short", action="store_true", help="卖出信号做空（默认空仓）")
+    parser.add_argument("--search", default="grid", choices=["grid", "random"], help="网格遍历或随机抽样")
+    parser.add_argument("--samples", type=int, default=200, help="随机抽样的组合数量")
+    parser.add_argument("--seed", type=int, default=0, help="随机抽样的种子")
+    parser.add_argument("--grid", default=None, help="参数取值的JSON文件（参数名到候选值列表），默认使用内置网格")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为CPU核数")
+    parser.add_argument("--batch-size", type=int, default=50, help="每批回测的组合数量")
+    parser.add_argument("--results", default="sweep_results.jsonl", help="结果文件（JSONL，可断点续跑）")
+    parser.add_argument("--cache-dir", default=".sweep_cache", help="指标缓存目录")
+    parser.add_argument("--top", type=int, default=10, help="输出夏普比率最高的组合数量")
+    parser.add_argument("--synthetic", type=int, default=0, help="使用指定数量的随机行情代替数据库数据")
+    parser.add_argument("--bars", type=int, default=2520, help="随机行情每只股票的K线数量")
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid, encoding="utf-8") as f:
+            grid = json.load(f)
+    combos = generate_combinations(grid, args.search, args.samples, args.seed)
+
+    if args.synthetic:
+        history = synthetic_history(args.synthetic, args.bars)
+    else:
+        codes = [c.strip() for c in args.codes.split(",") if c.strip()] if args.codes else STOCKS_TO_TRACK
+        history = load_history(get_engine("default"), table_for_ktype(args.ktype), codes, args.since, args.until)
+        print(f"已加载 {len(history['code'])} 根K线")
+
+    records = run_sweep(history, combos, args.results, args.cache_dir, cost=args.cost / 10000.0,
+                        allow_short=args.allow_short, periods_per_year=PERIODS_PER_YEAR[args.ktype],
+                        workers=args.workers, batch_size=args.batch_size)
+    print_top(records, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
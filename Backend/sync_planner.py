@@ -0,0 +1,231 @@
+# Backend/sync_planner.py
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from futu import RET_OK, KLType, TradeDateMarket
+from config import SYNC_CONFIG
+from backfill import run_backfill_tasks
+
+# 股票代码前缀到交易日历市场的映射
+MARKET_BY_PREFIX = {
+    'HK': TradeDateMarket.HK,
+    'US': TradeDateMarket.US,
+    'SH': TradeDateMarket.CN,
+    'SZ': TradeDateMarket.CN,
+}
+
+
+def init_sync_state_table(conn):
+    """创建每只股票的同步水位表"""
+    conn.execute(text("""
+    CREATE TABLE IF NOT EXISTS stock_sync_state (
+        code VARCHAR(20) NOT NULL,
+        ktype VARCHAR(20) NOT NULL DEFAULT 'K_DAY',
+        last_bar_time TIMESTAMP,
+        synced_through DATE NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (code, ktype)
+    );
+    """))
+    conn.execute(text("""
+    ALTER TABLE stock_sync_state ADD COLUMN IF NOT EXISTS gap_checked_at DATE;
+    """))
+
+
+def load_watermarks(conn, codes, ktype='K_DAY'):
+    """
+    一次查询获取所有股票的同步水位
+
+    返回:
+    dict: 股票代码到 (synced_through, gap_checked_at) 的映射（没有水位的股票不在结果中）
+    """
+    result = conn.execute(text("""
+    SELECT code, synced_through, gap_checked_at FROM stock_sync_state
+    WHERE code = ANY(:codes) AND ktype = :ktype
+    """), {"codes": list(codes), "ktype": ktype})
+    return {row.code: (row.synced_through, row.gap_checked_at) for row in result}
+
+
+def load_stored_dates(conn, codes, since):
+    """
+    一次查询获取多只股票在回看窗口内已存储的K线日期
+
+    返回:
+    dict: 股票代码到日期集合的映射
+    """
+    result = conn.execute(text("""
+    SELECT DISTINCT code, time::date AS day FROM stock_price
+    WHERE code = ANY(:codes) AND time >= :since
+    """), {"codes": list(codes), "since": since})
+    stored = {}
+    for row in result:
+        stored.setdefault(row.code, set()).add(row.day)
+    return stored
+
+
+def get_trading_days(quote_ctx, market, start_date, end_date):
+    """
+    获取市场在区间内的交易日
+
+    返回:
+    list: 升序排列的 date 列表，获取失败时返回 None
+    """
+    try:
+        ret, data = quote_ctx.request_trading_days(market=market, start=start_date, end=end_date)
+        if ret != RET_OK:
+            print(f"获取 {market} 交易日历失败: {data}")
+            return None
+        return sorted(datetime.strptime(item['time'], "%Y-%m-%d").date() for item in data)
+    except Exception as e:
+        print(f"获取 {market} 交易日历时出错: {e}")
+        return None
+
+
+def group_missing_days(trading_days, stored_days, max_ranges):
+    """
+    将缺失的交易日合并为连续区间
+
+    参数:
+    trading_days (list): 升序交易日
+    stored_days (set): 已存储的日期
+    max_ranges (int): 区间数量上限，超过时合并为一个覆盖全部缺口的区间
+
+    返回:
+    list: (开始日期, 结束日期) 列表
+    """
+    ranges = []
+    current = None
+    for day in trading_days:
+        if day in stored_days:
+            if current:
+                ranges.append(tuple(current))
+                current = None
+        elif current:
+            current[1] = day
+        else:
+            current = [day, day]
+    if current:
+        ranges.append(tuple(current))
+
+    if len(ranges) > max_ranges:
+        ranges = [(ranges[0][0], ranges[-1][1])]
+    return ranges
+
+
+def plan_sync(engine, quote_ctx, codes, today=None):
+    """
+    计算每只股票需要获取的日期区间
+
+    - 有同步水位的股票从水位日期（含当天，覆盖可能未收盘的K线）获取到今天，
+      不论水位多旧都不截断（停机时间超过回看窗口时分页回填会补齐整段缺口）
+    - 没有水位的股票，以及距上次检查超过 gap_check_days 天的有水位股票，
+      在回看窗口内与交易日历比对，找出水位之前的所有缺口
+    - 完全没有数据的股票获取整个初始窗口
+
+    返回:
+    tuple: ((code, start_date, end_date) 任务列表，日期格式 YYYY-MM-DD；本次做过缺口检查的股票列表)
+    """
+    today = today or datetime.now().date()
+    lookback_start = today - timedelta(days=SYNC_CONFIG["lookback_days"])
+    gap_check_days = SYNC_CONFIG["gap_check_days"]
+    tasks = []
+
+    with engine.connect() as conn:
+        watermarks = load_watermarks(conn, codes)
+        unsynced = [code for code in codes if code not in watermarks]
+        due = [code for code, (_, checked) in watermarks.items()
+               if gap_check_days > 0 and (checked is None or checked <= today - timedelta(days=gap_check_days))]
+        stored = load_stored_dates(conn, unsynced + due, lookback_start) if unsynced or due else {}
+
+    for code, (synced_through, _) in watermarks.items():
+        tasks.append((code, synced_through.isoformat(), today.isoformat()))
+
+    calendars = {}
+    for code in unsynced + due:
+        stored_days = stored.get(code)
+        market = MARKET_BY_PREFIX.get(code.split('.')[0])
+        if code in watermarks:
+            # 水位之后的区间已在上面的任务中获取
+            if not stored_days or market is None:
+                continue
+            until = watermarks[code][0]
+        else:
+            if not stored_days or market is None:
+                tasks.append((code, lookback_start.isoformat(), today.isoformat()))
+                continue
+            until = None
+
+        if market not in calendars:
+            calendars[market] = get_trading_days(quote_ctx, market, lookback_start.isoformat(), today.isoformat())
+        trading_days = calendars[market]
+        if trading_days is None:
+            if until is None:
+                # 没有交易日历时从已存储的最后一天开始获取
+                tasks.append((code, max(stored_days).isoformat(), today.isoformat()))
+            continue
+
+        if until is not None:
+            trading_days = [day for day in trading_days if day < until]
+        for start, end in group_missing_days(trading_days, stored_days, SYNC_CONFIG["max_ranges_per_code"]):
+            tasks.append((code, start.isoformat(), end.isoformat()))
+
+    return tasks, unsynced + due
+
+
+def save_watermarks(engine, codes, synced_through, ktype='K_DAY', gap_checked=()):
+    """
+    更新同步成功的股票的水位（同时记录已存储的最后一根K线时间）
+
+    参数:
+    gap_checked (list): 本次做过缺口检查的股票，记录检查日期
+    """
+    if not codes:
+        return
+    with engine.connect() as conn:
+        conn.execute(text("""
+        INSERT INTO stock_sync_state (code, ktype, last_bar_time, synced_through, gap_checked_at, updated_at)
+        SELECT c.code, :ktype, p.last_bar_time, :synced_through,
+               CASE WHEN c.code = ANY(CAST(:gap_checked AS VARCHAR[])) THEN CAST(:synced_through AS DATE) END,
+               CURRENT_TIMESTAMP
+        FROM UNNEST(CAST(:codes AS VARCHAR[])) AS c(code)
+        LEFT JOIN LATERAL (
+            SELECT MAX(time) AS last_bar_time FROM stock_price
+            WHERE code = c.code AND time >= :since
+        ) p ON TRUE
+        ON CONFLICT (code, ktype) DO UPDATE SET
+            last_bar_time = COALESCE(EXCLUDED.last_bar_time, stock_sync_state.last_bar_time),
+            synced_through = GREATEST(EXCLUDED.synced_through, stock_sync_state.synced_through),
+            gap_checked_at = COALESCE(EXCLUDED.gap_checked_at, stock_sync_state.gap_checked_at),
+            updated_at = EXCLUDED.updated_at
+        """), {
+            "codes": list(codes),
+            "ktype": ktype,
+            "gap_checked": list(gap_checked),
+            "synced_through": synced_through,
+            "since": synced_through - timedelta(days=SYNC_CONFIG["lookback_days"])
+        })
+        conn.commit()
+
+
+def sync_stock_data(engine, quote_ctx, codes, concurrency=None, on_page=None):
+    """
+    增量同步：只获取每只股票缺失的日期区间，并在成功后推进水位
+
+    返回:
+    dict: {'tasks': 任务数, 'results': 成功结果列表, 'failed': 失败的股票代码及原因}
+    """
+    started = time.time()
+    today = datetime.now().date()
+    tasks, gap_checked = plan_sync(engine, quote_ctx, codes, today)
+    print(f"增量同步计划: {len(codes)} 支股票共 {len(tasks)} 个区间")
+
+    results, failed = run_backfill_tasks(quote_ctx, engine, tasks, concurrency, KLType.K_DAY, on_page)
+
+    # 所有区间都成功的股票才推进水位
+    synced = [code for code in codes if code not in failed]
+    save_watermarks(engine, synced, today, gap_checked=[code for code in gap_checked if code not in failed])
+
+    total_rows = sum(r['rows'] for r in results)
+    print(f"增量同步完成: {len(synced)} 支成功, {len(failed)} 支失败, 共 {total_rows} 条记录, "
+          f"耗时 {time.time() - started:.1f}秒")
+    return {'tasks': len(tasks), 'results': results, 'failed': failed}
@@ -0,0 +1,78 @@
+# Backend/test_backtest.py
+"""
+回测函数测试：仓位、收益、交易统计和绩效指标用手工构造的数组检查，
+综合建议规则与 AI 分析器逐根K线的建议对比
+
+运行: python -m pytest test_backtest.py
+"""
+import numpy as np
+import pytest
+
+# backtest 和 stock_ai_analyzer 在模块级导入数据库、Redis 和配置
+try:
+    from backtest import hold_positions, simulate, trade_stats, performance, rule_positions
+    from stock_ai_analyzer import StockAIAnalyzer
+except ImportError as e:
+    pytest.skip(f"缺少依赖: {e}", allow_module_level=True)
+
+
+def test_hold_positions_keeps_last_signal():
+    enter = np.array([False, True, False, False, False, True, False])
+    leave = np.array([False, False, False, True, False, False, False])
+    np.testing.assert_array_equal(hold_positions(enter, leave), [0, 1, 1, 0, 0, 1, 1])
+    np.testing.assert_array_equal(hold_positions(enter, leave, -1.0), [0, 1, 1, -1, -1, 1, 1])
+
+
+def test_hold_positions_buy_wins_on_same_bar():
+    enter = np.array([True, True, False])
+    leave = np.array([False, True, True])
+    np.testing.assert_array_equal(hold_positions(enter, leave), [1, 1, 0])
+
+
+def test_simulate_round_trip():
+    # 第1根K线收盘买入，第3根K线收盘卖出：持有两根K线，收益 10% 后 -5%
+    close = np.array([100.0, 100.0, 110.0, 104.5, 120.0])
+    position = np.array([0.0, 1.0, 1.0, 0.0, 0.0])
+    gross, net, turnover = simulate(close, position, cost=0.001)
+    np.testing.assert_allclose(gross, [0, 0, 0.1, -0.05, 0])
+    np.testing.assert_array_equal(turnover, [0, 1, 0, 1, 0])
+    np.testing.assert_allclose(net, [0, -0.001, 0.1, -0.051, 0])
+    assert np.prod(1 + gross) - 1 == pytest.approx(0.045)
+
+
+def test_trade_stats_counts_trades_and_winners():
+    close = np.array([100.0, 100.0, 110.0, 104.5, 100.0, 90.0, 95.0])
+    position = np.array([0.0, 1.0, 1.0, 0.0, 1.0, 0.0, 0.0])
+    gross, _, _ = simulate(close, position)
+    # 第一笔 +4.5%，第二笔 -10%
+    assert trade_stats(position, gross) == (2, 1)
+    assert trade_stats(np.zeros(4), np.zeros(4)) == (0, 0)
+
+
+def test_performance_drawdown():
+    # 资金曲线 1.1 -> 1.21 -> 0.968 -> 1.0648：最大回撤为 0.968 / 1.21 - 1 = -20%
+    returns = np.array([0.1, 0.1, -0.2, 0.1])
+    result = performance(returns, periods_per_year=4)
+    assert result['total_return'] == pytest.approx(0.0648)
+    assert result['annual_return'] == pytest.approx(0.0648)
+    assert result['max_drawdown'] == pytest.approx(-0.2)
+    assert result['annual_volatility'] == pytest.approx(returns.std(ddof=1) * 2)
+    assert performance(np.array([]), 252)['max_drawdown'] == 0.0
+
+
+def test_recommendations_rule_matches_analyzer():
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1.5, 120))
+    volume = rng.integers(1000, 5000, len(close)).astype(np.float64)
+
+    # 每根K线收盘时分析器只看到截至该K线的数据
+    analyzer = StockAIAnalyzer.__new__(StockAIAnalyzer)
+    actions = []
+    for end in range(1, len(close) + 1):
+        analysis = analyzer._perform_technical_analysis(close[:end], volume[:end])
+        actions.append(analyzer._generate_recommendations(close[:end], analysis)['action'])
+    actions = np.array(actions)
+    assert {'BUY', 'SELL'} <= set(actions)
+
+    expected = hold_positions(actions == 'BUY', actions == 'SELL')
+    np.testing.assert_array_equal(rule_positions(close, volume)['recommendations'], expected)
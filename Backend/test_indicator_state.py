@@ -0,0 +1,75 @@
+# Backend/test_indicator_state.py
+"""
+增量指标状态回归测试：查询窗口每天前移一根K线时，增量结果与对窗口完整计算的结果相同
+
+运行: python -m pytest test_indicator_state.py
+"""
+import numpy as np
+import pytest
+from indicator_state import IndicatorState, IndicatorStateStore
+
+
+def make_bars(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    volume = rng.integers(1000, 5000, n).astype(float)
+    return close, volume
+
+
+def bar_times(start, stop):
+    return f"t{start:04d}", f"t{stop - 2:04d}" if stop - start > 1 else None, f"t{stop - 1:04d}"
+
+
+def assert_same_analysis(actual, expected):
+    assert actual.keys() == expected.keys()
+    for field, value in expected.items():
+        if value is None:
+            assert actual[field] is None, field
+        else:
+            assert actual[field] == pytest.approx(value, rel=1e-9, abs=1e-9), field
+
+
+@pytest.mark.parametrize("window", [3, 8, 15, 16, 21, 61, 125])
+def test_sliding_window_matches_full_rebuild(window):
+    close, volume = make_bars()
+    store = IndicatorStateStore()
+    for stop in range(window, len(close)):
+        start = stop - window
+        times = bar_times(start, stop)
+        state = store.sync("K_DAY:US.TEST:30", times, close[start:stop], volume[start:stop])
+        expected = IndicatorState.from_bars("expected", times[0], times[2], close[start:stop], volume[start:stop])
+        assert state.count == window
+        assert_same_analysis(state.analysis(), expected.analysis())
+
+    stats = store.stats()
+    assert stats['rebuilds'] == 1
+    assert stats['rebases'] == len(close) - window - 1
+
+
+def test_window_start_skips_several_bars():
+    # 节假日后窗口起点一次前移多根K线，同时当天K线在盘中被更新
+    close, volume = make_bars(seed=1)
+    store = IndicatorStateStore()
+    store.sync("key", bar_times(0, 125), close[:125], volume[:125])
+    store.sync("key", bar_times(3, 126), close[3:126], volume[3:126])
+    live = close[3:126].copy()
+    live[-1] += 0.5
+    state = store.sync("key", bar_times(3, 126), live, volume[3:126])
+    expected = IndicatorState.from_bars("expected", "t0003", "t0125", live, volume[3:126])
+    assert_same_analysis(state.analysis(), expected.analysis())
+    stats = store.stats()
+    assert (stats['rebuilds'], stats['rebases'], stats['appends'], stats['replaces']) == (1, 1, 1, 1)
+
+
+def test_rewritten_history_rebuilds():
+    close, volume = make_bars(seed=2)
+    store = IndicatorStateStore()
+    store.sync("key", bar_times(0, 100), close[:100], volume[:100])
+    rewritten = close[1:101].copy()
+    rewritten[2] += 1.0
+    state = store.sync("key", bar_times(1, 101), rewritten, volume[1:101])
+    expected = IndicatorState.from_bars("expected", "t0001", "t0100", rewritten, volume[1:101])
+    assert_same_analysis(state.analysis(), expected.analysis())
+    stats = store.stats()
+    assert stats['rebuilds'] == 2
+    assert stats['rebuild_rate'] == 1.0
@@ -0,0 +1,91 @@
+# Backend/test_indicators.py
+"""
+指标内核回归测试：与分析器原先的 pandas 计算对比，包括开头和中间的 NaN
+
+运行: python -m pytest test_indicators.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from indicators import sma, ema, rsi, macd, RSI_WILDER
+
+
+def make_close(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 + np.cumsum(rng.normal(0, 1, n))
+
+
+def with_gaps(close):
+    close = close.copy()
+    close[:5] = np.nan        # 上市前没有数据
+    close[120] = np.nan       # 缺失单个收盘价
+    close[250:254] = np.nan   # 连续缺失
+    return close
+
+
+def pandas_rsi(close, period):
+    delta = pd.Series(close).diff()
+    gain = delta.where(delta > 0, 0).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    return (100 - 100 / (1 + gain / loss)).values
+
+
+def assert_matches(actual, expected):
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("gaps", [False, True])
+@pytest.mark.parametrize("window", [5, 20, 60])
+def test_sma_matches_rolling_mean(gaps, window):
+    close = with_gaps(make_close()) if gaps else make_close()
+    assert_matches(sma(close, window), pd.Series(close).rolling(window).mean().values)
+
+
+@pytest.mark.parametrize("gaps", [False, True])
+@pytest.mark.parametrize("span", [5, 12, 26])
+def test_ema_matches_ewm(gaps, span):
+    close = with_gaps(make_close()) if gaps else make_close()
+    assert_matches(ema(close, span), pd.Series(close).ewm(span=span, adjust=False).mean().values)
+
+
+def test_ema_long_series_matches_ewm():
+    # 跨越多个递推分块
+    close = with_gaps(make_close(20000, seed=1))
+    assert_matches(ema(close, 9), pd.Series(close).ewm(span=9, adjust=False).mean().values)
+
+
+@pytest.mark.parametrize("gaps", [False, True])
+def test_rsi_matches_pandas(gaps):
+    close = with_gaps(make_close()) if gaps else make_close()
+    assert_matches(rsi(close, 14), pandas_rsi(close, 14))
+
+
+@pytest.mark.parametrize("gaps", [False, True])
+def test_macd_matches_pandas(gaps):
+    close = with_gaps(make_close()) if gaps else make_close()
+    series = pd.Series(close)
+    line = (series.ewm(span=12, adjust=False).mean() - series.ewm(span=26, adjust=False).mean())
+    signal = line.ewm(span=9, adjust=False).mean()
+    actual_line, actual_signal, histogram = macd(close)
+    assert_matches(actual_line, line.values)
+    assert_matches(actual_signal, signal.values)
+    assert_matches(histogram, (line - signal).values)
+
+
+def test_columns_match_single_series():
+    # 二维输入每列独立计算，列之间的起点和缺口互不影响
+    first = with_gaps(make_close(seed=2))
+    second = make_close(seed=3)
+    second[:40] = np.nan
+    panel = np.column_stack([first, second])
+    for column, close in enumerate((first, second)):
+        assert_matches(sma(panel, 20)[:, column], sma(close, 20))
+        assert_matches(ema(panel, 12)[:, column], ema(close, 12))
+        assert_matches(macd(panel)[1][:, column], macd(close)[1])
+
+
+def test_wilder_rsi_bounds():
+    values = rsi(make_close(), 14, method=RSI_WILDER)
+    assert np.isnan(values[:14]).all()
+    assert ((values[14:] >= 0) & (values[14:] <= 100)).all()
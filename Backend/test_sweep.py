@@ -0,0 +1,67 @@
+# Backend/test_sweep.py
+"""
+参数扫描测试：回测单元去重、默认参数下与 backtest.rule_positions 一致、结果文件的续跑读取
+
+运行: python -m pytest test_sweep.py
+"""
+import json
+import numpy as np
+import pytest
+
+from panel import PricePanel, DEFAULT_RULE_PARAMS
+
+# sweep 通过 backtest 在模块级导入数据库和配置
+try:
+    from backtest import rule_positions
+    from sweep import SWEEP_RULES, rule_units, unit_positions, load_results
+except ImportError as e:
+    pytest.skip(f"缺少依赖: {e}", allow_module_level=True)
+
+
+def test_rule_units_collapse_unused_parameters():
+    # 两个组合只有 RSI 的置信度不同：单条规则都不依赖该参数，只有综合建议多出一个单元
+    base = {'ma_periods': [5, 10, 20, 30, 60], 'rsi_overbought': 70, 'rsi_oversold': 30, 'rsi_confidence': 0.65}
+    units = rule_units([base, {**base, 'rsi_confidence': 0.7}])
+    assert len(units) == len(SWEEP_RULES) + 1
+    assert [rule for _, rule, _ in units].count('recommendations') == 2
+    assert len({key for key, _, _ in units}) == len(units)
+
+    # 只改变均线周期：RSI 规则不变
+    units = rule_units([base, {**base, 'ma_periods': [3, 8, 21, 34, 55]}])
+    assert [rule for _, rule, _ in units].count('rsi') == 1
+    assert [rule for _, rule, _ in units].count('ma_alignment') == 2
+
+
+@pytest.mark.parametrize("allow_short", [False, True])
+def test_default_params_match_rule_positions(allow_short):
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1.5, 300))
+    volume = rng.integers(1000, 5000, len(close)).astype(np.float64)
+    panel = PricePanel([None], close[:, None], volume[:, None], [None])
+    values = {name: matrix[:, 0] for name, matrix in panel.indicators().items()}
+    values['latest_price'] = close
+
+    expected = rule_positions(close, volume, allow_short)
+    exit_position = -1.0 if allow_short else 0.0
+    levels = {}
+    for rule in SWEEP_RULES:
+        actual = unit_positions(rule, dict(DEFAULT_RULE_PARAMS), values, exit_position, levels)
+        np.testing.assert_array_equal(actual, expected[rule], err_msg=rule)
+
+
+def test_load_results_skips_truncated_line_and_other_context(tmp_path):
+    path = tmp_path / "results.jsonl"
+    context = {'version': 2, 'data': 'abc', 'cost': 0.0}
+    records = [
+        {'key': 'a', 'context': context, 'sharpe': 1.0},
+        {'key': 'b', 'context': {**context, 'data': 'other'}, 'sharpe': 2.0},
+        {'key': 'c', 'context': context, 'sharpe': 3.0},
+    ]
+    lines = [json.dumps(record) for record in records]
+    # 写入时被中断的最后一行
+    path.write_text("\n".join(lines) + "\n" + lines[0][:20], encoding="utf-8")
+
+    results = load_results(str(path), context)
+    assert sorted(results) == ['a', 'c']
+    assert results['c']['sharpe'] == 3.0
+    assert load_results(str(tmp_path / "missing.jsonl"), context) == {}
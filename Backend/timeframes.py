@@ -0,0 +1,201 @@
+# Backend/timeframes.py
+from sqlalchemy import text
+
+# 各周期K线的存储位置
+# - K_1M 由Futu推送和回填写入独立的超表
+# - K_DAY 由Futu日K写入 stock_price（日K历史远比分钟K完整）
+# - 其他周期由TimescaleDB连续聚合从上述两张表生成，不再单独请求Futu
+#
+# Futu分钟K线按结束时间标记（09:31 是 09:30-09:31 的K线），分钟周期的分桶因此偏移1分钟，
+# 使 09:31-09:35 的K线落在同一个5分钟桶；60分钟桶再偏移30分钟，与09:30开盘对齐
+# （午休后的下午时段仍按开盘对齐，与Futu自身的60分钟K线可能不同）。
+# 带 label 的周期在连续聚合 {table}_agg 中按桶起点存储，{table} 视图将时间标记为桶的结束时间。
+TIMEFRAMES = {
+    'K_1M': {'table': 'stock_price_1m'},
+    'K_5M': {'table': 'stock_price_5m', 'source': 'stock_price_1m', 'bucket': '5 minutes',
+             'offset': '1 minute', 'label': '4 minutes',
+             'refresh_start': '1 day', 'refresh_end': '1 minute', 'schedule': '1 minute'},
+    'K_15M': {'table': 'stock_price_15m', 'source': 'stock_price_1m', 'bucket': '15 minutes',
+              'offset': '1 minute', 'label': '14 minutes',
+              'refresh_start': '1 day', 'refresh_end': '1 minute', 'schedule': '5 minutes'},
+    'K_60M': {'table': 'stock_price_60m', 'source': 'stock_price_1m', 'bucket': '60 minutes',
+              'offset': '31 minutes', 'label': '59 minutes',
+              'refresh_start': '3 days', 'refresh_end': '1 minute', 'schedule': '15 minutes'},
+    'K_DAY': {'table': 'stock_price'},
+    'K_WEEK': {'table': 'stock_price_1w', 'source': 'stock_price', 'bucket': '1 week',
+               'refresh_start': '1 month', 'refresh_end': '1 day', 'schedule': '1 hour'},
+}
+
+# 原始写入的周期（其余为连续聚合）
+RAW_KTYPES = ('K_1M', 'K_DAY')
+
+
+def table_for_ktype(ktype):
+    """
+    获取周期对应的表或视图名称
+
+    参数:
+    ktype: 周期名称（如 "K_1M"）或 futu.KLType 常量
+
+    返回:
+    str: 表名，不支持的周期抛出 ValueError
+    """
+    timeframe = TIMEFRAMES.get(str(ktype))
+    if timeframe is None:
+        raise ValueError(f"不支持的K线周期: {ktype}")
+    return timeframe['table']
+
+
+def aggregate_name(timeframe):
+    """
+    获取周期的连续聚合名称（需要重新标记时间的周期，聚合与对外的视图分开）
+
+    返回:
+    str: 连续聚合视图名
+    """
+    return f"{timeframe['table']}_agg" if 'label' in timeframe else timeframe['table']
+
+
+def interval_seconds(interval):
+    """
+    将 '5 minutes'、'1 hour' 形式的间隔转换为秒数
+
+    返回:
+    int: 秒数
+    """
+    count, unit = interval.split()
+    unit = unit.rstrip('s')
+    return int(count) * {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400, 'week': 604800}[unit]
+
+
+def cache_ttl_for_ktype(ktype):
+    """
+    获取周期的响应缓存过期时间
+
+    连续聚合在源表写入后按刷新计划才物化，而数据版本在写入时就已递增，
+    刷新前缓存的结果不能一直使用到兜底过期时间，因此不超过一个刷新周期。
+
+    返回:
+    int: 秒数，原始写入的周期返回None（只依赖数据版本失效）
+    """
+    timeframe = TIMEFRAMES.get(str(ktype), {})
+    if 'schedule' not in timeframe:
+        return None
+    return interval_seconds(timeframe['schedule'])
+
+
+def init_timeframe_tables(engine, minute_chunk_interval='1 day'):
+    """
+    创建分钟K线超表和各周期的连续聚合（可重复执行）
+
+    参数:
+    engine: 数据库引擎
+    minute_chunk_interval (str): 分钟K线超表的分块时间间隔
+    """
+    with engine.connect() as conn:
+        _create_minute_table(conn, minute_chunk_interval)
+
+    # 连续聚合不能在事务中创建
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for ktype, timeframe in TIMEFRAMES.items():
+            if 'source' not in timeframe:
+                continue
+            try:
+                _create_continuous_aggregate(conn, timeframe)
+            except Exception as e:
+                print(f"创建 {ktype} 连续聚合时出错: {e}")
+
+
+def _create_minute_table(conn, chunk_interval):
+    conn.execute(text("""
+    CREATE TABLE IF NOT EXISTS stock_price_1m (
+        time TIMESTAMP NOT NULL,
+        code VARCHAR(20) NOT NULL,
+        open NUMERIC(19, 4),
+        close NUMERIC(19, 4),
+        high NUMERIC(19, 4),
+        low NUMERIC(19, 4),
+        volume BIGINT,
+        turnover NUMERIC(19, 4),
+        PRIMARY KEY (time, code)
+    );
+    """))
+    conn.execute(text("""
+    SELECT create_hypertable('stock_price_1m', 'time',
+                             chunk_time_interval => CAST(:interval AS INTERVAL),
+                             if_not_exists => TRUE);
+    """), {"interval": chunk_interval})
+    conn.commit()
+
+
+def _create_continuous_aggregate(conn, timeframe):
+    table = timeframe['table']
+    aggregate = aggregate_name(timeframe)
+    if aggregate != table and conn.execute(text("""
+    SELECT 1 FROM timescaledb_information.continuous_aggregates WHERE view_name = :table
+    """), {"table": table}).fetchone():
+        # 旧版本直接以表名创建的连续聚合分桶边界不对，删除后按新定义重建
+        conn.execute(text(f"DROP MATERIALIZED VIEW {table} CASCADE"))
+        print(f"已删除旧的 {table} 连续聚合，重建后需调用 refresh_timeframe_aggregates 补齐历史数据")
+
+    bucket = f"time_bucket(INTERVAL '{timeframe['bucket']}', time"
+    if 'offset' in timeframe:
+        bucket += f", INTERVAL '{timeframe['offset']}'"
+    bucket += ")"
+    bucket_column = 'bucket' if aggregate != table else 'time'
+
+    # materialized_only = false：查询时合并尚未物化的最新数据（TimescaleDB 2.13起默认只返回已物化部分），
+    # 当前未结束的周期和刷新间隔内的新K线也能查到
+    conn.execute(text(f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {aggregate}
+    WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+    SELECT {bucket} AS {bucket_column},
+           code,
+           first(open, time) AS open,
+           last(close, time) AS close,
+           max(high) AS high,
+           min(low) AS low,
+           sum(volume) AS volume,
+           sum(turnover) AS turnover
+    FROM {timeframe['source']}
+    GROUP BY {bucket}, code
+    WITH NO DATA;
+    """))
+    # 已存在的聚合不会被 IF NOT EXISTS 修改
+    conn.execute(text(f"ALTER MATERIALIZED VIEW {aggregate} SET (timescaledb.materialized_only = false)"))
+    conn.execute(text(f"""
+    SELECT add_continuous_aggregate_policy('{aggregate}',
+        start_offset => INTERVAL '{timeframe['refresh_start']}',
+        end_offset => INTERVAL '{timeframe['refresh_end']}',
+        schedule_interval => INTERVAL '{timeframe['schedule']}',
+        if_not_exists => TRUE);
+    """))
+
+    if aggregate != table:
+        conn.execute(text(f"""
+        CREATE OR REPLACE VIEW {table} AS
+        SELECT bucket + INTERVAL '{timeframe['label']}' AS time,
+               code, open, close, high, low, volume, turnover
+        FROM {aggregate};
+        """))
+
+
+def refresh_timeframe_aggregates(engine, start=None, end=None):
+    """
+    手动刷新所有连续聚合（大批量回填后调用，使聚合立即包含历史数据）
+
+    参数:
+    engine: 数据库引擎
+    start (datetime): 刷新起点，None表示最早
+    end (datetime): 刷新终点，None表示最新
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for ktype, timeframe in TIMEFRAMES.items():
+            if 'source' not in timeframe:
+                continue
+            try:
+                conn.execute(text("CALL refresh_continuous_aggregate(CAST(:view AS REGCLASS), "
+                                  "CAST(:start AS TIMESTAMP), CAST(:end AS TIMESTAMP))"),
+                             {"view": aggregate_name(timeframe), "start": start, "end": end})
+            except Exception as e:
+                print(f"刷新 {ktype} 连续聚合时出错: {e}")
@@ -0,0 +1,246 @@
+# Backend/timescale_policy.py
+import argparse
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from config import TIMESCALE_POLICY_CONFIG
+from db_engine import get_engine
+
+# stock_summary 的行数和最早时间随写入增量累加，不能与删除数据的保留策略同时使用
+SUMMARY_SOURCE_TABLE = "stock_price"
+
+
+def _hypertable_info(conn, table):
+    """
+    查询超表或连续聚合的当前设置
+
+    返回:
+    dict: {'kind': 'hypertable'/'cagg', 'compression_enabled': bool, 'job_table': 策略任务所属的超表名}，
+        表不存在时返回None。连续聚合的策略任务记录在其物化超表（_materialized_hypertable_N）上
+    """
+    row = conn.execute(text("""
+    SELECT compression_enabled FROM timescaledb_information.hypertables
+    WHERE hypertable_name = :table
+    """), {"table": table}).fetchone()
+    if row is not None:
+        return {'kind': 'hypertable', 'compression_enabled': bool(row.compression_enabled), 'job_table': table}
+
+    row = conn.execute(text("""
+    SELECT compression_enabled, materialization_hypertable_name
+    FROM timescaledb_information.continuous_aggregates
+    WHERE view_name = :table
+    """), {"table": table}).fetchone()
+    if row is not None:
+        return {'kind': 'cagg', 'compression_enabled': bool(row.compression_enabled),
+                'job_table': row.materialization_hypertable_name}
+    return None
+
+
+def _job_setting(conn, table, proc_name, key):
+    """获取某个超表上已有策略任务的配置值，没有任务时返回None（连续聚合传入其物化超表名）"""
+    row = conn.execute(text("""
+    SELECT config ->> :key AS value FROM timescaledb_information.jobs
+    WHERE hypertable_name = :table AND proc_name = :proc_name
+    LIMIT 1
+    """), {"table": table, "proc_name": proc_name, "key": key}).fetchone()
+    return row.value if row else None
+
+
+def _interval_equals(conn, current, wanted):
+    if current is None or wanted is None:
+        return current is None and wanted is None
+    return bool(conn.execute(text("SELECT CAST(:a AS INTERVAL) = CAST(:b AS INTERVAL)"),
+                             {"a": current, "b": wanted}).scalar())
+
+
+def apply_table_policy(conn, table, policy):
+    """
+    对单个超表或连续聚合应用分块、压缩和保留策略（可重复执行）
+
+    参数:
+    conn: 自动提交模式的数据库连接
+    table (str): 表名或连续聚合视图名
+    policy (dict): {'chunk_interval', 'compress_after', 'retention'}，值为None表示不设置
+    """
+    info = _hypertable_info(conn, table)
+    if info is None:
+        print(f"跳过 {table}: 不是超表或连续聚合")
+        return
+
+    # 分块间隔只影响新建的分块
+    if policy.get('chunk_interval') and info['kind'] == 'hypertable':
+        conn.execute(text("SELECT set_chunk_time_interval(CAST(:table AS REGCLASS), CAST(:interval AS INTERVAL))"),
+                     {"table": table, "interval": policy['chunk_interval']})
+
+    # 原生压缩：按股票代码分段，段内按时间倒序，符合API按代码查询最近数据的访问方式
+    compress_after = policy.get('compress_after')
+    if compress_after:
+        if not info['compression_enabled']:
+            if info['kind'] == 'hypertable':
+                conn.execute(text(f"""
+                ALTER TABLE {table} SET (
+                    timescaledb.compress,
+                    timescaledb.compress_segmentby = 'code',
+                    timescaledb.compress_orderby = 'time DESC'
+                )
+                """))
+            else:
+                conn.execute(text(f"ALTER MATERIALIZED VIEW {table} SET (timescaledb.compress = true)"))
+        current = _job_setting(conn, info['job_table'], 'policy_compression', 'compress_after')
+        if not _interval_equals(conn, current, compress_after):
+            conn.execute(text("SELECT remove_compression_policy(CAST(:table AS REGCLASS), if_exists => TRUE)"),
+                         {"table": table})
+            conn.execute(text("SELECT add_compression_policy(CAST(:table AS REGCLASS), CAST(:after AS INTERVAL))"),
+                         {"table": table, "after": compress_after})
+    else:
+        conn.execute(text("SELECT remove_compression_policy(CAST(:table AS REGCLASS), if_exists => TRUE)"),
+                     {"table": table})
+
+    # 数据保留策略
+    retention = policy.get('retention')
+    current = _job_setting(conn, info['job_table'], 'policy_retention', 'drop_after')
+    if not _interval_equals(conn, current, retention):
+        conn.execute(text("SELECT remove_retention_policy(CAST(:table AS REGCLASS), if_exists => TRUE)"),
+                     {"table": table})
+        if retention:
+            conn.execute(text("SELECT add_retention_policy(CAST(:table AS REGCLASS), CAST(:after AS INTERVAL))"),
+                         {"table": table, "after": retention})
+
+    print(f"已应用 {table} 的存储策略: 分块 {policy.get('chunk_interval') or '默认'}, "
+          f"压缩 {compress_after or '不压缩'}, 保留 {retention or '永久'}")
+
+
+def apply_timescale_policies(engine, policies=None):
+    """
+    按配置对所有K线表应用TimescaleDB存储策略（系统启动时调用）
+
+    参数:
+    engine: 数据库引擎
+    policies (dict): 表名到策略的映射，默认使用 TIMESCALE_POLICY_CONFIG
+    """
+    policies = policies or TIMESCALE_POLICY_CONFIG
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table, policy in policies.items():
+            if table == SUMMARY_SOURCE_TABLE and policy.get('retention'):
+                print(f"忽略 {table} 的保留策略 {policy['retention']}: stock_summary 的统计假设该表数据不会被删除")
+                policy = dict(policy, retention=None)
+            try:
+                apply_table_policy(conn, table, policy)
+            except Exception as e:
+                print(f"应用 {table} 的存储策略时出错: {e}")
+
+
+def _time_range_query(conn, table, code, start, end, repeat=3):
+    """执行API使用的区间查询，返回最短耗时（毫秒）和行数"""
+    query = text(f"""
+    SELECT time, code, open, close, high, low, volume, turnover
+    FROM {table}
+    WHERE code = :code AND time BETWEEN :start_date AND :end_date
+    ORDER BY time
+    """)
+    best, rows = None, 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(conn.execute(query, {"code": code, "start_date": start, "end_date": end}).fetchall())
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows
+
+
+def compression_report(engine, tables=None, sample_code=None, window_days=90):
+    """
+    生成压缩效果报告
+
+    包括每个表压缩前后的大小，以及API区间查询分别落在未压缩（最近）和已压缩（较早）数据上的耗时。
+
+    参数:
+    engine: 数据库引擎
+    tables (list): 要报告的表，默认所有配置了压缩的表
+    sample_code (str): 用于测量查询耗时的股票代码，默认取数据最多的一只
+    window_days (int): 查询窗口天数
+
+    返回:
+    list: 每个表的报告字典
+    """
+    tables = tables or [t for t, p in TIMESCALE_POLICY_CONFIG.items() if p.get('compress_after')]
+    report = []
+
+    with engine.connect() as conn:
+        for table in tables:
+            info = _hypertable_info(conn, table)
+            if info is None or info['kind'] != 'hypertable':
+                continue
+            entry = {'table': table, 'compression_enabled': info['compression_enabled']}
+
+            if info['compression_enabled']:
+                stats = conn.execute(text("""
+                SELECT COALESCE(SUM(before_compression_total_bytes), 0) AS before_bytes,
+                       COALESCE(SUM(after_compression_total_bytes), 0) AS after_bytes,
+                       COUNT(*) FILTER (WHERE compression_status = 'Compressed') AS compressed_chunks,
+                       COUNT(*) AS total_chunks
+                FROM chunk_compression_stats(CAST(:table AS REGCLASS))
+                """), {"table": table}).fetchone()
+                entry.update({
+                    'compressed_chunks': stats.compressed_chunks,
+                    'total_chunks': stats.total_chunks,
+                    'before_bytes': int(stats.before_bytes),
+                    'after_bytes': int(stats.after_bytes),
+                    'ratio': (stats.before_bytes / stats.after_bytes) if stats.after_bytes else None,
+                })
+            entry['total_bytes'] = conn.execute(
+                text("SELECT hypertable_size(CAST(:table AS REGCLASS))"), {"table": table}
+            ).scalar()
+
+            code = sample_code or conn.execute(text(f"""
+            SELECT code FROM {table} WHERE time > now() - INTERVAL '30 days'
+            GROUP BY code ORDER BY COUNT(*) DESC LIMIT 1
+            """)).scalar()
+            compress_after = TIMESCALE_POLICY_CONFIG.get(table, {}).get('compress_after')
+            if code and compress_after:
+                # 最近窗口落在未压缩分块上，压缩阈值之前的窗口落在已压缩分块上
+                boundary = conn.execute(text("SELECT CAST(now() - CAST(:after AS INTERVAL) AS TIMESTAMP)"),
+                                        {"after": compress_after}).scalar()
+                now = datetime.now()
+                hot_ms, hot_rows = _time_range_query(conn, table, code, now - timedelta(days=window_days), now)
+                cold_end = boundary - timedelta(days=1)
+                cold_ms, cold_rows = _time_range_query(conn, table, code, cold_end - timedelta(days=window_days), cold_end)
+                entry['query'] = {
+                    'code': code,
+                    'window_days': window_days,
+                    'uncompressed_ms': hot_ms,
+                    'uncompressed_rows': hot_rows,
+                    'compressed_ms': cold_ms,
+                    'compressed_rows': cold_rows,
+                }
+            report.append(entry)
+
+    return report
+
+
+def print_compression_report(report):
+    for entry in report:
+        print(f"== {entry['table']} ==")
+        if entry.get('ratio'):
+            print(f"  压缩分块: {entry['compressed_chunks']}/{entry['total_chunks']}, "
+                  f"压缩前 {entry['before_bytes'] / 1024 / 1024:.1f}MB, 压缩后 {entry['after_bytes'] / 1024 / 1024:.1f}MB, "
+                  f"压缩比 {entry['ratio']:.1f}x")
+        print(f"  当前总大小: {(entry['total_bytes'] or 0) / 1024 / 1024:.1f}MB")
+        query = entry.get('query')
+        if query:
+            print(f"  {query['code']} {query['window_days']}天区间查询: "
+                  f"未压缩 {query['uncompressed_ms']:.2f}ms ({query['uncompressed_rows']} 行), "
+                  f"已压缩 {query['compressed_ms']:.2f}ms ({query['compressed_rows']} 行)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TimescaleDB 存储策略管理")
+    parser.add_argument("--apply", action="store_true", help="按配置应用分块、压缩和保留策略")
+    parser.add_argument("--report", action="store_true", help="输出压缩效果和区间查询耗时报告")
+    parser.add_argument("--code", default=None, help="用于测量查询耗时的股票代码")
+    args = parser.parse_args()
+
+    engine = get_engine("default")
+    if args.apply:
+        apply_timescale_policies(engine)
+    if args.report or not args.apply:
+        print_compression_report(compression_report(engine, sample_code=args.code))
@@ -1,7 +1,7 @@
 // frontend/src/app/analysis/[stockCode]/page.tsx
 'use client';
 
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useParams } from 'next/navigation';
 import { 
   Card, 
@@ -19,11 +19,15 @@ import { formatDate, formatStockCodeName } from '@/lib/utils';
 import { DaySelector } from '@/components/forms/DaySelector';
 import { useStockData, useStockAllData, useStockNames } from '@/hooks/useStocks';
 import { useRealtimeAnalysis } from '@/hooks/useAnalysis';
+import { useRealtimeQuotes } from '@/hooks/useRealtime';
 import { StockPriceChart } from '@/components/charts/StockPriceChart';
 import { MovingAverageChart } from '@/components/charts/MovingAverageChart';
 import { VolumeChart } from '@/components/charts/VolumeChart';
 import { AnalysisResultComponent } from '@/components/stocks/AnalysisResult';
 import { RecommendationCard } from '@/components/stocks/RecommendationCard';
+import { DownsampleOptions } from '@/lib/types';
+
+const ALL_DATA_DOWNSAMPLE: DownsampleOptions = { max_points: 500, downsample: 'lttb' };
 
 export default function StockAnalysisPage() {
   const params = useParams();
@@ -41,11 +45,11 @@ export default function StockAnalysisPage() {
     isRefetching: isRefetchingStock 
   } = useStockData(stockCode, selectedDays);
   
-  // 获取所有股票数据和基本信息
+  // 获取所有股票数据和基本信息（历史数据在服务端降采样到图表宽度，数据量不随历史长度增长）
   const { 
     data: allStockData, 
     isLoading: isLoadingAllStock 
-  } = useStockAllData(stockCode);
+  } = useStockAllData(stockCode, ALL_DATA_DOWNSAMPLE);
   
   // 获取实时分析
   const { 
@@ -55,6 +59,18 @@ export default function StockAnalysisPage() {
     isRefetching: isRefetchingRealtime
   } = useRealtimeAnalysis(stockCode);
   
+  // 订阅实时价格，推荐级别变化时重新获取实时分析
+  const quote = useRealtimeQuotes([stockCode])[stockCode];
+  const analyzedLevel = realtimeAnalysis?.analysis?.recommendations?.recommendation_level;
+  const requestedLevel = useRef<number | undefined>(undefined);
+  useEffect(() => {
+    if (quote?.l === undefined || analyzedLevel === undefined) return;
+    if (quote.l !== analyzedLevel && quote.l !== requestedLevel.current) {
+      requestedLevel.current = quote.l;
+      refetchRealtime();
+    }
+  }, [quote?.l, analyzedLevel, refetchRealtime]);
+  
   // 获取股票名称
   const { data: stockNamesData } = useStockNames();
   const stockNames = stockNamesData?.stock_names || {};
@@ -188,6 +204,7 @@ export default function StockAnalysisPage() {
               </div>
               <CardDescription>
                 基于实时价格数据的AI分析
+                {quote?.p !== undefined && ` • 最新价格: ${quote.p.toFixed(2)}`}
               </CardDescription>
             </CardHeader>
             <CardContent>
@@ -265,8 +282,8 @@ export default function StockAnalysisPage() {
                   
                   {allStockData.data && (
                     <div className="grid grid-cols-2">
-                      <span className="text-muted-foreground">历史数据量</span>
-                      <span className="font-medium">{allStockData.data.length} 条记录</span>
+                      <span className="text-muted-foreground">历史数据点</span>
+                      <span className="font-medium">{allStockData.data.length} 个（降采样）</span>
                     </div>
                   )}
                 </div>
@@ -1,7 +1,7 @@
 // frontend/src/app/recommendations/page.tsx
 'use client';
 
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { 
   Card, 
   CardContent, 
@@ -22,6 +22,7 @@ import { Alert, AlertDescription, AlertTitle } from '@/components/ui/alert';
 import { AlertCircle, RefreshCw } from 'lucide-react';
 import { useRankedStocks } from '@/hooks/useRecommendations';
 import { useStockNames } from '@/hooks/useStocks';
+import { useRealtimeQuotes } from '@/hooks/useRealtime';
 import { StockCard } from '@/components/stocks/StockCard';
 import { RankedStock } from '@/lib/types';
 
@@ -38,6 +39,41 @@ export default function RecommendationsPage() {
   
   const [filter, setFilter] = useState<string>('all');
   
+  // 订阅实时价格和推荐级别
+  const codes = React.useMemo(
+    () => rankedStocksData?.stocks?.map(stock => stock.code) || [],
+    [rankedStocksData]
+  );
+  const quotes = useRealtimeQuotes(codes);
+  
+  // 推送的数据覆盖列表中的价格和推荐级别
+  const liveStocks = React.useMemo(() => {
+    if (!rankedStocksData?.stocks) return [];
+    return rankedStocksData.stocks.map(stock => {
+      const quote = quotes[stock.code];
+      if (!quote) return stock;
+      return {
+        ...stock,
+        price: quote.p ?? stock.price,
+        recommendation_level: quote.l ?? stock.recommendation_level,
+        updated_at: quote.ts ?? stock.updated_at
+      };
+    });
+  }, [rankedStocksData, quotes]);
+  
+  // 推荐级别变化时重新获取列表，更新推荐文本和均线关系（同一组级别只请求一次）
+  const changedLevels = liveStocks
+    .filter((stock, i) => stock.recommendation_level !== rankedStocksData?.stocks?.[i]?.recommendation_level)
+    .map(stock => `${stock.code}:${stock.recommendation_level}`)
+    .join(',');
+  const requestedLevels = useRef('');
+  useEffect(() => {
+    if (changedLevels && changedLevels !== requestedLevels.current) {
+      requestedLevels.current = changedLevels;
+      refetch();
+    }
+  }, [changedLevels, refetch]);
+  
   // 格式化更新时间
   const formattedUpdateTime = rankedStocksData?.updated_at 
     ? new Date(rankedStocksData.updated_at).toLocaleString()
@@ -45,9 +81,7 @@ export default function RecommendationsPage() {
   
   // 过滤股票
   const filteredStocks = React.useMemo(() => {
-    if (!rankedStocksData?.stocks) return [];
-    
-    let stocks = [...rankedStocksData.stocks];
+    let stocks = [...liveStocks];
     
     if (filter === 'recommended') {
       // 只显示推荐级别 1-3 的股票
@@ -61,7 +95,7 @@ export default function RecommendationsPage() {
     }
     
     return stocks;
-  }, [rankedStocksData, filter]);
+  }, [liveStocks, filter]);
   
   return (
     <div className="space-y-8">
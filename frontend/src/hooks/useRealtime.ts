@@ -0,0 +1,33 @@
+// frontend/src/hooks/useRealtime.ts
+import { useEffect, useState } from 'react';
+import { getRealtimeStreamUrl } from '@/lib/api';
+import { RealtimeDelta } from '@/lib/types';
+
+// 订阅股票的实时价格、均线和推荐级别（服务器推送，替代轮询）
+export function useRealtimeQuotes(codes: string[]) {
+  const [quotes, setQuotes] = useState<Record<string, RealtimeDelta>>({});
+  const key = [...codes].sort().join(',');
+
+  useEffect(() => {
+    if (!key) return;
+    const source = new EventSource(getRealtimeStreamUrl(key.split(',')));
+
+    const merge = (event: MessageEvent) => {
+      const deltas: Record<string, RealtimeDelta> = JSON.parse(event.data);
+      setQuotes(prev => {
+        const next = { ...prev };
+        for (const [code, delta] of Object.entries(deltas)) {
+          next[code] = { ...next[code], ...delta };
+        }
+        return next;
+      });
+    };
+    source.addEventListener('snapshot', merge);
+    source.addEventListener('update', merge);
+    // 断线后 EventSource 会自动重连，并重新收到 snapshot
+
+    return () => source.close();
+  }, [key]);
+
+  return quotes;
+}
@@ -8,6 +8,7 @@ export function useRankedStocks() {
     queryKey: ['rankedStocks'],
     queryFn: getRankedStocks,
     staleTime: 1000 * 60, // 1分钟内不重新获取
-    refetchInterval: 1000 * 60 * 5, // 每5分钟自动刷新一次
+    // 价格和推荐级别由 useRealtimeQuotes 推送，轮询只作为推送断开时的兜底
+    refetchInterval: 1000 * 60 * 30,
   });
 }
\ No newline at end of file
@@ -1,6 +1,7 @@
 // frontend/src/hooks/useStocks.ts
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { getStocksList, updateStocksList, getStockData, getStockAllData, getStockNames, getStoredStocks } from '@/lib/api';
+import { DownsampleOptions } from '@/lib/types';
 
 // 获取所有跟踪的股票列表
 export function useStocksList() {
@@ -43,10 +44,10 @@ export function useStockData(code: string, days: number = 30) {
 }
 
 // 获取完整股票数据
-export function useStockAllData(code: string) {
+export function useStockAllData(code: string, options: DownsampleOptions = {}) {
   return useQuery({
-    queryKey: ['stockAllData', code],
-    queryFn: () => getStockAllData(code),
+    queryKey: ['stockAllData', code, options],
+    queryFn: () => getStockAllData(code, options),
     enabled: !!code,
     staleTime: 1000 * 60 * 5,
   });
@@ -4,12 +4,15 @@ import axios from 'axios';
 import {
   StockDataResponse,
   StockAnalysisResponse,
+  BatchAnalysisResponse,
   RealtimeAnalysisResponse,
   RankedStocksResponse,
   StoredStocksResponse,
   StockAllDataResponse,
+  DownsampleOptions,
   StockNamesResponse,
-  StockListResponse
+  StockListResponse,
+  KLineType
 } from './types';
 
 // 获取环境变量（加入调试日志）
@@ -60,9 +63,9 @@ export const updateStocksList = async (stocks: string[]): Promise<StockListRespo
 };
 
 // 获取股票数据
-export const getStockData = async (code: string, days: number = 30): Promise<StockDataResponse> => {
+export const getStockData = async (code: string, days: number = 30, ktype: KLineType = 'K_DAY'): Promise<StockDataResponse> => {
   const response = await api.get('/stock_data', {
-    params: { code, days }
+    params: { code, days, ktype }
   });
   return response.data;
 };
@@ -75,6 +78,12 @@ export const getStockAnalysis = async (code: string, days: number = 30): Promise
   return response.data;
 };
 
+// 批量获取多只股票的分析（一次请求）
+export const getBatchAnalysis = async (codes: string[], days: number = 30): Promise<BatchAnalysisResponse> => {
+  const response = await api.post('/batch_analysis', { codes, days });
+  return response.data;
+};
+
 // 获取实时分析
 export const getRealtimeAnalysis = async (code: string): Promise<RealtimeAnalysisResponse> => {
   const response = await api.get('/realtime_analysis', {
@@ -96,9 +105,9 @@ export const getStoredStocks = async (): Promise<StoredStocksResponse> => {
 };
 
 // 获取单只股票的所有数据
-export const getStockAllData = async (code: string): Promise<StockAllDataResponse> => {
+export const getStockAllData = async (code: string, options: DownsampleOptions = {}): Promise<StockAllDataResponse> => {
   const response = await api.get('/stock_all_data', {
-    params: { code }
+    params: { code, ...options }
   });
   return response.data;
 };
@@ -107,4 +116,13 @@ export const getStockAllData = async (code: string): Promise<StockAllDataRespons
 export const getStockNames = async (): Promise<StockNamesResponse> => {
   const response = await api.get('/stock_names');
   return response.data;
-};
\ No newline at end of file
+};
+
+// 实时推送（SSE）地址：EventSource 不能设置请求头，API密钥通过查询参数传递
+export const getRealtimeStreamUrl = (codes: string[]): string => {
+  const params = new URLSearchParams({
+    codes: codes.join(','),
+    api_key: apiKey || 'your-secret-api-key'
+  });
+  return `${apiBaseUrl}/realtime/stream?${params.toString()}`;
+};
@@ -13,6 +13,9 @@ export interface StockData {
     turnover: number | null;
   }
   
+  // K线周期
+  export type KLineType = 'K_1M' | 'K_5M' | 'K_15M' | 'K_60M' | 'K_DAY' | 'K_WEEK';
+  
   // 技术分析结果
   export interface TechnicalAnalysis {
     latest_price: number;
@@ -75,6 +78,15 @@ export interface StockData {
     analysis?: AnalysisResult;
   }
   
+  // 批量分析响应
+  export interface BatchAnalysisResponse {
+    success: boolean;
+    message?: string;
+    results?: Record<string, AnalysisResult>;
+    missing?: string[];
+    timestamp?: string;
+  }
+  
   // 实时分析响应
   export interface RealtimeAnalysisResponse {
     success: boolean;
@@ -154,6 +166,13 @@ export interface StockData {
     listing_date?: string;
   }
   
+  // 服务端降采样参数
+  export interface DownsampleOptions {
+    max_points?: number;
+    bucket?: string;
+    downsample?: 'lttb' | 'ohlc';
+  }
+  
   // 股票完整数据响应
   export interface StockAllDataResponse {
     success: boolean;
@@ -174,4 +193,11 @@ export interface StockData {
     success: boolean;
     message: string;
     stocks?: string[];
-  }
\ No newline at end of file
+  }
+  // 实时推送的单只股票变化（字段只在变化时出现）
+  export interface RealtimeDelta {
+    p?: number;                           // 最新价格
+    ts?: string;                          // 报价时间
+    l?: number;                           // 推荐级别
+    ma?: Record<string, number | null>;   // 均线
+  }